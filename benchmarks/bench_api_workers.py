@@ -0,0 +1,169 @@
+"""
+Throughput of the API as it runs on 1 to N uvicorn worker processes.
+
+Each round starts ``uvicorn run_mcp:app --workers N`` on a copy of the bundled
+test database, in a scratch directory that holds the workers' shared SQLite
+files, and keeps ``--concurrency`` requests in flight for ``--duration``
+seconds against /get_courier_shipments, a database read that runs on the
+event loop. The load comes from ``--clients`` processes so the client side
+is not the bottleneck. Throughput scales with workers up to the number of
+cores the API and the load generator share.
+
+    python -m benchmarks.bench_api_workers [--workers 1,2,4] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+import aiohttp
+from sqlalchemy import create_engine
+
+from database.data_schema import ensure_indexes
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DB = os.path.join(REPO, "database", "test_shipments.db")
+CONTACT_NUMBER = "606.435.1168x0531"
+PATH = "/get_courier_shipments"
+WARMUP = 2.0  # seconds of load before measuring, while every worker starts up
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_api(workers: int, port: int, directory: str) -> subprocess.Popen:
+    db = os.path.join(directory, "tms.db")
+    shutil.copy(TEST_DB, db)
+    # Indexed as python run_mcp.py does before it starts the workers
+    engine = create_engine(f"sqlite:///{db}")
+    ensure_indexes(engine)
+    engine.dispose()
+    env = {
+        **os.environ,
+        "DB_PATH": f"sqlite:///{db}",
+        "API_WORKERS": str(workers),
+        "METRICS_DIR": os.path.join(directory, "metrics"),
+        "TELEGRAM_BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN", "123456:placeholder"),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "run_mcp:app",
+            "--app-dir",
+            REPO,
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        cwd=directory,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The API did not start listening")
+
+
+async def _load(url: str, concurrency: int, warmup: float, duration: float):
+    latencies: List[float] = []
+    errors = 0
+    params = {"contact_number": CONTACT_NUMBER}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop = measure_from + duration
+
+        async def user() -> None:
+            nonlocal errors
+            while True:
+                sent = time.perf_counter()
+                if sent >= stop:
+                    return
+                async with session.get(url, params=params) as resp:
+                    await resp.read()
+                    ok = resp.status == 200
+                if sent >= measure_from:
+                    if ok:
+                        latencies.append(time.perf_counter() - sent)
+                    else:
+                        errors += 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def _client(args: Tuple[str, int, float, float]) -> Tuple[List[float], int]:
+    return asyncio.run(_load(*args))
+
+
+def _round(workers: int, args: argparse.Namespace) -> Tuple[float, List[float], int]:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        process = _start_api(workers, port, directory)
+        try:
+            url = f"http://127.0.0.1:{port}{PATH}"
+            per_client = max(1, args.concurrency // args.clients)
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.map(
+                    _client,
+                    [(url, per_client, WARMUP, args.duration)] * args.clients,
+                )
+        finally:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    return len(latencies) / args.duration, latencies, errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=4, help="load processes")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.concurrency} requests in flight on {PATH}")
+    baseline = None
+    for workers in map(int, args.workers.split(",")):
+        throughput, latencies, errors = _round(workers, args)
+        baseline = baseline or throughput
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+        print(
+            f"{workers:>2} workers: {throughput:7.0f} req/s "
+            f"(x{throughput / baseline:4.2f}), "
+            f"p50 {p50:6.1f} ms, p95 {p95:6.1f} ms, {errors} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Latency of /check_auth_status before and after caching the Gmail service.
+
+"before" is the previous get_gmail_service: every hit reloads token.json and
+rebuilds the service, and the first hit after the access token expires refreshes
+it inline. "after" is the GmailAuth-backed endpoint. Google's token endpoint is
+replaced by a local fake with ``--token-latency`` seconds of delay.
+
+    python -m benchmarks.bench_auth_status [--requests 500] [--token-latency 0.15]
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, List, Optional
+from unittest import mock
+
+from fastapi.testclient import TestClient
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+import run_api_auth
+from tests.fakes.google_oauth import SCOPES, FakeTokenServer
+
+
+def uncached_gmail_service(token_file: str) -> Optional[Any]:
+    """get_gmail_service as it was before the service and credentials were cached."""
+    if not os.path.exists(token_file):
+        return None
+    creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+    if not creds.valid:
+        if not (creds.expired and creds.refresh_token):
+            return None
+        creds.refresh(Request())
+        with open(token_file, "w") as token:
+            token.write(creds.to_json())
+    return build("gmail", "v1", credentials=creds)
+
+
+def _time_requests(client: TestClient, count: int) -> List[float]:
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get("/check_auth_status")
+        latencies.append(time.perf_counter() - start)
+        assert response.json() == {"authenticated": True}
+    return latencies
+
+
+def _scenario(
+    name: str,
+    token_server: FakeTokenServer,
+    token_file: str,
+    get_service: Callable[[], Optional[Any]],
+    requests: int,
+    lifespan: Any,
+) -> None:
+    token_server.write_token_file(token_file, expires_in=3600)
+    with mock.patch.object(
+        run_api_auth, "get_gmail_service", get_service
+    ), mock.patch.object(run_api_auth.app.router, "lifespan_context", lifespan):
+        start = time.perf_counter()
+        with TestClient(run_api_auth.app) as client:
+            first = _time_requests(client, 1)[0]
+            startup = time.perf_counter() - start
+            steady = _time_requests(client, requests)
+
+            # The access token is about to expire; give the background refresher
+            # (if there is one) a moment, as it would have in production
+            token_server.write_token_file(token_file, expires_in=30)
+            time.sleep(0.5)
+            after_expiry = _time_requests(client, 1)[0]
+
+    steady.sort()
+    print(
+        f"{name:>6}: startup+first {startup * 1000:7.1f} ms "
+        f"(first request {first * 1000:.2f} ms), "
+        f"p50 {statistics.median(steady) * 1000:.2f} ms, "
+        f"p99 {steady[int(0.99 * (len(steady) - 1))] * 1000:.2f} ms, "
+        f"first after expiry {after_expiry * 1000:.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--token-latency", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, FakeTokenServer(
+        latency=args.token_latency
+    ) as token_server, token_server.patch_token_endpoint():
+        token_file = os.path.join(tmp, "token_auth.json")
+        # A short check interval so the refresher notices the expiring token
+        with mock.patch.object(
+            run_api_auth, "TOKEN_FILE", token_file
+        ), mock.patch.object(run_api_auth, "TOKEN_REFRESH_INTERVAL", 0.1):
+            _scenario(
+                "before",
+                token_server,
+                token_file,
+                lambda: uncached_gmail_service(token_file),
+                args.requests,
+                # Nothing was loaded at startup or refreshed in the background
+                lambda app: contextlib.nullcontext(),
+            )
+            _scenario(
+                "after",
+                token_server,
+                token_file,
+                run_api_auth.get_gmail_service,
+                args.requests,
+                run_api_auth.lifespan,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cleaning cost and tokens saved by body_cleaner on synthetic shipper email threads.
+
+Each thread is a reply chain of the given depth in which every message quotes the
+whole previous one, the way Gmail and our own replies do.
+
+    python -m benchmarks.bench_body_cleaner [--depths 1 5 11 25 51] [--runs 200]
+"""
+
+import argparse
+import time
+
+from gmail_integration.body_cleaner import clean_body
+
+SIGNATURE = """\
+Best regards,
+Jane Doe
+Operations Manager | Acme Logistics
++1 555 0100 | jane@acme.example"""
+
+DISCLAIMER = """\
+CONFIDENTIALITY NOTICE: This email and any attachments are intended only for the
+named recipient and may contain confidential or privileged information. If you
+received it by mistake, please notify the sender and delete it."""
+
+BROKER_REPLY = """\
+Dear Supplier,
+
+Please find attached the shipment information of your current shipment.
+
+Shipment ID: {shipment_id}
+Shipment Status: in_transit
+ETA: 2025-07-04T23:29:54
+Delivery Date: 2025-07-27T09:14:17
+Source Address: 100 Main St, Springfield
+Destination Address: 200 Harbor Rd, Shelbyville
+
+Best regards,
+Your Logistics Team"""
+
+
+def build_thread(depth: int) -> str:
+    """Body of the newest message of a thread ``depth`` messages long."""
+    body = ""
+    for i in range(depth):
+        if i % 2 == 0:
+            text = f"Hi, where is shipment {i + 1}? It was due on Monday.\n\n"
+            text += f"{SIGNATURE}\n\n{DISCLAIMER}"
+        else:
+            text = BROKER_REPLY.format(shipment_id=i)
+        if body:
+            quoted = "\n".join(
+                f"> {line}" if line else ">" for line in body.split("\n")
+            )
+            header = f"On Mon, Jun {i % 28 + 1}, 2025 at 10:{i % 60:02d} AM"
+            text += f"\n\n{header} Someone <someone@example.com> wrote:\n\n{quoted}"
+        body = text
+    return body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 5, 11, 25, 51])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    print(
+        f"{'depth':>5} {'chars':>8} {'tokens in':>10} {'tokens out':>10} "
+        f"{'saved':>6} {'us/email':>9}"
+    )
+    for depth in args.depths:
+        # An odd depth ends with a shipper message, like the emails we process
+        depth = depth if depth % 2 else depth + 1
+        body = build_thread(depth)
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            cleaned = clean_body(body)
+        per_email_us = (time.perf_counter() - start) / args.runs * 1e6
+        saved = cleaned.tokens_saved / cleaned.original_tokens
+        print(
+            f"{depth:>5} {len(body):>8} {cleaned.original_tokens:>10} "
+            f"{cleaned.tokens:>10} {saved:>6.0%} {per_email_us:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Latency of the bot's "My shipments" handler against a local API.
+
+"before" is the previous fetch_shipments, which opened a new ClientSession (and
+TCP connection) for every message. "after" goes through the application-scoped
+session created in post_init. run_mcp's API is served by uvicorn on a local port
+and reads the bundled test database; Telegram itself is replaced by a reply stub.
+
+    python -m benchmarks.bench_bot_http [--messages 500] [--concurrency 1,10]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from types import SimpleNamespace
+from typing import Iterator, List, Optional
+from unittest import mock
+
+import aiohttp
+import uvicorn
+
+from database.data_schema import ensure_indexes
+from database.session import get_engine
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DB = os.path.join(REPO, "database", "test_shipments.db")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+sys.path.insert(0, os.path.join(REPO, "telegram_integration"))
+import bot  # noqa: E402
+from courier_store import CourierStore  # noqa: E402
+
+import run_mcp  # noqa: E402
+
+CONTACT_NUMBER = "606.435.1168x0531"
+
+
+async def unpooled_fetch_shipments(
+    contact_number: str, api_base_url: str
+) -> Optional[list]:
+    """fetch_shipments as it was before the session was shared."""
+    encoded = urllib.parse.quote_plus(contact_number) if contact_number else ""
+    url = f"{api_base_url}/get_courier_shipments?contact_number={encoded}"
+    headers = {"accept": "application/json"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, headers=headers) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                return data.get("response", [])
+            return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def _serve_api(port: int) -> Iterator[None]:
+    config = uvicorn.Config(run_mcp.app, port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def _fake_update(user_id: int, replies: List[str]) -> SimpleNamespace:
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    return SimpleNamespace(
+        message=SimpleNamespace(
+            from_user=SimpleNamespace(id=user_id), reply_text=reply_text
+        )
+    )
+
+
+async def _handle_messages(
+    application: SimpleNamespace, messages: int, concurrency: int
+) -> List[float]:
+    context = SimpleNamespace(application=application, args=[])
+    latencies: List[float] = []
+    replies: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def handle(user_id: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await bot.my_shipments(_fake_update(user_id, replies), context)
+            latencies.append(time.perf_counter() - start)
+
+    for user_id in range(concurrency):
+        application.bot_data["couriers"].set(user_id, CONTACT_NUMBER)
+    await asyncio.gather(*(handle(i % concurrency) for i in range(messages)))
+    assert all(reply.startswith("<b>Your Shipments:</b>") for reply in replies)
+    return sorted(latencies)
+
+
+async def _scenario(
+    name: str, base_url: str, pooled: bool, messages: int, concurrency: int
+) -> None:
+    session = bot.create_http_session(base_url)
+    couriers = CourierStore(os.path.join(os.getcwd(), "couriers.db"))
+    application = SimpleNamespace(
+        bot_data={"http_session": session, "couriers": couriers}
+    )
+    with mock.patch.object(bot, "api_base_url", base_url):
+        if pooled:
+            fetch = bot.fetch_shipments
+        else:
+            # The shared session is still created, but never used
+            async def fetch(session, contact_number, **kwargs):
+                shipments = await unpooled_fetch_shipments(contact_number, base_url)
+                return {"response": shipments}
+
+        with mock.patch.object(bot, "fetch_shipments", fetch):
+            start = time.perf_counter()
+            latencies = await _handle_messages(application, messages, concurrency)
+            elapsed = time.perf_counter() - start
+    await session.close()
+    couriers.close()
+
+    print(
+        f"{name:>6} x{concurrency:<3}: "
+        f"p50 {statistics.median(latencies) * 1000:6.2f} ms, "
+        f"p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1000:6.2f} ms, "
+        f"{messages / elapsed:7.0f} msg/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", default="1,10")
+    args = parser.parse_args()
+
+    port = _free_port()
+    # The API's lifespan opens its outbound mail queue in the working directory
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "tms.db")
+        shutil.copy(TEST_DB, db)
+        # The API reads DB_PATH on its first query
+        os.environ["DB_PATH"] = f"sqlite:///{db}"
+        ensure_indexes(get_engine())
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            with _serve_api(port):
+                base_url = f"http://127.0.0.1:{port}"
+                for concurrency in map(int, args.concurrency.split(",")):
+                    for name, pooled in [("before", False), ("after", True)]:
+                        asyncio.run(
+                            _scenario(
+                                name, base_url, pooled, args.messages, concurrency
+                            )
+                        )
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
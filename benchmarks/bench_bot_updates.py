@@ -0,0 +1,183 @@
+"""
+Updates per second the Telegram bot handles, against a local fake Bot API.
+
+Every courier sends ``--messages`` shipment updates; the bot's API is a stub
+that queues each as a job finishing after ``--api-latency`` seconds, standing
+in for the MCP + LLM round of /courier_shipment_updates. "sequential" is the previous setup:
+polling with one update handled at a time. "per-user" polls with
+PerUserUpdateProcessor and "webhook" receives the same updates through
+serve_webhook. Every run checks that each courier's replies came back in order.
+
+A courier's messages that arrive within ``--coalesce-window`` seconds of each
+other are sent to the API as one update; the default of 0 only merges messages
+that are already waiting. The number of API calls is reported alongside.
+
+    python -m benchmarks.bench_bot_updates [--couriers 50] [--messages 5]
+        [--coalesce-window 0]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from telegram.ext import Application, SimpleUpdateProcessor
+
+from tests.fakes.telegram import FakeTelegramServer
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "telegram_integration"),
+)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import bot  # noqa: E402
+
+TOKEN = "123456:placeholder"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_polling(application: Application) -> None:
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+    await application.start()
+
+
+async def _stop_polling(application: Application) -> None:
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+
+def _answered(telegram: FakeTelegramServer, courier: int) -> List[str]:
+    """The courier's messages answered so far, coalesced ones split up again."""
+    return [
+        query
+        for reply in telegram.replies_to(courier)
+        for query in reply.removeprefix("done ").split("\n")
+    ]
+
+
+async def _scenario(
+    name: str, args: argparse.Namespace, api_url: str, api_calls: List[str]
+) -> None:
+    bot.api_base_url = api_url
+    bot.UPDATE_COALESCE_WINDOW = args.coalesce_window
+    api_calls.clear()
+    processor = (
+        SimpleUpdateProcessor(1)
+        if name == "sequential"
+        else bot.PerUserUpdateProcessor()
+    )
+    with FakeTelegramServer() as telegram:
+        application = bot.build_application(
+            TOKEN, update_processor=processor, bot_api_url=telegram.url
+        )
+        if name == "webhook":
+            port = _free_port()
+            server = asyncio.create_task(
+                bot.serve_webhook(
+                    application,
+                    f"http://127.0.0.1:{port}/telegram",
+                    listen="127.0.0.1",
+                    port=port,
+                )
+            )
+            while telegram.webhook_url is None:
+                await asyncio.sleep(0.01)
+        else:
+            await _start_polling(application)
+
+        couriers = range(1, args.couriers + 1)
+        for courier in couriers:
+            application.bot_data["couriers"].set(courier, f"+1 555 {courier:04d}")
+        total = args.couriers * args.messages
+        start = time.perf_counter()
+        for i in range(args.messages):
+            for courier in couriers:
+                telegram.send_text(courier, f"{courier}:{i}")
+        await asyncio.to_thread(
+            telegram.wait_until,
+            lambda: sum(len(_answered(telegram, c)) for c in couriers) >= total,
+            600,
+        )
+        elapsed = time.perf_counter() - start
+
+        if name == "webhook":
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+        else:
+            await _stop_polling(application)
+
+    for courier in couriers:
+        expected = [f"{courier}:{i}" for i in range(args.messages)]
+        assert _answered(telegram, courier) == expected, courier
+    print(
+        f"{name:>10}: {total} updates in {elapsed:6.2f} s, "
+        f"{total / elapsed:7.1f} updates/s, {len(api_calls)} API calls"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--couriers", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--api-latency", type=float, default=0.05)
+    parser.add_argument("--coalesce-window", type=float, default=0.0)
+    parser.add_argument(
+        "--scenarios", default="sequential,per-user,webhook", help="comma-separated"
+    )
+    args = parser.parse_args()
+
+    api_calls: List[str] = []
+
+    jobs: Dict[str, asyncio.Task[dict]] = {}
+
+    async def run_job(query: str) -> dict:
+        await asyncio.sleep(args.api_latency)
+        return {"response": f"done {query}"}
+
+    async def shipment_update(request: web.Request) -> web.Response:
+        query = request.query["shipment_query"]
+        api_calls.append(query)
+        job_id = str(len(api_calls))
+        jobs[job_id] = asyncio.create_task(run_job(query))
+        return web.json_response(
+            {"response": {"job_id": job_id, "status": "queued"}}, status=202
+        )
+
+    async def get_job(request: web.Request) -> web.Response:
+        job_id = request.match_info["job_id"]
+        result = await jobs[job_id]
+        return web.json_response(
+            {"response": {"job_id": job_id, "status": "done", "result": result}}
+        )
+
+    async def run() -> None:
+        api = web.Application()
+        api.router.add_post("/courier_shipment_updates", shipment_update)
+        api.router.add_get("/jobs/{job_id}", get_job)
+        async with TestServer(api) as api_server:
+            bot.COURIER_STORE_PATH = os.path.join(tmp, "couriers.db")
+            api_url = str(api_server.make_url("")).rstrip("/")
+            for name in args.scenarios.split(","):
+                await _scenario(name, args, api_url, api_calls)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Lookup cost and memory use of DedupStore with millions of processed ids.
+
+    python -m benchmarks.bench_dedup_store [--ids 2000000] [--cache-size 100000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from gmail_integration.dedup_store import DedupStore
+
+
+def _message_id(i: int) -> str:
+    # Gmail message ids are 16 hex digits
+    return f"{0x18F0000000000000 + i * 7919:016x}"
+
+
+def _time_lookups(store: DedupStore, ids: list) -> float:
+    start = time.perf_counter()
+    for message_id in ids:
+        message_id in store  # noqa: B015 - measuring the lookup itself
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ids", type=int, default=2_000_000)
+    parser.add_argument("--cache-size", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "processed.db")
+        store = DedupStore(path, cache_size=args.cache_size)
+
+        start = time.perf_counter()
+        chunk = 50_000
+        for offset in range(0, args.ids, chunk):
+            store.add_many(
+                _message_id(i) for i in range(offset, min(offset + chunk, args.ids))
+            )
+        insert_s = time.perf_counter() - start
+
+        recent = [_message_id(args.ids - 1 - i) for i in range(args.lookups)]
+        old = [
+            _message_id(random.randrange(args.ids // 2)) for _ in range(args.lookups)
+        ]
+        missing = [_message_id(args.ids + i) for i in range(args.lookups)]
+
+        # Measure in a fresh store so the cache only holds what lookups bring in
+        store.close()
+        tracemalloc.start()
+        store = DedupStore(path, cache_size=args.cache_size)
+        _time_lookups(store, recent[: args.cache_size])  # warm the cache
+        cached_us = _time_lookups(store, recent[: min(args.lookups, args.cache_size)])
+        disk_us = _time_lookups(store, old)
+        miss_us = _time_lookups(store, missing)
+        memory_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        print(f"ids stored:          {len(store):,}")
+        print(f"insert throughput:   {args.ids / insert_s:,.0f} ids/s")
+        print(f"lookup, cached:      {cached_us:.2f} us")
+        print(f"lookup, on disk:     {disk_us:.2f} us")
+        print(f"lookup, unknown id:  {miss_us:.2f} us")
+        print(
+            f"peak memory:         {memory_mb:.1f} MB (cache {store.cached_ids():,} ids)"
+        )
+        print(f"database size:       {os.path.getsize(path) / 1e6:.1f} MB")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
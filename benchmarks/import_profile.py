@@ -0,0 +1,127 @@
+"""
+Import-time profile of the service entry points.
+
+Each entry point is imported in a fresh interpreter with ``-X importtime`` so the
+numbers reflect a cold start. Run from the repository root:
+
+    python -m benchmarks.import_profile [--top 10]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True)
+class EntryPoint:
+    name: str
+    module: str
+    # Extra directory put on sys.path, for scripts that are run from their folder
+    path: Optional[str] = None
+
+
+ENTRY_POINTS = [
+    EntryPoint("run_mcp.py", "run_mcp"),
+    EntryPoint("run_processing.py", "run_processing"),
+    EntryPoint("mcp_stuff.mcp_code", "mcp_stuff.mcp_code"),
+    EntryPoint(
+        "telegram_integration/bot.py",
+        "bot",
+        path=os.path.join(REPO_ROOT, "telegram_integration"),
+    ),
+]
+
+# Cold-start budgets in seconds (interpreter start + import), checked by
+# tests/test_import_time.py when run with RUN_TIMING_TESTS=1. Scale them with
+# IMPORT_BUDGET_SCALE on slow machines.
+IMPORT_BUDGETS_SECONDS = {
+    "run_mcp.py": 2.0,
+    "run_processing.py": 1.0,
+    "mcp_stuff.mcp_code": 1.2,
+    "telegram_integration/bot.py": 1.0,
+}
+
+
+def _environment(entry_point: EntryPoint) -> Dict[str, str]:
+    env = dict(os.environ)
+    python_path = [REPO_ROOT]
+    if entry_point.path:
+        python_path.insert(0, entry_point.path)
+    if env.get("PYTHONPATH"):
+        python_path.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(python_path)
+    # Imports must not need real credentials; only placeholders are provided
+    env.setdefault("TELEGRAM_BOT_TOKEN", "import-profile")
+    return env
+
+
+def measure_cold_start(entry_point: EntryPoint, repeat: int = 3) -> float:
+    """Best-of-``repeat`` wall time of a fresh interpreter importing the entry point."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", f"import {entry_point.module}"],
+            cwd=REPO_ROOT,
+            env=_environment(entry_point),
+            check=True,
+            capture_output=True,
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def profile_imports(entry_point: EntryPoint) -> List[Tuple[str, int, int]]:
+    """Return ``(module, self_us, cumulative_us)`` for every import, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry_point.module}"],
+        cwd=REPO_ROOT,
+        env=_environment(entry_point),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to show")
+    args = parser.parse_args()
+
+    over_budget = False
+    for entry_point in ENTRY_POINTS:
+        cold_start = measure_cold_start(entry_point)
+        budget = IMPORT_BUDGETS_SECONDS[entry_point.name]
+        over_budget |= cold_start > budget
+        print(
+            f"{entry_point.name}: cold start {cold_start * 1000:.0f} ms (budget {budget * 1000:.0f} ms)"
+        )
+
+        # The entry point itself is always first; list the heaviest dependencies
+        for module, self_us, cumulative_us in profile_imports(entry_point)[
+            1 : args.top + 1
+        ]:
+            print(
+                f"    {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {module}"
+            )
+        print()
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
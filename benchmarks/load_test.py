@@ -0,0 +1,542 @@
+"""
+End-to-end load test of the whole system, offline.
+
+Runs the API of run_mcp.py (in a process of its own, see
+benchmarks.load_test_api) with its MCP server subprocesses, the email
+ingestion pipeline of run_processing.py and the Telegram bot against local
+fakes of the LLM, Gmail and the Telegram Bot API, on a scratch copy of the
+bundled test database. For ``--duration`` seconds shipper emails and courier
+messages arrive at random times, ``--rate`` per second in all, mixed as in MIX:
+
+- shipment_question: a shipper emails about one of their shipments; a share
+  of these threads gets a follow-up (email_follow_up), which the API answers
+  from the thread's context
+- all_shipments: a shipper asks about all of their shipments
+- shipment_update: a courier tells the bot about a delay; the API updates the
+  ETA through the LLM and emails the shipper
+- my_shipments: a courier lists their shipments in the bot
+
+Each flow is timed from the email or message arriving until its reply is sent
+through Gmail or Telegram. The API's traces give throughput and latency of
+each endpoint it served, and of the stages inside them: MCP server starts,
+LLM and tool calls, database queries.
+
+    python -m benchmarks.load_test [--duration 60] [--rate 1] [--llm-latency 0.5]
+        [--trace-file traces.jsonl]
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy import create_engine
+from telegram.ext import Application
+
+import run_processing
+from database.data_schema import ensure_indexes
+from gmail_integration.body_cleaner import BodyCleaner
+from gmail_integration.dedup_store import DedupStore
+from gmail_integration.gmail_client import GmailClient
+from gmail_integration.history_checkpoint import HistoryCheckpoint
+from gmail_integration.mailbox_scheduler import MailboxScheduler
+from gmail_integration.outbound_queue import OutboundQueue
+from observability.trace_report import load_traces, percentile
+from tests.fakes.gmail import FakeGmailServer
+from tests.fakes.llm import FakeAnthropicServer
+from tests.fakes.telegram import FakeTelegramServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, "telegram_integration"))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import bot  # noqa: E402
+
+TEST_DB = os.path.join(REPO, "database", "test_shipments.db")
+TOKEN = "123456:placeholder"
+MAILBOX = "default"
+FIRST_USER_ID = 1000  # Telegram user id of the first courier
+REPLY_POLL_INTERVAL = 0.02  # seconds between checks for a flow's reply
+
+# Share of the arriving flows of each kind
+MIX = {
+    "shipment_question": 0.45,
+    "all_shipments": 0.10,
+    "shipment_update": 0.20,
+    "my_shipments": 0.25,
+}
+FOLLOW_UP_SHARE = 0.3  # shipment questions whose thread gets a follow-up
+
+QUESTIONS = (
+    "Hi, where is my shipment {shipment_id}? Could you share the ETA?",
+    "Hello, what is the status of order #{shipment_id}?",
+    "Could you send me an update on BOL {bol_id}?",
+)
+FOLLOW_UPS = (
+    "Thanks! Is the ETA still the same?",
+    "Any news on this one? We need to plan the unloading.",
+)
+OVERVIEWS = (
+    "Hello, could you give me an overview of all my shipments?",
+    "What is the status of everything you are moving for us this week?",
+)
+DELAYS = (
+    "Shipment {shipment_id}: stuck in traffic, I will be delayed by {hours} hours.",
+    "Running late with shipment {shipment_id}, about {minutes} minutes.",
+)
+# Bot replies that mean the courier's message was not handled
+FAILED_REPLIES = ("Failed", "Too many", "Your update is still being processed")
+
+
+@dataclass
+class Shipper:
+    email: str
+    shipments: List[Tuple[int, int]]  # (shipment id, BOL id)
+
+
+@dataclass
+class Courier:
+    user_id: int
+    contact_number: str
+    shipment_ids: List[int]
+
+
+@dataclass
+class FlowStats:
+    latencies: List[float] = field(default_factory=list)
+    failed: int = 0
+    timed_out: int = 0
+
+
+def load_people(db: str) -> Tuple[List[Shipper], List[Courier]]:
+    """The shippers and couriers of the database that have shipments."""
+    shipments: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    assigned: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+    with contextlib.closing(sqlite3.connect(db)) as conn:
+        rows = conn.execute(
+            "SELECT shippers.email, couriers.courier_id, couriers.contact_number,"
+            " shipment_id, bol_doc_id FROM shipments"
+            " JOIN shippers USING (shipper_id) JOIN couriers USING (courier_id)"
+            " ORDER BY shipment_id"
+        )
+        for email, courier_id, contact_number, shipment_id, bol_id in rows:
+            shipments[email].append((shipment_id, bol_id))
+            assigned[(courier_id, contact_number)].append(shipment_id)
+    shippers = [Shipper(email, ids) for email, ids in shipments.items()]
+    couriers = [
+        Courier(FIRST_USER_ID + index, contact_number, ids)
+        for index, ((_, contact_number), ids) in enumerate(sorted(assigned.items()))
+    ]
+    return shippers, couriers
+
+
+class Replies:
+    """The replies sent through the fake Gmail and Telegram, by thread or chat."""
+
+    def __init__(self, gmail: FakeGmailServer, telegram: FakeTelegramServer):
+        self.gmail = gmail
+        self.telegram = telegram
+        # Thread id or chat id -> (time sent, whether it answers the question)
+        self.sent: Dict[Hashable, List[Tuple[float, bool]]] = defaultdict(list)
+        self.expected: Dict[Hashable, int] = defaultdict(int)
+        # Emails the API sent outside a thread: shippers told about an update
+        self.notifications = 0
+        self._mail_seen = 0
+        self._chat_seen = 0
+
+    def _collect(self) -> None:
+        # sent_at is appended after sent, so both have this many entries
+        count = len(self.gmail.sent_at)
+        for payload, sent_at in zip(
+            self.gmail.sent[self._mail_seen : count],
+            self.gmail.sent_at[self._mail_seen : count],
+        ):
+            if not payload.get("threadId"):
+                self.notifications += 1
+                continue
+            # run_processing answers with the API's error when the query failed
+            ok = b"Error: " not in base64.urlsafe_b64decode(payload["raw"])
+            self.sent[payload["threadId"]].append((sent_at, ok))
+        self._mail_seen = count
+
+        count = len(self.telegram.sent_at)
+        for (chat_id, text), sent_at in zip(
+            self.telegram.sent[self._chat_seen : count],
+            self.telegram.sent_at[self._chat_seen : count],
+        ):
+            self.sent[chat_id].append((sent_at, not text.startswith(FAILED_REPLIES)))
+        self._chat_seen = count
+
+    async def next_reply(self, key: Hashable, timeout: float) -> Tuple[float, bool]:
+        """Wait for the reply to the latest question in a thread or chat."""
+        self.expected[key] += 1
+        deadline = time.monotonic() + timeout
+        while True:
+            self._collect()
+            if len(self.sent[key]) >= self.expected[key]:
+                return self.sent[key][self.expected[key] - 1]
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(REPLY_POLL_INTERVAL)
+
+
+class LoadTest:
+    """Sends the mix of emails and courier messages and times their replies."""
+
+    def __init__(
+        self,
+        gmail: FakeGmailServer,
+        telegram: FakeTelegramServer,
+        shippers: List[Shipper],
+        couriers: List[Courier],
+        timeout: float,
+        seed: int,
+    ):
+        self.gmail = gmail
+        self.telegram = telegram
+        self.shippers = shippers
+        self.couriers = couriers
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.replies = Replies(gmail, telegram)
+        self.flows: Dict[str, FlowStats] = defaultdict(FlowStats)
+        # A courier's messages in quick succession are answered together, so
+        # each courier has one message waiting for its reply at a time
+        self._idle: asyncio.Queue[Courier] = asyncio.Queue()
+
+    async def register_couriers(self) -> None:
+        """Every courier shares their phone number with the bot."""
+        for courier in self.couriers:
+            self.telegram.send_contact(courier.user_id, courier.contact_number)
+        for courier in self.couriers:
+            await self.replies.next_reply(courier.user_id, self.timeout)
+            self._idle.put_nowait(courier)
+
+    async def run(self, rate: float, duration: float) -> float:
+        """Start flows at random times for ``duration`` seconds; wait for them."""
+        kinds, weights = zip(*MIX.items())
+        flows = []
+        start = time.monotonic()
+        while True:
+            await asyncio.sleep(self.random.expovariate(rate))
+            if time.monotonic() - start >= duration:
+                break
+            kind = self.random.choices(kinds, weights)[0]
+            flows.append(asyncio.create_task(getattr(self, kind)()))
+        await asyncio.gather(*flows)
+        return time.monotonic() - start
+
+    async def _timed(self, kind: str, key: Hashable, sent: float) -> bool:
+        stats = self.flows[kind]
+        try:
+            replied, ok = await self.replies.next_reply(key, self.timeout)
+        except asyncio.TimeoutError:
+            stats.timed_out += 1
+            return False
+        if not ok:
+            stats.failed += 1
+            return False
+        stats.latencies.append(replied - sent)
+        return True
+
+    async def _email(
+        self, kind: str, sender: str, body: str, thread_id: Optional[str] = None
+    ) -> Tuple[str, bool]:
+        sent = time.time()
+        message_id = self.gmail.add_message(
+            sender, "Shipment status", body, thread_id=thread_id
+        )
+        thread_id = thread_id or message_id
+        return thread_id, await self._timed(kind, thread_id, sent)
+
+    async def _courier_message(
+        self, kind: str, compose: Callable[[Courier], str]
+    ) -> None:
+        courier = await self._idle.get()
+        try:
+            text = compose(courier)
+            sent = time.time()
+            self.telegram.send_text(courier.user_id, text)
+            await self._timed(kind, courier.user_id, sent)
+        finally:
+            self._idle.put_nowait(courier)
+
+    async def shipment_question(self) -> None:
+        shipper = self.random.choice(self.shippers)
+        shipment_id, bol_id = self.random.choice(shipper.shipments)
+        question = self.random.choice(QUESTIONS)
+        thread_id, answered = await self._email(
+            "shipment_question",
+            shipper.email,
+            question.format(shipment_id=shipment_id, bol_id=bol_id),
+        )
+        if answered and self.random.random() < FOLLOW_UP_SHARE:
+            await self._email(
+                "email_follow_up",
+                shipper.email,
+                self.random.choice(FOLLOW_UPS),
+                thread_id=thread_id,
+            )
+
+    async def all_shipments(self) -> None:
+        shipper = self.random.choice(self.shippers)
+        await self._email("all_shipments", shipper.email, self.random.choice(OVERVIEWS))
+
+    async def shipment_update(self) -> None:
+        await self._courier_message(
+            "shipment_update",
+            lambda courier: self.random.choice(DELAYS).format(
+                shipment_id=self.random.choice(courier.shipment_ids),
+                hours=self.random.randint(1, 5),
+                minutes=self.random.randint(10, 50),
+            ),
+        )
+
+    async def my_shipments(self) -> None:
+        await self._courier_message("my_shipments", lambda courier: "My shipments")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_api(
+    directory: str, llm: FakeAnthropicServer, gmail: FakeGmailServer, trace_file: str
+) -> Tuple[subprocess.Popen, str]:
+    db = os.path.join(directory, "tms.db")
+    shutil.copy(TEST_DB, db)
+    # Indexed as python run_mcp.py does before it starts the workers
+    engine = create_engine(f"sqlite:///{db}")
+    ensure_indexes(engine)
+    engine.dispose()
+    port = _free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO, os.getenv("PYTHONPATH")])),
+        "DB_PATH": f"sqlite:///{db}",
+        "ANTHROPIC_BASE_URL": llm.url,
+        "ANTHROPIC_API_KEY": "fake",
+        "TRACE_FILE": trace_file,
+        "METRICS_DIR": os.path.join(directory, "metrics"),
+    }
+    log = open(os.path.join(directory, "api.log"), "wb")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.load_test_api",
+            "--port",
+            str(port),
+            "--gmail-url",
+            gmail.url,
+        ],
+        cwd=directory,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    log.close()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"The API did not start, see {directory}/api.log")
+
+
+def _stop_api(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _open_mailbox(
+    directory: str, gmail: FakeGmailServer
+) -> run_processing.MailboxConnection:
+    # Like MailboxConnection.open, with clients of the fake Gmail
+    state_db = os.path.join(directory, "inbox_outbound_mail.db")
+    return run_processing.MailboxConnection(
+        name=MAILBOX,
+        gmail_client=GmailClient(service=gmail.build_service()),
+        history_checkpoint=HistoryCheckpoint(
+            os.path.join(directory, "gmail_history.json")
+        ),
+        dedup_store=DedupStore(state_db),
+        outbound_queue=OutboundQueue(
+            GmailClient(service=gmail.build_service()).send_messages, path=state_db
+        ),
+    )
+
+
+async def _start_bot(telegram: FakeTelegramServer, api_url: str, directory: str):
+    bot.api_base_url = api_url
+    bot.COURIER_STORE_PATH = os.path.join(directory, "couriers.db")
+    application = bot.build_application(TOKEN, bot_api_url=telegram.url)
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+    await application.start()
+    return application
+
+
+async def _stop_bot(application: Application) -> None:
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+
+async def _run(
+    args: argparse.Namespace,
+    directory: str,
+    llm: FakeAnthropicServer,
+    gmail: FakeGmailServer,
+    telegram: FakeTelegramServer,
+    api_url: str,
+) -> Tuple[LoadTest, float, float]:
+    shippers, couriers = load_people(os.path.join(directory, "tms.db"))
+    couriers = couriers[: args.couriers]
+
+    run_processing.mcp_api_url = api_url
+    connection = _open_mailbox(directory, gmail)
+    connection.sender = asyncio.create_task(connection.outbound_queue.run())
+    scheduler = MailboxScheduler(
+        min_interval=args.poll_interval, max_interval=args.poll_interval
+    )
+    scheduler.add(MAILBOX, "token.json")
+    bot.UPDATE_COALESCE_WINDOW = args.coalesce_window
+    application = await _start_bot(telegram, api_url, directory)
+
+    load = LoadTest(gmail, telegram, shippers, couriers, args.timeout, args.seed)
+    async with httpx.AsyncClient(timeout=run_processing.QUERY_TIMEOUT) as client:
+        pipeline = run_processing.build_pipeline(
+            scheduler, {MAILBOX: connection}, client, BodyCleaner()
+        )
+        ingestion = asyncio.create_task(pipeline.run(scheduler.due()))
+        try:
+            await load.register_couriers()
+            started = time.time()
+            elapsed = await load.run(args.rate, args.duration)
+        finally:
+            ingestion.cancel()
+            await asyncio.gather(ingestion, return_exceptions=True)
+            await _stop_bot(application)
+            connection.close()
+    return load, started, elapsed
+
+
+def _row(name: str, values: Sequence[float], *counts: Any) -> str:
+    if values:
+        p50, p95, p99 = (percentile(values, q) * 1000 for q in (0.5, 0.95, 0.99))
+        timings = f"{p50:9.0f} {p95:9.0f} {p99:9.0f}"
+    else:
+        timings = f"{'-':>9} {'-':>9} {'-':>9}"
+    return f"{name:<34}" + "".join(f"{count:>8}" for count in counts) + timings
+
+
+def report(load: LoadTest, trace_file: str, started: float, elapsed: float) -> None:
+    header = f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(f"\n{'flow':<34}{'done':>8}{'failed':>8}{'timeout':>8}{'/s':>8}{header}")
+    for kind, stats in sorted(load.flows.items()):
+        done = len(stats.latencies)
+        print(
+            _row(
+                kind,
+                stats.latencies,
+                done,
+                stats.failed,
+                stats.timed_out,
+                f"{done / elapsed:.2f}",
+            )
+        )
+    print(f"{load.replies.notifications} shippers emailed about courier updates")
+
+    endpoints: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    stages: Dict[str, List[float]] = defaultdict(list)
+    for spans in load_traces(trace_file).values():
+        for span in spans:
+            if span["start"] < started:
+                continue
+            seconds = span["duration_ms"] / 1000
+            if span["service"] == "api" and " /" in span["name"]:
+                endpoints[span["name"]].append(seconds)
+                status = span["attributes"].get("status", 500)
+                errors[span["name"]] += status >= 400 or span["error"] is not None
+            else:
+                stages[f"{span['service']}: {span['name']}"].append(seconds)
+
+    print(f"\n{'endpoint':<34}{'calls':>8}{'errors':>8}{'/s':>8}{header}")
+    for name, values in sorted(endpoints.items()):
+        per_second = f"{len(values) / elapsed:.2f}"
+        print(_row(name, values, len(values), errors[name], per_second))
+    print(f"\n{'stage':<34}{'calls':>8}{header}")
+    for name, values in sorted(stages.items()):
+        print(_row(name, values, len(values)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--rate", type=float, default=1.0, help="flows per second")
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.5, help="seconds per LLM call"
+    )
+    parser.add_argument("--couriers", type=int, default=20)
+    parser.add_argument(
+        "--poll-interval", type=float, default=1.0, help="seconds between inbox syncs"
+    )
+    parser.add_argument(
+        "--coalesce-window", type=float, default=bot.UPDATE_COALESCE_WINDOW
+    )
+    parser.add_argument("--timeout", type=float, default=180.0, help="per flow")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-file", help="keep the API's traces here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        trace_file = os.path.abspath(
+            args.trace_file or os.path.join(directory, "traces.jsonl")
+        )
+        with FakeAnthropicServer(args.llm_latency) as llm, FakeGmailServer() as gmail:
+            with FakeTelegramServer() as telegram:
+                api, api_url = _start_api(directory, llm, gmail, trace_file)
+                print(
+                    f"{args.rate}/s for {args.duration:.0f} s, "
+                    f"LLM calls take {args.llm_latency} s"
+                )
+                try:
+                    # run_processing prints every inbox sync
+                    with open(os.devnull, "w") as devnull:
+                        with contextlib.redirect_stdout(devnull):
+                            load, started, elapsed = asyncio.run(
+                                _run(args, directory, llm, gmail, telegram, api_url)
+                            )
+                finally:
+                    _stop_api(api)
+        report(load, trace_file, started, elapsed)
+        print(f"\n{llm.calls} LLM calls, tools called: {dict(llm.tool_calls)}")
+
+
+if __name__ == "__main__":
+    main()
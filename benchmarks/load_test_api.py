@@ -0,0 +1,40 @@
+"""
+The API of run_mcp.py as the load test runs it: in a process of its own, with
+the email it sends going to the load test's fake Gmail.
+
+Started by ``benchmarks.load_test``, which also points the API at the fake LLM
+(ANTHROPIC_BASE_URL) and a scratch copy of the database (DB_PATH).
+
+    python -m benchmarks.load_test_api --port 8000 --gmail-url http://127.0.0.1:9000/
+"""
+
+import argparse
+from functools import lru_cache
+
+import uvicorn
+
+import run_mcp
+from gmail_integration.gmail_client import GmailClient
+from tests.fakes.gmail import build_service
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--gmail-url", required=True)
+    args = parser.parse_args()
+
+    run_mcp.get_gmail_client = lru_cache(maxsize=None)(
+        lambda: GmailClient(service=build_service(args.gmail_url))
+    )
+    uvicorn.run(
+        run_mcp.app,
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
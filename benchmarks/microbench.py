@@ -0,0 +1,431 @@
+"""
+Microbenchmarks of the hot pure-Python helpers, checked against a baseline.
+
+Each case runs one helper on a fixed-size synthetic input: 1 to 10,000
+shipments, emails of one to a hundred MIME parts, mailboxes of long threads.
+A case is timed in REPEATS rounds of at least MIN_ROUND_SECONDS and keeps its
+fastest round, the one least disturbed by the rest of the machine.
+
+Timings are compared relative to a calibration loop timed in the same run,
+so the baseline in BASELINE_FILE also holds on a faster or slower machine.
+``--check`` exits with status 1 when a case got slower than the baseline by
+more than ``--threshold``, as tests/test_microbench.py does with
+RUN_TIMING_TESTS=1; ``--save``
+records the run as the new baseline, e.g. after a deliberate trade-off.
+
+    python -m benchmarks.microbench [--check | --save] [--threshold 0.25] [-k to_dict]
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import timeit
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from anthropic.types import ToolUseBlock
+from mcp.types import TextContent
+
+from benchmarks.bench_body_cleaner import build_thread
+from database.data_schema import (
+    Courier,
+    CourierStatus,
+    Shipment,
+    ShipmentStatus,
+    Shipper,
+)
+from gmail_integration.gmail_client import Email, GmailClient
+from mcp_stuff.mcp_llm_engine import get_shipment_info, get_tool_result
+from mcp_stuff.reply_handler import get_reply_shipper
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "microbench_baseline.json")
+REGRESSION_THRESHOLD = 0.25  # slowdown over the baseline that fails --check
+REPEATS = 5
+MIN_ROUND_SECONDS = 0.05
+
+SHIPMENT_COUNTS = (1, 100, 10_000)
+ETA = datetime(2025, 7, 4, 23, 29, 54)
+STATUSES = list(ShipmentStatus)
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    # Builds the input and returns the call to time
+    setup: Callable[[], Callable[[], Any]]
+
+
+# Synthetic inputs
+
+
+def make_shipments(count: int) -> List[Shipment]:
+    """Shipments of one shipper, spread over 30 couriers, as loaded from the DB."""
+    shipper = Shipper(shipper_id=1, name="Acme Foods", email="orders@acme.example")
+    couriers = [
+        Courier(
+            courier_id=i,
+            name=f"Courier {i}",
+            contact_number=f"+1 555 {i:04d}",
+            status=CourierStatus.AVAILABLE,
+            email=f"courier{i}@example.com",
+        )
+        for i in range(30)
+    ]
+    return [
+        Shipment(
+            shipment_id=i,
+            bol_doc_id=100_000 + i,
+            pod_doc_id=200_000 + i,
+            shipper_id=shipper.shipper_id,
+            courier_id=i % 30,
+            eta=ETA + timedelta(hours=i),
+            delivery_date=ETA + timedelta(hours=i, days=2),
+            shipment_status=STATUSES[i % len(STATUSES)],
+            shipment_comments="Call before delivery" if i % 3 == 0 else None,
+            dest_address=f"{i} Harbor Rd, Shelbyville, ST 12345",
+            source_address=f"{i} Main St, Springfield, ST 54321",
+            shipper=shipper,
+            courier=couriers[i % 30],
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def make_tool_messages(count: int) -> List[dict]:
+    """The conversation MCP_ChatBot returns after a get_all_shipments call."""
+    tool_use = ToolUseBlock(
+        id="toolu_01",
+        name="get_all_shipments",
+        input={"shipper_email": "orders@acme.example"},
+        type="tool_use",
+    )
+    # FastMCP sends a list result as one JSON text per item
+    results = [
+        TextContent(type="text", text=json.dumps(shipment.to_dict()))
+        for shipment in make_shipments(count)
+    ]
+    return [
+        {
+            "role": "user",
+            "content": "Email: orders@acme.example\nQuery: Where are my shipments?",
+        },
+        {"role": "assistant", "content": [tool_use]},
+        {
+            "role": "user",
+            "content": [
+                {"type": "tool_result", "tool_use_id": tool_use.id, "content": results}
+            ],
+        },
+    ]
+
+
+def _text_part(part_id: str, mime_type: str, text: str) -> dict:
+    data = text.encode()
+    return {
+        "partId": part_id,
+        "mimeType": mime_type,
+        "filename": "",
+        "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset=UTF-8"}],
+        "body": {"size": len(data), "data": base64.urlsafe_b64encode(data).decode()},
+    }
+
+
+def _attachment_part(part_id: str, index: int) -> dict:
+    return {
+        "partId": part_id,
+        "mimeType": "application/pdf",
+        "filename": f"POD-{index:04d}.pdf",
+        "headers": [{"name": "Content-Disposition", "value": "attachment"}],
+        "body": {"size": 48_213, "attachmentId": f"ANGjdJ{index:040d}"},
+    }
+
+
+def make_gmail_message(attachments: int = 0, forwarded: int = 0) -> dict:
+    """A shipper's reply in the Gmail API format, with a long quoted thread.
+
+    ``forwarded`` nests that many forwarded emails, each with a text and an
+    HTML part and two attachments, inside one another.
+    """
+    body = build_thread(11)
+    parts = [
+        {
+            "partId": "0",
+            "mimeType": "multipart/alternative",
+            "filename": "",
+            "headers": [],
+            "body": {"size": 0},
+            "parts": [
+                _text_part("0.0", "text/plain", body),
+                _text_part("0.1", "text/html", f"<div>{body}</div>"),
+            ],
+        }
+    ]
+    parts += [_attachment_part(str(i), i) for i in range(1, attachments + 1)]
+    nested = parts
+    for level in range(forwarded):
+        part_id = f"{len(parts)}.{level}"
+        forward = {
+            "partId": part_id,
+            "mimeType": "multipart/mixed",
+            "filename": "",
+            "headers": [],
+            "body": {"size": 0},
+            "parts": [
+                _text_part(f"{part_id}.0", "text/plain", "Forwarded message"),
+                _text_part(f"{part_id}.1", "text/html", "<p>Forwarded message</p>"),
+                _attachment_part(f"{part_id}.2", 2 * level),
+                _attachment_part(f"{part_id}.3", 2 * level + 1),
+            ],
+        }
+        nested.append(forward)
+        nested = forward["parts"]
+
+    headers = [
+        {"name": "Delivered-To", "value": "broker@example.com"},
+        *(
+            {"name": "Received", "value": f"by 10.0.0.{hop} with SMTP id {hop}"}
+            for hop in range(4)
+        ),
+        {"name": "From", "value": "Jane Doe <jane@acme.example>"},
+        {"name": "To", "value": "broker@example.com"},
+        {"name": "Subject", "value": "Re: Shipment 42"},
+        {"name": "Date", "value": "Mon, 23 Jun 2025 10:00:00 +0000"},
+        {"name": "Message-ID", "value": "<CAF=abc123@mail.acme.example>"},
+        {"name": "MIME-Version", "value": "1.0"},
+        {"name": "Content-Type", "value": "multipart/mixed; boundary=0000"},
+    ]
+    return {
+        "id": "18f2a6c1d2e3f405",
+        "threadId": "18f2a6c1d2e3f400",
+        "labelIds": ["INBOX", "UNREAD"],
+        "payload": {
+            "mimeType": "multipart/mixed",
+            "headers": headers,
+            "body": {"size": 0},
+            "parts": parts,
+        },
+    }
+
+
+def make_emails(count: int, threads: int) -> List[Email]:
+    """``count`` emails spread over ``threads`` threads, as listed by a sync."""
+    return [
+        Email(
+            message_id=f"{i:016x}",
+            thread_id=f"thread-{i % threads}",
+            sender="jane@acme.example",
+            recipient="broker@example.com",
+            subject="Re: Shipment 42",
+            date="",
+            body="",
+            timestamp=ETA + timedelta(minutes=i * 7919 % count),
+            email_message_id=f"<{i}@mail.acme.example>",
+        )
+        for i in range(count)
+    ]
+
+
+# Cases
+
+
+def _to_dict(count: int) -> Callable[[], Any]:
+    shipments = make_shipments(count)
+    return lambda: [shipment.to_dict() for shipment in shipments]
+
+
+def _get_tool_result(count: int) -> Callable[[], Any]:
+    messages = make_tool_messages(count)
+    return lambda: get_tool_result(messages)
+
+
+def _get_shipment_info(count: int) -> Callable[[], Any]:
+    messages = make_tool_messages(count)
+    return lambda: get_shipment_info(messages)
+
+
+def _get_reply_shipper(count: int) -> Callable[[], Any]:
+    shipments = get_shipment_info(make_tool_messages(count))
+    return lambda: get_reply_shipper(shipments)
+
+
+def _parse_email_message(attachments: int, forwarded: int) -> Callable[[], Any]:
+    client = GmailClient(service=object())
+    message = make_gmail_message(attachments, forwarded)
+    return lambda: client._parse_email_message(message)
+
+
+def _remove_older_replies(count: int, threads: int) -> Callable[[], Any]:
+    client = GmailClient(service=object())
+    emails = make_emails(count, threads)
+    return lambda: client._remove_older_replies_in_the_same_thread(emails)
+
+
+def _bind(function: Callable[..., Callable[[], Any]], *args: Any) -> Any:
+    return lambda: function(*args)
+
+
+CASES = [
+    *(
+        Case(f"{name}[{count}]", _bind(setup, count))
+        for name, setup in (
+            ("Shipment.to_dict", _to_dict),
+            ("get_tool_result", _get_tool_result),
+            ("get_shipment_info", _get_shipment_info),
+            ("get_reply_shipper", _get_reply_shipper),
+        )
+        for count in SHIPMENT_COUNTS
+    ),
+    Case("parse_email_message[text]", _bind(_parse_email_message, 0, 0)),
+    Case("parse_email_message[10 attachments]", _bind(_parse_email_message, 10, 0)),
+    Case("parse_email_message[25 forwards]", _bind(_parse_email_message, 2, 25)),
+    Case(
+        "remove_older_replies[10k in 1 thread]", _bind(_remove_older_replies, 10_000, 1)
+    ),
+    Case(
+        "remove_older_replies[10k in 100 threads]",
+        _bind(_remove_older_replies, 10_000, 100),
+    ),
+    Case(
+        "remove_older_replies[10k in 10k threads]",
+        _bind(_remove_older_replies, 10_000, 10_000),
+    ),
+]
+
+
+# Measuring and comparing
+
+
+def calibration() -> None:
+    """A fixed mix of what the helpers do: dicts, formatting and JSON."""
+    rows = [{"id": i, "name": f"row {i}", "value": i * 1.5} for i in range(200)]
+    json.loads(json.dumps(rows))
+    "\n".join("{id}: {name} {value}".format(**row) for row in rows)
+
+
+def measure(call: Callable[[], Any]) -> float:
+    """Seconds per call, from the fastest of REPEATS rounds."""
+    timer = timeit.Timer(call)
+    number = 1
+    elapsed = timer.timeit(number)
+    while elapsed < MIN_ROUND_SECONDS:
+        number = max(2 * number, int(number * 1.2 * MIN_ROUND_SECONDS / elapsed))
+        elapsed = timer.timeit(number)
+    return min([elapsed] + timer.repeat(REPEATS - 1, number)) / number
+
+
+def run(cases: List[Case]) -> Tuple[float, Dict[str, float]]:
+    """The calibration time and the seconds per call of each case."""
+    results = {case.name: measure(case.setup()) for case in cases}
+    return measure(calibration), results
+
+
+@dataclass(frozen=True)
+class Comparison:
+    name: str
+    seconds: float
+    baseline_seconds: Optional[float]
+    # Slowdown over the baseline, corrected for the machine's speed
+    change: Optional[float]
+    regressed: bool
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"calibration_seconds": None, "cases": {}}
+
+
+def compare(
+    results: Dict[str, float],
+    calibration_seconds: float,
+    baseline: Dict[str, Any],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> List[Comparison]:
+    comparisons = []
+    for name, seconds in results.items():
+        baseline_seconds = baseline["cases"].get(name)
+        change = None
+        if baseline_seconds is not None:
+            speed = calibration_seconds / baseline["calibration_seconds"]
+            change = seconds / (baseline_seconds * speed) - 1
+        regressed = change is not None and change > threshold
+        comparisons.append(
+            Comparison(name, seconds, baseline_seconds, change, regressed)
+        )
+    return comparisons
+
+
+def save_baseline(
+    results: Dict[str, float], calibration_seconds: float, path: str = BASELINE_FILE
+) -> None:
+    """Record the results, keeping the baseline's other cases."""
+    baseline = load_baseline(path)
+    scale = 1.0
+    if baseline["calibration_seconds"]:
+        # Kept cases were timed on the baseline's machine; convert to its speed
+        scale = baseline["calibration_seconds"] / calibration_seconds
+    else:
+        baseline["calibration_seconds"] = calibration_seconds
+    baseline["python"] = platform.python_version()
+    baseline["cases"].update(
+        {name: seconds * scale for name, seconds in results.items()}
+    )
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _format(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    return f"{seconds * 1e3:.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="fail on regressions")
+    mode.add_argument("--save", action="store_true", help="record a new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("-k", dest="only", help="only cases containing this text")
+    args = parser.parse_args()
+
+    cases = [case for case in CASES if not args.only or args.only in case.name]
+    calibration_seconds, results = run(cases)
+    baseline = load_baseline(args.baseline)
+
+    print(f"{'case':<44} {'time':>10} {'baseline':>10} {'change':>8}")
+    comparisons = compare(results, calibration_seconds, baseline, args.threshold)
+    for comparison in comparisons:
+        change = "new" if comparison.change is None else f"{comparison.change:+.0%}"
+        flag = "  REGRESSION" if comparison.regressed else ""
+        print(
+            f"{comparison.name:<44} {_format(comparison.seconds):>10} "
+            f"{_format(comparison.baseline_seconds):>10} {change:>8}{flag}"
+        )
+    print(f"calibration: {_format(calibration_seconds)}")
+
+    if args.save:
+        save_baseline(results, calibration_seconds, args.baseline)
+        print(f"Saved {len(results)} cases to {args.baseline}")
+    elif args.check:
+        regressions = [c.name for c in comparisons if c.regressed]
+        if regressions:
+            print(
+                f"{len(regressions)} cases are more than {args.threshold:.0%} "
+                f"slower than the baseline: {', '.join(regressions)}"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
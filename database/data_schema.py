@@ -1,7 +1,18 @@
 from enum import Enum as PyEnum
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    inspect,
+)
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.schema import CreateIndex
 
 Base = declarative_base()
 
@@ -42,7 +53,8 @@ class Courier(Base):
 
     courier_id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
-    contact_number = Column(String(20), nullable=False)
+    # The bot and the API resolve couriers by phone number
+    contact_number = Column(String(20), nullable=False, index=True)
     status = Column(Enum(CourierStatus), nullable=False)
     email = Column(String(255), nullable=False, unique=True)
 
@@ -67,7 +79,9 @@ class Shipment(Base):
     bol_doc_id = Column(Integer, nullable=False)
     pod_doc_id = Column(Integer, nullable=False)
     shipper_id = Column(Integer, ForeignKey("shippers.shipper_id"), nullable=False)
-    courier_id = Column(Integer, ForeignKey("couriers.courier_id"), nullable=True)
+    courier_id = Column(
+        Integer, ForeignKey("couriers.courier_id"), nullable=True, index=True
+    )
     eta = Column(DateTime, nullable=False)
     delivery_date = Column(DateTime, nullable=True)
     shipment_status = Column(Enum(ShipmentStatus), nullable=False)
@@ -119,3 +133,20 @@ class ShipperProcess(Base):
             "email": self.email,
             "thread_id": self.thread_id,
         }
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """
+    Create declared indexes that existing tables are missing.
+
+    ``create_all`` only creates indexes together with their table, so indexes
+    added to the schema later would never reach an existing database.
+    ``python run_mcp.py`` runs this once before starting the API workers.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
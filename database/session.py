@@ -0,0 +1,98 @@
+import os
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from observability.metrics import STAGE_ERRORS, STAGE_IN_FLIGHT, STAGE_SECONDS
+from observability.tracing import current_span, start_span
+
+
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """
+    Create the database engine on first use and reuse it for the process lifetime.
+
+    Reads the database URL from the DB_PATH environment variable, so the variable
+    only needs to be set by the time the first query runs, not at import time.
+    """
+    engine = create_engine(
+        os.getenv("DB_PATH"),
+        connect_args={"check_same_thread": False},  # Required for SQLite
+    )
+    record_query_metrics(engine)
+    trace_queries(engine)
+    return engine
+
+
+def record_query_metrics(engine: Engine) -> None:
+    """Time every statement on the engine as the ``db_query`` stage, by verb."""
+
+    def operation(statement: str) -> str:
+        return statement.split(None, 1)[0].upper() if statement else ""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+        STAGE_IN_FLIGHT.inc(stage="db_query", operation=operation(statement))
+
+    def finish(conn: Any, statement: str) -> None:
+        started = conn.info["query_started"].pop()
+        labels = {"stage": "db_query", "operation": operation(statement)}
+        STAGE_IN_FLIGHT.dec(**labels)
+        STAGE_SECONDS.observe(time.perf_counter() - started, **labels)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def done(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        finish(conn, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context: Any) -> None:
+        if context.connection is None or not context.connection.info.get(
+            "query_started"
+        ):
+            # Failed before the statement was sent, e.g. while connecting
+            return
+        finish(context.connection, context.statement)
+        STAGE_ERRORS.inc(stage="db_query", operation=operation(context.statement))
+
+
+def trace_queries(engine: Engine) -> None:
+    """Trace statements run for a traced request (a tool call) as ``db_query`` spans."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        span = None
+        if current_span() is not None:
+            span = start_span("db_query", statement=statement[:200])
+        conn.info.setdefault("query_spans", []).append(span)
+
+    def finish(conn: Any, error: Optional[str] = None) -> None:
+        span = conn.info["query_spans"].pop()
+        if span is not None:
+            span.error = error
+            span.end()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def done(conn: Any, *args: Any) -> None:
+        finish(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context: Any) -> None:
+        if context.connection is None or not context.connection.info.get("query_spans"):
+            return
+        error = context.original_exception
+        finish(context.connection, f"{type(error).__name__}: {error}")
+
+
+@lru_cache(maxsize=None)
+def get_session_factory() -> sessionmaker:
+    return sessionmaker(bind=get_engine())
+
+
+def get_session() -> Session:
+    """Open a new session bound to the shared engine."""
+    return get_session_factory()()
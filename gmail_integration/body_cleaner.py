@@ -0,0 +1,154 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import List
+
+# "On <date>, <sender> wrote:" header Gmail, Apple Mail and most clients put above
+# a quoted reply. Long headers get wrapped, so "wrote:" may be on the next line.
+_REPLY_HEADER = re.compile(r"^(On|Am|Le|El)\s.+")
+_REPLY_HEADER_END = re.compile(r"(wrote|schrieb|a écrit|escribió)\s?:$")
+# Outlook quotes without ">" below a separator or a From:/Sent: header block.
+# The block starts a paragraph and names a subject, so a shipper's own
+# "From: Gdansk / To: Berlin / Date: ..." route block is not mistaken for one.
+_OUTLOOK_SEPARATOR = re.compile(r"^(-{2,}\s*Original Message\s*-{2,}|_{10,})\s*$", re.I)
+_OUTLOOK_HEADER = re.compile(r"^From:\s.+")
+_OUTLOOK_HEADER_NEXT = re.compile(r"^(Sent|Date|To):\s", re.I)
+_OUTLOOK_SUBJECT = re.compile(r"^Subject:", re.I)
+_DISCLAIMER = re.compile(
+    r"^(confidentiality notice|disclaimer|this (e-?mail|message)\b.*\b(confidential"
+    r"|intended (only|solely)))",
+    re.I,
+)
+_MOBILE_FOOTER = re.compile(r"^(sent from my|get outlook for)\b", re.I)
+_SIGN_OFF = re.compile(
+    r"^(best|best regards|kind regards|warm regards|regards|thanks|thank you|many "
+    r"thanks|cheers|sincerely|br)[,.!]?$",
+    re.I,
+)
+# A sign-off only starts a signature if little follows it, and only names, titles
+# and contact details: words are capitalised, except these and addresses
+_MAX_SIGNATURE_LINES = 6
+_SIGNATURE_LOWERCASE_WORDS = {"of", "and", "at", "for", "the", "de", "van", "von"}
+_CONTACT_WORD = re.compile(r"[@/]|\w\.\w")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count: about four characters per token for English text."""
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class CleanedBody:
+    text: str
+    original_tokens: int
+    tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def _is_outlook_header(lines: List[str], index: int) -> bool:
+    """Whether the From: line at ``index`` starts an Outlook reply header block."""
+    if index > 0 and lines[index - 1].strip():
+        return False
+    block = [line.strip() for line in lines[index + 1 : index + 6]]
+    return any(_OUTLOOK_HEADER_NEXT.match(line) for line in block) and any(
+        _OUTLOOK_SUBJECT.match(line) for line in block
+    )
+
+
+def _history_index(lines: List[str]) -> int:
+    """Index of the first line of quoted history, a signature block or a disclaimer."""
+    for index, raw in enumerate(lines):
+        line = raw.strip()
+        if not line:
+            continue
+        if _REPLY_HEADER.match(line):
+            following = lines[index + 1].strip() if index + 1 < len(lines) else ""
+            if _REPLY_HEADER_END.search(line) or _REPLY_HEADER_END.search(following):
+                return index
+        if _OUTLOOK_SEPARATOR.match(line) or _DISCLAIMER.match(line):
+            return index
+        if _OUTLOOK_HEADER.match(line) and _is_outlook_header(lines, index):
+            return index
+        if raw.rstrip() == "--" or _MOBILE_FOOTER.match(line):
+            return index
+    return len(lines)
+
+
+def _looks_like_signature(line: str) -> bool:
+    """Whether a line reads like a name, a title or a phone number, not a sentence."""
+    if "?" in line:
+        return False
+    return not any(
+        word[0].islower()
+        and word.lower() not in _SIGNATURE_LOWERCASE_WORDS
+        and not _CONTACT_WORD.search(word)
+        for word in line.split()
+    )
+
+
+def _sign_off_index(lines: List[str]) -> int:
+    """Index of the last sign-off ("Thanks,", "Best regards") if a signature follows.
+
+    A sign-off followed by more of the message, e.g. a "Thanks!" before the
+    question, is part of the text and is kept.
+    """
+    for index in range(len(lines) - 1, -1, -1):
+        if _SIGN_OFF.match(lines[index].strip()):
+            rest = [line.strip() for line in lines[index + 1 :] if line.strip()]
+            if len(rest) <= _MAX_SIGNATURE_LINES and all(
+                _looks_like_signature(line) for line in rest
+            ):
+                return index
+            break
+    return len(lines)
+
+
+def clean_body(body: str) -> CleanedBody:
+    """Strip quoted replies, signatures and disclaimers from a plain-text email.
+
+    Only the text the sender wrote in this message is kept: everything from the
+    first reply header, Outlook separator, signature delimiter or legal disclaimer
+    onwards is dropped, and so are ``>``-quoted lines above it and a closing
+    sign-off with the signature below it.
+    """
+    lines = body.splitlines()
+    kept = [line for line in lines[: _history_index(lines)] if not line.startswith(">")]
+    kept = kept[: _sign_off_index(kept)]
+    text = "\n".join(kept).strip()
+    # Nothing left means the heuristics misfired; better send too much than nothing
+    if not text:
+        text = body.strip()
+    return CleanedBody(
+        text=text, original_tokens=estimate_tokens(body), tokens=estimate_tokens(text)
+    )
+
+
+class BodyCleaner:
+    """Applies ``clean_body`` and keeps totals of the tokens it saved."""
+
+    def __init__(self):
+        self.emails = 0
+        self.original_tokens = 0
+        self.tokens_saved = 0
+
+    def clean(self, body: str) -> str:
+        cleaned = clean_body(body)
+        self.emails += 1
+        self.original_tokens += cleaned.original_tokens
+        self.tokens_saved += cleaned.tokens_saved
+        return cleaned.text
+
+    def report(self) -> dict:
+        return {
+            "emails": self.emails,
+            "original_tokens": self.original_tokens,
+            "tokens_saved": self.tokens_saved,
+            "saved_ratio": (
+                self.tokens_saved / self.original_tokens
+                if self.original_tokens
+                else 0.0
+            ),
+        }
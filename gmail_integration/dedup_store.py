@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+
+class DedupStore:
+    """Ids of messages that have already been answered.
+
+    Lookups go through a bounded LRU of recently seen ids first and fall back to
+    a SQLite table keyed by message id (``WITHOUT ROWID``, so the primary key
+    index is the table). The process only ever holds ``cache_size`` ids in memory,
+    and the set survives restarts. The table may share its file with the
+    outbound queue, so an answered message and its reply are committed together.
+    """
+
+    def __init__(self, path: str = "processed_messages.db", cache_size: int = 100_000):
+        if cache_size < 1:
+            raise ValueError("cache_size must be positive")
+
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL survives process crashes; only an OS crash can lose the
+        # last commits, which at worst means answering a message twice
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_messages ("
+            " message_id TEXT PRIMARY KEY,"
+            " processed_at INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def _remember(self, message_id: str) -> None:
+        self._cache[message_id] = None
+        self._cache.move_to_end(message_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __contains__(self, message_id: object) -> bool:
+        if not isinstance(message_id, str):
+            return False
+        with self._lock:
+            if message_id in self._cache:
+                self._cache.move_to_end(message_id)
+                return True
+            row = self._conn.execute(
+                "SELECT 1 FROM processed_messages WHERE message_id = ?", (message_id,)
+            ).fetchone()
+            if row is not None:
+                self._remember(message_id)
+            return row is not None
+
+    def add(self, message_id: str) -> None:
+        self.add_many([message_id])
+
+    def add_many(
+        self, message_ids: Iterable[str], conn: Optional[sqlite3.Connection] = None
+    ) -> None:
+        """Record ids as processed in a single transaction.
+
+        With ``conn``, a connection to this store's file, the ids are written in
+        its open transaction instead, and count once the caller commits it.
+        """
+        now = int(time.time())
+        rows = [(message_id, now) for message_id in message_ids]
+        if conn is not None:
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed_messages VALUES (?, ?)", rows
+            )
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO processed_messages VALUES (?, ?)", rows
+                )
+            for message_id, _ in rows:
+                self._remember(message_id)
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Forget ids processed more than ``older_than_seconds`` ago; returns the count.
+
+        Gmail history only reaches back about a week, so much older ids can no
+        longer be delivered again.
+        """
+        cutoff = int(time.time() - older_than_seconds)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM processed_messages WHERE processed_at < ?", (cutoff,)
+                )
+            self._cache.clear()
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM processed_messages"
+            ).fetchone()[0]
+
+    def cached_ids(self) -> int:
+        return len(self._cache)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,161 @@
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Optional, Sequence
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+logger = logging.getLogger(__name__)
+
+
+class GmailAuth:
+    """Gmail credentials and API service, loaded once and kept fresh.
+
+    The token file is read on first use and again only when it changes on disk
+    (e.g. after an OAuth callback wrote a new token). Once ``start_refresher`` is
+    called, a background thread refreshes the access token ``refresh_margin``
+    seconds before it expires, so requests do not wait on Google's token
+    endpoint. The service is built from the discovery document bundled with
+    google-api-python-client, without a discovery request, and reused until the
+    credentials are replaced.
+    """
+
+    def __init__(
+        self, token_file: str, scopes: Sequence[str], refresh_margin: float = 300.0
+    ):
+        self.token_file = token_file
+        self.scopes = list(scopes)
+        self.refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        self._creds: Optional[Credentials] = None
+        self._service: Optional[Any] = None
+        self._mtime_ns: Optional[int] = None
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime_ns = os.stat(self.token_file).st_mtime_ns
+        except FileNotFoundError:
+            self._creds = self._service = self._mtime_ns = None
+            return
+        if mtime_ns != self._mtime_ns:
+            self._creds = Credentials.from_authorized_user_file(
+                self.token_file, self.scopes
+            )
+            self._service = None
+            self._mtime_ns = mtime_ns
+
+    def _write_token(self, creds: Credentials) -> None:
+        directory = os.path.dirname(os.path.abspath(self.token_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(creds.to_json())
+            os.replace(tmp_path, self.token_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._mtime_ns = os.stat(self.token_file).st_mtime_ns
+
+    def _refresh(self, creds: Credentials) -> bool:
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            logger.warning(f"Token refresh failed: {e}")
+            return False
+        self._write_token(creds)
+        return True
+
+    def credentials(self) -> Optional[Credentials]:
+        """Valid credentials, or ``None`` if the OAuth flow has to be run first."""
+        with self._lock:
+            self._reload_if_changed()
+            creds = self._creds
+            if creds is None:
+                return None
+            if not creds.valid:
+                # Only reached when the background refresh missed its window
+                if not (creds.refresh_token and self._refresh(creds)):
+                    return None
+            return creds
+
+    def service(self) -> Optional[Any]:
+        """Shared Gmail API service; each thread making calls should build its own."""
+        with self._lock:
+            creds = self.credentials()
+            if creds is None:
+                return None
+            if self._service is None:
+                self._service = build_service(creds)
+            return self._service
+
+    def save(self, creds: Credentials) -> None:
+        """Store credentials obtained from an OAuth flow."""
+        with self._lock:
+            self._write_token(creds)
+            self._creds = creds
+            self._service = None
+
+    def refresh_if_due(self) -> bool:
+        """Refresh the access token if it expires within ``refresh_margin`` seconds."""
+        with self._lock:
+            self._reload_if_changed()
+            creds = self._creds
+            if creds is None or not creds.refresh_token or creds.expiry is None:
+                return False
+            # google-auth keeps expiry as a naive UTC datetime
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            remaining = creds.expiry - now
+            if remaining > timedelta(seconds=self.refresh_margin):
+                return False
+            return self._refresh(creds)
+
+    def start_refresher(self, interval: float = 60.0) -> None:
+        """Check the token every ``interval`` seconds in a daemon thread (idempotent)."""
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop,
+                args=(interval,),
+                name="gmail-token-refresher",
+                daemon=True,
+            )
+            self._refresher.start()
+
+    def stop_refresher(self) -> None:
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def _refresh_loop(self, interval: float) -> None:
+        while True:
+            try:
+                self.refresh_if_due()
+            except Exception:
+                logger.exception("Background token refresh failed")
+            if self._stop.wait(interval):
+                return
+
+
+def build_service(creds: Credentials) -> Any:
+    """Gmail API service from the bundled discovery document."""
+    return build("gmail", "v1", credentials=creds, static_discovery=True)
+
+
+@lru_cache(maxsize=None)
+def _gmail_auth(token_file: str, scopes: tuple) -> GmailAuth:
+    return GmailAuth(token_file, scopes)
+
+
+def get_gmail_auth(token_file: str, scopes: Sequence[str]) -> GmailAuth:
+    """The process-wide ``GmailAuth`` of a token file."""
+    return _gmail_auth(os.path.abspath(token_file), tuple(scopes))
@@ -1,18 +1,51 @@
 import base64
-import os.path
+import time
 import warnings
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from email.message import EmailMessage
-from typing import Any, List, Optional
+from typing import (
+    Any,
+    BinaryIO,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
 import pytz
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from gmail_integration.gmail_auth import build_service, get_gmail_auth
+from gmail_integration.history_checkpoint import HistoryCheckpoint
+from observability.metrics import track
+
+
+@dataclass
+class Attachment:
+    message_id: str
+    part_id: str
+    filename: str
+    mime_type: str
+    size: int
+    # Set for attachments stored separately by Gmail and downloaded on demand
+    attachment_id: Optional[str] = None
+    # Small attachments come inline as base64url; kept encoded until requested
+    inline_data: Optional[str] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "message_id": self.message_id,
+            "part_id": self.part_id,
+            "filename": self.filename,
+            "mime_type": self.mime_type,
+            "size": self.size,
+            "attachment_id": self.attachment_id,
+        }
+
 
 @dataclass
 class Email:
@@ -25,6 +58,9 @@ class Email:
     body: str
     timestamp: datetime
     email_message_id: str
+    attachments: List[Attachment] = field(default_factory=list)
+    # Name of the mailbox the message was fetched from, when serving several
+    mailbox: Optional[str] = None
 
     def to_dict(self) -> dict:
         return {
@@ -37,39 +73,68 @@ class Email:
             "body": self.body,
             "timestamp": self.timestamp.isoformat(),
             "email_message_id": self.email_message_id,
+            "attachments": [attachment.to_dict() for attachment in self.attachments],
         }
 
 
+@dataclass
+class InboxSync:
+    """What ``GmailClient.sync_new_messages`` found, to pass to ``complete_sync``."""
+
+    emails: List[Email]
+    # Every received message the sync looked at, older replies of a thread included
+    message_ids: List[str]
+    # Where the checkpoint moves once the emails are answered; None when some
+    # messages could not be fetched, so that the next sync lists them again
+    history_id: Optional[str]
+
+
 class GmailClient:
     SCOPES = ["https://mail.google.com/"]
+    # Page size for messages().list and history().list (Gmail allows up to 500)
+    PAGE_SIZE = 500
+    # Messages carrying these labels were not received from someone else
+    OUTGOING_LABELS = {"SENT", "DRAFT", "SPAM", "TRASH"}
+    # Headers requested in the metadata phase of the two-phase fetch
+    METADATA_HEADERS = ["From", "To", "Subject", "Date", "Message-ID"]
+    # Base64 characters decoded per step when saving attachments (multiple of 4)
+    ATTACHMENT_CHUNK_SIZE = 256 * 1024
+    # Gmail accepts up to 100 calls per batch, but larger batches are more likely
+    # to have individual calls rejected with 429 (rate limit exceeded)
+    MAX_BATCH_SIZE = 100
+    BATCH_RETRIES = 3
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
 
     def __init__(
-        self, credentials_file: str = "credentials.json", token_file: str = "token.json"
+        self,
+        credentials_file: str = "credentials.json",
+        token_file: str = "token.json",
+        batch_size: int = 50,
+        service: Optional[Any] = None,
     ):
+        if not 1 <= batch_size <= self.MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {self.MAX_BATCH_SIZE}")
+
         self.credentials_file = credentials_file
         self.token_file = token_file
-        self.service = self._authenticate()
+        self.batch_size = batch_size
+        self.service = service if service is not None else self._authenticate()
 
     def _authenticate(self) -> Any:
-        creds = None
-
-        if os.path.exists(self.token_file):
-            creds = Credentials.from_authorized_user_file(self.token_file, self.SCOPES)
-
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.credentials_file, self.SCOPES
-                )
-                creds = flow.run_local_server(port=0)
-
-        if not os.path.exists(self.token_file) and creds:
-            with open(self.token_file, "w") as token:
-                token.write(creds.to_json())
+        # Credentials are shared by all clients of a token file and refreshed in
+        # the background; the service is per client, as it is not thread-safe
+        auth = get_gmail_auth(self.token_file, self.SCOPES)
+        creds = auth.credentials()
+
+        if creds is None:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                self.credentials_file, self.SCOPES
+            )
+            auth.save(flow.run_local_server(port=0))
+            creds = auth.credentials()
 
-        return build("gmail", "v1", credentials=creds)
+        auth.start_refresher()
+        return build_service(creds)
 
     def _parse_email_message(self, message: dict) -> Email:
         headers = message["payload"]["headers"]
@@ -117,22 +182,157 @@ class GmailClient:
             elif name.lower() == "message-id":
                 email_data["email_message_id"] = header["value"]
 
-        if "parts" in message["payload"]:
-            for part in message["payload"]["parts"]:
-                if part["mimeType"] == "text/plain" and "data" in part["body"]:
-                    body = base64.urlsafe_b64decode(
-                        part["body"]["data"].encode("ASCII")
-                    ).decode("utf-8")
-                    email_data["body"] = body
-                    break
-        elif "body" in message["payload"] and "data" in message["payload"]["body"]:
-            body = base64.urlsafe_b64decode(
-                message["payload"]["body"]["data"].encode("ASCII")
+        payload = message.get("payload", {})
+        text_part = None
+        attachments = []
+        for part in self._walk_parts(payload):
+            body = part.get("body", {})
+            if part.get("filename"):
+                attachments.append(
+                    Attachment(
+                        message_id=message["id"],
+                        part_id=part.get("partId", ""),
+                        filename=part["filename"],
+                        mime_type=part.get("mimeType", ""),
+                        size=body.get("size", 0),
+                        attachment_id=body.get("attachmentId"),
+                        inline_data=body.get("data"),
+                    )
+                )
+            elif text_part is None and "data" in body:
+                if part.get("mimeType") == "text/plain" or "parts" not in payload:
+                    text_part = part
+
+        if text_part is not None:
+            email_data["body"] = base64.urlsafe_b64decode(
+                text_part["body"]["data"].encode("ASCII")
             ).decode("utf-8")
-            email_data["body"] = body
+        email_data["attachments"] = attachments
 
         return Email(**email_data)
 
+    @staticmethod
+    def _walk_parts(part: dict) -> Iterator[dict]:
+        """Yield a MIME part and all of its nested parts, depth first."""
+        yield part
+        for child in part.get("parts", []):
+            yield from GmailClient._walk_parts(child)
+
+    def _get_messages(self, message_ids: List[str], format: str = "full") -> List[dict]:
+        """Fetch messages with batch requests of ``batch_size`` calls each.
+
+        Calls rejected with a retryable status are re-sent in a later batch; messages
+        that still fail are skipped. Results keep the order of ``message_ids``.
+        """
+        fetched: Dict[str, dict] = {}
+        retry: List[str] = []
+
+        def callback(request_id: str, response: dict, exception: Any) -> None:
+            if exception is None:
+                fetched[request_id] = response
+            elif (
+                isinstance(exception, HttpError)
+                and exception.resp.status in self.RETRYABLE_STATUSES
+            ):
+                retry.append(request_id)
+            else:
+                warnings.warn(
+                    f"Failed to fetch message {request_id}: {exception}", stacklevel=2
+                )
+
+        params: Dict[str, Any] = {"format": format}
+        if format == "metadata":
+            params["metadataHeaders"] = self.METADATA_HEADERS
+
+        pending = list(dict.fromkeys(message_ids))
+        for attempt in range(self.BATCH_RETRIES + 1):
+            for start in range(0, len(pending), self.batch_size):
+                batch = self.service.new_batch_http_request(callback=callback)
+                for message_id in pending[start : start + self.batch_size]:
+                    request = (
+                        self.service.users()
+                        .messages()
+                        .get(userId="me", id=message_id, **params)
+                    )
+                    batch.add(request, request_id=message_id)
+                with track("gmail_fetch", "batch"):
+                    batch.execute()
+
+            if not retry:
+                break
+            pending, retry[:] = list(retry), []
+            if attempt < self.BATCH_RETRIES:
+                time.sleep(0.5 * 2**attempt)
+        else:
+            warnings.warn(
+                f"Giving up on {len(pending)} messages after retries", stacklevel=2
+            )
+
+        return [
+            fetched[message_id] for message_id in message_ids if message_id in fetched
+        ]
+
+    def _get_latest_in_threads(
+        self, message_ids: List[str], skip_outgoing: bool = False
+    ) -> Tuple[List[Email], List[str], List[str]]:
+        """Two-phase fetch of the newest message of each thread.
+
+        Headers are fetched first (``format="metadata"``) to drop older replies of
+        the same thread; only the surviving messages are then downloaded in full.
+        Attachment contents are never downloaded here, see ``save_attachment``.
+
+        Returns the full emails, the ids of every message that was considered and
+        the ids of messages that could not be fetched.
+        """
+        headers_only = self._get_messages(message_ids, format="metadata")
+        missing = set(message_ids) - {msg["id"] for msg in headers_only}
+        if skip_outgoing:
+            headers_only = [
+                msg
+                for msg in headers_only
+                if not self.OUTGOING_LABELS.intersection(msg.get("labelIds", []))
+            ]
+
+        latest = self._remove_older_replies_in_the_same_thread(
+            [self._parse_email_message(msg) for msg in headers_only]
+        )
+        full = self._get_messages([email.message_id for email in latest])
+        missing.update({email.message_id for email in latest} - {m["id"] for m in full})
+        emails = [self._parse_email_message(msg) for msg in full]
+
+        return emails, [msg["id"] for msg in headers_only], sorted(missing)
+
+    def save_attachment(self, attachment: Attachment, destination: BinaryIO) -> int:
+        """Download an attachment into ``destination`` and return the bytes written.
+
+        Gmail returns attachments base64url-encoded inside a JSON response, not
+        as media, so the encoded payload is held in memory in full. It is
+        decoded and written in chunks, so no decoded copy of the whole
+        attachment is made on top of it.
+        """
+        if attachment.inline_data is not None:
+            data = attachment.inline_data
+        else:
+            data = (
+                self.service.users()
+                .messages()
+                .attachments()
+                .get(
+                    userId="me",
+                    messageId=attachment.message_id,
+                    id=attachment.attachment_id,
+                )
+                .execute()["data"]
+            )
+
+        written = 0
+        for start in range(0, len(data), self.ATTACHMENT_CHUNK_SIZE):
+            chunk = data[start : start + self.ATTACHMENT_CHUNK_SIZE]
+            written += destination.write(
+                base64.urlsafe_b64decode(chunk + "=" * (-len(chunk) % 4))
+            )
+        return written
+
     def get_last_email(self) -> Optional[Email]:
         try:
             results = (
@@ -200,22 +400,13 @@ class GmailClient:
             )
 
             messages = results.get("messages", [])
-            emails = []
 
             if not messages:
                 return []
 
-            for message in messages:
-                msg = (
-                    self.service.users()
-                    .messages()
-                    .get(userId="me", id=message["id"], format="full")
-                    .execute()
-                )
-
-                emails.append(self._parse_email_message(msg))
-
-            emails = self._remove_older_replies_in_the_same_thread(emails)
+            emails, _, _ = self._get_latest_in_threads(
+                [message["id"] for message in messages]
+            )
             sorted_emails = sorted(emails, key=lambda x: x.timestamp, reverse=True)
 
             # Mark emails as read if requested
@@ -228,6 +419,115 @@ class GmailClient:
         except HttpError:
             return []
 
+    def sync_new_messages(self, checkpoint: HistoryCheckpoint) -> InboxSync:
+        """Find every inbox message added since the last completed sync.
+
+        Uses the Gmail history API from the ``historyId`` stored in ``checkpoint``,
+        following all result pages. Without a checkpoint, or when Gmail no longer
+        has history that old (HTTP 404), falls back to a full resync of the unread
+        inbox. The checkpoint is left as is: pass the result to ``complete_sync``
+        once its emails have been answered, so that a crash before then lists them
+        again.
+        """
+        start_history_id = checkpoint.load()
+        message_ids = None
+        if start_history_id is not None:
+            try:
+                message_ids, history_id = self._list_history_since(start_history_id)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                warnings.warn(
+                    f"History checkpoint {start_history_id} expired, doing a full resync",
+                    stacklevel=2,
+                )
+
+        if message_ids is None:
+            message_ids, history_id = self._list_all_unread()
+
+        emails, received_ids, missing = self._get_latest_in_threads(
+            message_ids, skip_outgoing=True
+        )
+        return InboxSync(
+            emails=sorted(emails, key=lambda x: x.timestamp, reverse=True),
+            message_ids=received_ids,
+            history_id=None if missing else history_id,
+        )
+
+    def complete_sync(
+        self,
+        checkpoint: HistoryCheckpoint,
+        sync: InboxSync,
+        mark_as_read: bool = False,
+        failed_ids: Collection[str] = (),
+    ) -> None:
+        """Record that the emails of ``sync`` have been answered.
+
+        Moves ``checkpoint`` to where the sync got to, unless some of its emails
+        (``failed_ids``) were not answered or could not be fetched; the next sync
+        then starts from the same place and lists them again. With
+        ``mark_as_read`` the sync's messages, except ``failed_ids``, lose their
+        UNREAD label, so that a full resync does not list them again either.
+        """
+        if mark_as_read:
+            self.mark_as_read([i for i in sync.message_ids if i not in failed_ids])
+        if sync.history_id is not None and not failed_ids:
+            checkpoint.save(sync.history_id)
+
+    def _list_history_since(self, start_history_id: str) -> Tuple[List[str], str]:
+        message_ids: List[str] = []
+        page_token = None
+        while True:
+            results = (
+                self.service.users()
+                .history()
+                .list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    labelId="INBOX",
+                    maxResults=self.PAGE_SIZE,
+                    pageToken=page_token,
+                )
+                .execute()
+            )
+            for record in results.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    message = added["message"]
+                    if not self.OUTGOING_LABELS.intersection(
+                        message.get("labelIds", [])
+                    ):
+                        message_ids.append(message["id"])
+
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return list(dict.fromkeys(message_ids)), results["historyId"]
+
+    def _list_all_unread(self) -> Tuple[List[str], str]:
+        # Read the history id first: anything arriving while we page through the
+        # inbox is picked up (at worst twice) by the next incremental sync
+        history_id = self.service.users().getProfile(userId="me").execute()["historyId"]
+
+        message_ids: List[str] = []
+        page_token = None
+        while True:
+            results = (
+                self.service.users()
+                .messages()
+                .list(
+                    userId="me",
+                    labelIds=["UNREAD", "INBOX"],
+                    maxResults=self.PAGE_SIZE,
+                    pageToken=page_token,
+                )
+                .execute()
+            )
+            message_ids.extend(message["id"] for message in results.get("messages", []))
+
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return message_ids, history_id
+
     def _remove_older_replies_in_the_same_thread(
         self, emails: list[Email]
     ) -> list[Email]:
@@ -260,85 +560,111 @@ class GmailClient:
             )
 
             messages = results.get("messages", [])
-            emails = []
-
-            for message in messages:
-                msg = (
-                    self.service.users()
-                    .messages()
-                    .get(userId="me", id=message["id"], format="full")
-                    .execute()
-                )
 
-                emails.append(self._parse_email_message(msg))
+            emails = [
+                self._parse_email_message(msg)
+                for msg in self._get_messages([message["id"] for message in messages])
+            ]
 
             return sorted(emails, key=lambda x: x.timestamp, reverse=True)
 
         except HttpError:
             return []
 
-    def send_email(self, to_email: str, subject: str, body: str) -> bool:
-        try:
-            message = EmailMessage()
-            message["To"] = to_email
-            message["Subject"] = subject
-            message.set_content(body)
+    @staticmethod
+    def build_message(to_email: str, subject: str, body: str) -> dict:
+        """Encode a plain-text email as a ``messages.send`` request body."""
+        message = EmailMessage()
+        message["To"] = to_email
+        message["Subject"] = subject
+        message.set_content(body)
 
-            encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
 
-            create_message = {"raw": encoded_message}
+        return {"raw": encoded_message}
 
-            self.service.users().messages().send(
-                userId="me", body=create_message
-            ).execute()
+    def build_reply(self, email: Email, body: str) -> dict:
+        """Encode an HTML reply quoting ``email`` as a ``messages.send`` request body."""
+        to_email = email.sender
 
-            return True
+        subject = email.subject
+        if not subject.lower().startswith("re:"):
+            subject = f"Re: {subject}"
 
-        except HttpError:
-            return False
+        quoted_text_html = self._format_quoted_text_html(email)
 
-    def reply_to_email(self, email: Email, body: str) -> bool:
-        try:
-            to_email = email.sender
+        message = EmailMessage()
+        message["To"] = to_email
+        message["Subject"] = subject
 
-            subject = email.subject
-            if not subject.lower().startswith("re:"):
-                subject = f"Re: {subject}"
+        if email.email_message_id:
+            message["References"] = email.email_message_id
+            message["In-Reply-To"] = email.email_message_id
 
-            quoted_text_html = self._format_quoted_text_html(email)
+        body = body.replace("\n>", "<br>")
+        body = body.replace("\n", "<br>")
+        html_content = f"""
+        <div style="font-family: Arial, sans-serif;">
+            <div>{body}</div>
+            {quoted_text_html}
+        </div>
+        """
+        html_content = html_content.replace("\n", "")
 
-            message = EmailMessage()
-            message["To"] = to_email
-            message["Subject"] = subject
+        message.set_content(html_content, subtype="html")
+        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
 
-            if email.email_message_id:
-                message["References"] = email.email_message_id
-                message["In-Reply-To"] = email.email_message_id
+        return {"raw": encoded_message, "threadId": email.thread_id}
 
-            body = body.replace("\n>", "<br>")
-            body = body.replace("\n", "<br>")
-            html_content = f"""
-            <div style="font-family: Arial, sans-serif;">
-                <div>{body}</div>
-                {quoted_text_html}
-            </div>
-            """
-            html_content = html_content.replace("\n", "")
+    def send_email(self, to_email: str, subject: str, body: str) -> bool:
+        try:
+            with track("gmail_send", "single"):
+                self.service.users().messages().send(
+                    userId="me", body=self.build_message(to_email, subject, body)
+                ).execute()
 
-            message.set_content(html_content, subtype="html")
-            encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+            return True
 
-            create_message = {"raw": encoded_message, "threadId": email.thread_id}
+        except HttpError:
+            return False
 
-            self.service.users().messages().send(
-                userId="me", body=create_message
-            ).execute()
+    def reply_to_email(self, email: Email, body: str) -> bool:
+        try:
+            with track("gmail_send", "single"):
+                self.service.users().messages().send(
+                    userId="me", body=self.build_reply(email, body)
+                ).execute()
 
             return True
 
         except HttpError:
             return False
 
+    def send_messages(self, messages: List[dict]) -> List[Optional[Exception]]:
+        """Send prepared messages (see ``build_message``) in a single batch request.
+
+        Returns, for each message, the error it failed with or ``None`` if it was
+        sent. Errors of the batch request as a whole are raised.
+        """
+        if len(messages) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"At most {self.MAX_BATCH_SIZE} messages per batch")
+
+        errors: Dict[str, Optional[Exception]] = {}
+
+        def callback(request_id: str, response: dict, exception: Any) -> None:
+            errors[request_id] = exception
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for index, message in enumerate(messages):
+            batch.add(
+                self.service.users().messages().send(userId="me", body=message),
+                request_id=str(index),
+            )
+        with track("gmail_send", "batch"):
+            batch.execute()
+
+        return [errors.get(str(index)) for index in range(len(messages))]
+
     def _format_quoted_text_html(self, email: Email) -> str:
         try:
             date_obj = email.timestamp
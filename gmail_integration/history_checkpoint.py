@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+from typing import Optional
+
+
+class HistoryCheckpoint:
+    """Persists the Gmail ``historyId`` up to which the inbox has been synced.
+
+    The value is written to a temporary file and atomically renamed over the
+    checkpoint, so a crash mid-write never leaves a truncated checkpoint behind.
+    """
+
+    def __init__(self, path: str = "gmail_history.json"):
+        self.path = path
+
+    def load(self) -> Optional[str]:
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("history_id")
+        except FileNotFoundError:
+            return None
+        except (ValueError, AttributeError):
+            # Unreadable checkpoint: treat it as missing and resync from scratch
+            return None
+
+    def save(self, history_id: str) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=".history-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"history_id": str(history_id)}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,165 @@
+import asyncio
+import glob
+import hashlib
+import heapq
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+
+def mailbox_owner(name: str, worker_count: int) -> int:
+    """Index of the worker that owns a mailbox.
+
+    Rendezvous hashing: each worker gets a stable pseudo-random score per mailbox
+    and the highest score wins. Unlike ``hash()`` this is the same in every
+    process, and changing the worker count only moves the mailboxes of the
+    workers that were added or removed.
+    """
+    if worker_count < 1:
+        raise ValueError("worker_count must be positive")
+
+    def score(worker: int) -> bytes:
+        return hashlib.sha1(f"{worker}:{name}".encode()).digest()
+
+    return max(range(worker_count), key=score)
+
+
+def discover_mailboxes(token_dir: str) -> Dict[str, str]:
+    """Mailbox name -> token file for every ``<name>.json`` token in ``token_dir``."""
+    return {
+        os.path.splitext(os.path.basename(path))[0]: path
+        for path in sorted(glob.glob(os.path.join(token_dir, "*.json")))
+    }
+
+
+@dataclass
+class Mailbox:
+    name: str
+    token_file: str
+    interval: float
+    next_poll_at: float = 0.0
+    polling: bool = False
+    polls: int = 0
+    messages: int = 0
+
+
+class MailboxScheduler:
+    """Decides which mailbox to sync next.
+
+    The mailbox whose poll is due the earliest goes first, and a mailbox is never
+    handed out again before the previous sync of it completed, so a slow or busy
+    mailbox cannot starve the others. Intervals adapt to activity: a sync that
+    found new messages resets the mailbox to ``min_interval``, an empty one
+    multiplies its interval by ``backoff`` up to ``max_interval``. Some jitter
+    keeps mailboxes added together from being polled in lockstep.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 10.0,
+        max_interval: float = 300.0,
+        backoff: float = 2.0,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Need 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.clock = clock
+        self._mailboxes: Dict[str, Mailbox] = {}
+        # (next_poll_at, name); entries of removed or rescheduled mailboxes are
+        # skipped when popped
+        self._heap: List[Tuple[float, str]] = []
+        self._changed: Optional[asyncio.Event] = None
+
+    def _schedule(self, mailbox: Mailbox, at: float) -> None:
+        mailbox.next_poll_at = at
+        heapq.heappush(self._heap, (at, mailbox.name))
+        if self._changed is not None:
+            self._changed.set()
+
+    def add(self, name: str, token_file: str) -> Mailbox:
+        """Start polling a mailbox; it is due right away."""
+        mailbox = self._mailboxes.get(name)
+        if mailbox is None:
+            mailbox = Mailbox(
+                name=name, token_file=token_file, interval=self.min_interval
+            )
+            self._mailboxes[name] = mailbox
+            self._schedule(mailbox, self.clock())
+        return mailbox
+
+    def remove(self, name: str) -> None:
+        self._mailboxes.pop(name, None)
+
+    def mailboxes(self) -> List[Mailbox]:
+        return list(self._mailboxes.values())
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._mailboxes
+
+    def __len__(self) -> int:
+        return len(self._mailboxes)
+
+    def next_due(self) -> Optional[Mailbox]:
+        """Take the mailbox that is most overdue, if any is due now."""
+        now = self.clock()
+        while self._heap:
+            at, name = self._heap[0]
+            mailbox = self._mailboxes.get(name)
+            if mailbox is None or mailbox.polling or mailbox.next_poll_at != at:
+                heapq.heappop(self._heap)
+                continue
+            if at > now:
+                return None
+            heapq.heappop(self._heap)
+            mailbox.polling = True
+            return mailbox
+        return None
+
+    def completed(self, mailbox: Mailbox, new_messages: int) -> None:
+        """Record the outcome of a sync and schedule the next one."""
+        mailbox.polling = False
+        mailbox.polls += 1
+        mailbox.messages += new_messages
+        if new_messages:
+            mailbox.interval = self.min_interval
+        else:
+            mailbox.interval = min(self.max_interval, mailbox.interval * self.backoff)
+        if mailbox.name in self._mailboxes:
+            spread = 1 + random.uniform(-self.jitter, self.jitter)
+            self._schedule(mailbox, self.clock() + mailbox.interval * spread)
+
+    async def due(self) -> AsyncIterator[Mailbox]:
+        """Yield mailboxes as their polls become due, forever."""
+        self._changed = asyncio.Event()
+        while True:
+            mailbox = self.next_due()
+            if mailbox is not None:
+                yield mailbox
+                continue
+            # After next_due() the head of the heap, if any, is the next valid entry
+            timeout = max(0.0, self._heap[0][0] - self.clock()) if self._heap else None
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def report(self) -> List[Dict[str, Any]]:
+        now = self.clock()
+        return [
+            {
+                "mailbox": mailbox.name,
+                "interval_s": mailbox.interval,
+                "due_in_s": max(0.0, mailbox.next_poll_at - now),
+                "polls": mailbox.polls,
+                "messages": mailbox.messages,
+            }
+            for mailbox in self._mailboxes.values()
+        ]
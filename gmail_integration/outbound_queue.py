@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from gmail_integration.gmail_client import GmailClient
+from observability.stage_stats import StageStats
+
+logger = logging.getLogger(__name__)
+
+# Sends a batch of ``messages.send`` bodies; returns the error of each, or None
+SendBatch = Callable[[List[dict]], List[Optional[Exception]]]
+
+
+class TokenBucket:
+    """Allows ``rate`` operations per second on average, in bursts of ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def take(self, wanted: int) -> int:
+        """Wait for at least one token and take up to ``wanted`` of them."""
+        self._refill()
+        while self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._refill()
+        granted = min(wanted, int(self._tokens))
+        self._tokens -= granted
+        return granted
+
+
+class OutboundQueue:
+    """Durable queue of outgoing emails, sent in the background.
+
+    ``enqueue`` only inserts a row into SQLite and returns, so request handlers
+    never wait on Gmail. ``run`` sends due messages in batches of up to
+    ``batch_size``, at most ``sends_per_second`` on average: a ``messages.send``
+    call costs 100 of the 250 quota units a Gmail user gets per second, so the
+    default stays under that limit. Throttling (429) and server errors are
+    retried with exponential backoff; other errors, or ``max_attempts`` failed
+    tries, mark the message as failed.
+
+    Messages stay in the table until Gmail accepts them, so pending sends survive
+    restarts. Delivery is at-least-once: a crash between a successful send and
+    the delete that follows it re-sends that message. Other processes may
+    enqueue into the same file, but only one may ``run`` it at a time, or
+    messages are sent twice and the send rate adds up.
+    """
+
+    def __init__(
+        self,
+        send_batch: SendBatch,
+        path: str = "outbound_mail.db",
+        sends_per_second: float = 2.0,
+        batch_size: int = 10,
+        max_attempts: int = 5,
+        retry_delay: float = 2.0,
+        poll_interval: float = 1.0,
+    ):
+        self.send_batch = send_batch
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Messages enqueued by other processes sharing the file are seen this often
+        self.poll_interval = poll_interval
+        self.stats = StageStats("outbound")
+        self.retried = 0
+        self._bucket = TokenBucket(sends_per_second, capacity=batch_size)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._started_at = time.monotonic()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbound_messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " enqueued_at REAL NOT NULL,"
+            " next_attempt_at REAL NOT NULL,"
+            " last_error TEXT"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS outbound_messages_due"
+            " ON outbound_messages (status, next_attempt_at)"
+        )
+        self._conn.commit()
+
+    def enqueue(
+        self,
+        message: dict,
+        in_transaction: Optional[Callable[[sqlite3.Connection], None]] = None,
+    ) -> int:
+        """Persist a ``messages.send`` body for sending and return its queue id.
+
+        ``in_transaction`` is called with the queue's connection before the insert
+        is committed, to write other rows of the same file atomically with it.
+        """
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO outbound_messages"
+                    " (payload, enqueued_at, next_attempt_at) VALUES (?, ?, ?)",
+                    (json.dumps(message), now, now),
+                )
+                if in_transaction is not None:
+                    in_transaction(self._conn)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return cursor.lastrowid
+
+    def _due(self, limit: int) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, payload, attempts, enqueued_at FROM outbound_messages"
+                " WHERE status = 'pending' AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at, id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+
+    def _next_attempt_at(self) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbound_messages"
+                " WHERE status = 'pending'"
+            ).fetchone()[0]
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, HttpError):
+            return error.resp.status in GmailClient.RETRYABLE_STATUSES
+        # Connection resets, timeouts and the like
+        return True
+
+    def _record(self, rows: List[tuple], errors: List[Optional[Exception]]) -> None:
+        now = time.time()
+        sent, retry, failed = [], [], []
+        for (message_id, _, attempts, enqueued_at), error in zip(rows, errors):
+            if error is None:
+                sent.append((message_id,))
+                self.stats.processed += 1
+                self.stats.record(now - enqueued_at)
+            elif self._is_retryable(error) and attempts + 1 < self.max_attempts:
+                delay = self.retry_delay * 2**attempts
+                retry.append((now + delay, str(error), message_id))
+                self.retried += 1
+            else:
+                failed.append((str(error), message_id))
+                self.stats.failed += 1
+                logger.error(f"Giving up on outbound message {message_id}: {error}")
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM outbound_messages WHERE id = ?", sent
+                )
+                self._conn.executemany(
+                    "UPDATE outbound_messages SET attempts = attempts + 1,"
+                    " next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    retry,
+                )
+                self._conn.executemany(
+                    "UPDATE outbound_messages SET attempts = attempts + 1,"
+                    " status = 'failed', last_error = ? WHERE id = ?",
+                    failed,
+                )
+
+    async def _send_due(self) -> int:
+        rows = self._due(self.batch_size)
+        if not rows:
+            return 0
+        rows = rows[: await self._bucket.take(len(rows))]
+
+        self.stats.in_flight = len(rows)
+        try:
+            errors = await asyncio.to_thread(
+                self.send_batch, [json.loads(row[1]) for row in rows]
+            )
+        except Exception as e:
+            logger.warning(f"Outbound batch failed: {e}")
+            errors = [e] * len(rows)
+        finally:
+            self.stats.in_flight = 0
+
+        self._record(rows, errors)
+        return len(rows)
+
+    async def run(self, until_empty: bool = False) -> None:
+        """Send messages as they become due, forever or until none are pending."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                self._wakeup.clear()
+                if await self._send_due():
+                    continue
+
+                next_attempt_at = self._next_attempt_at()
+                if next_attempt_at is None and until_empty:
+                    return
+                timeout = self.poll_interval
+                if next_attempt_at is not None:
+                    timeout = min(timeout, max(0.0, next_attempt_at - time.time()))
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._loop = None
+
+    def depth(self) -> int:
+        """Number of messages waiting to be sent, including scheduled retries."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbound_messages WHERE status = 'pending'"
+            ).fetchone()[0]
+
+    def failed_messages(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload, attempts, last_error FROM outbound_messages"
+                " WHERE status = 'failed' ORDER BY id"
+            ).fetchall()
+        return [
+            {
+                "id": message_id,
+                "message": json.loads(payload),
+                "attempts": attempts,
+                "last_error": last_error,
+            }
+            for message_id, payload, attempts, last_error in rows
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        """Queue depth, send counts and enqueue-to-sent latency percentiles."""
+        return {
+            **self.stats.to_dict(time.monotonic() - self._started_at),
+            "queued": self.depth(),
+            "retried": self.retried,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+)
+
+from observability.stage_stats import StageStats
+
+logger = logging.getLogger(__name__)
+
+# Sentinel passed down the queues once the source is exhausted
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One step of a pipeline.
+
+    ``handler`` receives an item and returns the item for the next stage, or
+    ``None`` to drop it. With ``fan_out`` the handler returns an iterable of items
+    instead. At most ``concurrency`` items are handled at once, and at most
+    ``queue_size`` items wait in front of the stage; a full queue blocks the
+    previous stage, which is what provides backpressure.
+    """
+
+    name: str
+    handler: Callable[[Any], Awaitable[Any]]
+    concurrency: int = 1
+    queue_size: int = 10
+    fan_out: bool = False
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.stats = {stage.name: StageStats(stage.name) for stage in stages}
+        self._queues: List[asyncio.Queue[Any]] = []
+        self._started_at: Optional[float] = None
+
+    async def run(self, source: AsyncIterator[Any]) -> None:
+        """Feed items from ``source`` through all stages until it is exhausted."""
+        self._started_at = time.monotonic()
+        self._queues = [
+            asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages
+        ]
+
+        workers = []
+        for index, stage in enumerate(self.stages):
+            output = self._queues[index + 1] if index + 1 < len(self.stages) else None
+            stage_workers = [
+                asyncio.create_task(self._worker(stage, self._queues[index], output))
+                for _ in range(stage.concurrency)
+            ]
+            workers.append(stage_workers)
+
+        try:
+            async for item in source:
+                await self._queues[0].put(item)
+        except BaseException:
+            for stage_workers in workers:
+                for worker in stage_workers:
+                    worker.cancel()
+            await asyncio.gather(
+                *(worker for stage_workers in workers for worker in stage_workers),
+                return_exceptions=True,
+            )
+            raise
+
+        # Shut stages down in order so every queued item is still processed
+        for index, stage_workers in enumerate(workers):
+            for _ in stage_workers:
+                await self._queues[index].put(_DONE)
+            await asyncio.gather(*stage_workers)
+
+    async def _worker(
+        self,
+        stage: Stage,
+        input_queue: "asyncio.Queue[Any]",
+        output_queue: "Optional[asyncio.Queue[Any]]",
+    ) -> None:
+        stats = self.stats[stage.name]
+        while True:
+            item = await input_queue.get()
+            if item is _DONE:
+                return
+
+            stats.in_flight += 1
+            start = time.monotonic()
+            try:
+                result = await stage.handler(item)
+            except Exception:
+                stats.failed += 1
+                logger.exception(f"Stage {stage.name} failed")
+                continue
+            finally:
+                stats.in_flight -= 1
+                stats.record(time.monotonic() - start)
+
+            stats.processed += 1
+            if output_queue is None:
+                continue
+            results: Iterable[Any] = result if stage.fan_out else [result]
+            for out in results:
+                if out is None:
+                    stats.dropped += 1
+                else:
+                    await output_queue.put(out)
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {
+            stage.name: queue.qsize() for stage, queue in zip(self.stages, self._queues)
+        }
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per-stage throughput, latency percentiles and current queue depth."""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        depths = self.queue_depths()
+        return [
+            {
+                **self.stats[stage.name].to_dict(elapsed),
+                "queued": depths.get(stage.name, 0),
+            }
+            for stage in self.stages
+        ]
@@ -12,6 +12,8 @@ try:
 except ImportError:
     from functions import function_handler
 
+from mcp_stuff.tool_registry import ToolArgumentError, UnknownToolError
+
 load_dotenv()
 
 # Handle SSL certificates for macOS
@@ -106,7 +108,10 @@ class LLMEngine:
 
             # Execute the function if function_handler is available
             if function_handler is not None:
-                result = function_handler.execute_function(name, args)
+                try:
+                    result = function_handler.execute_function(name, args)
+                except (UnknownToolError, ToolArgumentError) as e:
+                    result = {"error": str(e)}
 
                 input_messages.append(
                     {
@@ -0,0 +1,105 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+
+class Overloaded(Exception):
+    """Raised instead of taking on more work; answered with a 429."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        # Seconds after which a retry is likely to be admitted
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Bounds how many requests of one kind run at once, and how many wait.
+
+    Up to ``concurrency`` requests run; the next ``queue_size`` wait for a
+    slot, first come first served, for up to ``max_wait`` seconds. Requests
+    beyond that, or that waited too long, are refused with ``Overloaded``
+    right away, so a spike is shed at the door instead of piling up MCP
+    subprocesses and LLM calls. Requests that are not limited are not slowed
+    down by the ones that are.
+    """
+
+    def __init__(
+        self, name: str, concurrency: int, queue_size: int, max_wait: float
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("Need a concurrency of at least one")
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.admitted = 0
+        self.rejected = 0
+        self.running = 0
+        self._waiters: Deque[asyncio.Future[None]] = deque()
+        # Moving average of how long an admitted request runs, for Retry-After
+        self._service_time = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the requests already waiting have likely been admitted."""
+        queued = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_time * queued / self.concurrency))
+
+    def _refuse(self, reason: str) -> Overloaded:
+        self.rejected += 1
+        return Overloaded(f"{self.name} {reason}", self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Run the block in a slot, waiting for one if the queue has room."""
+        if self.running < self.concurrency and not self._waiters:
+            self.running += 1
+        else:
+            await self._wait_for_slot()
+        self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self._service_time += 0.2 * (elapsed - self._service_time)
+            self._release()
+
+    async def _wait_for_slot(self) -> None:
+        if len(self._waiters) >= self.queue_size:
+            raise self._refuse("is at capacity")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the caller went away; pass it on
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._refuse("had no free slot in time") from None
+            raise
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest waiter, so newcomers cannot
+        # overtake the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "running": self.running,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+        }
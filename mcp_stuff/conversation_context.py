@@ -0,0 +1,201 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+# Any number in a question may be a shipment or BOL id the thread has not seen yet
+_SHIPMENT_REFERENCE = re.compile(r"\d+")
+
+
+@dataclass
+class ThreadContext:
+    """What earlier messages of one email thread already established."""
+
+    thread_id: str
+    email: str
+    # Shipments resolved in this thread, in the order they were first mentioned
+    shipment_ids: List[int] = field(default_factory=list)
+    # Tool results of the most recent answer, keyed by shipment id
+    last_results: Dict[int, dict] = field(default_factory=dict)
+    # One line per earlier question, oldest first
+    history: Deque[str] = field(default_factory=lambda: deque(maxlen=5))
+    updated_at: float = 0.0
+
+    def references_new_shipment(self, query: str) -> bool:
+        """Whether ``query`` may point at a shipment other than the known ones."""
+        known = {str(shipment_id) for shipment_id in self.shipment_ids}
+        return any(number not in known for number in _SHIPMENT_REFERENCE.findall(query))
+
+    def to_prompt(self) -> str:
+        """Compact summary of the thread to put in front of a follow-up question."""
+        lines = ["Earlier in this email thread:"]
+        lines.extend(f"- {entry}" for entry in self.history)
+        if self.shipment_ids:
+            ids = ", ".join(str(shipment_id) for shipment_id in self.shipment_ids)
+            lines.append(f"Shipments already identified in this thread: {ids}")
+        for shipment_id, result in self.last_results.items():
+            lines.append(
+                f"Last known state of shipment {shipment_id}: "
+                f"status {result.get('shipment_status')}, ETA {result.get('eta')}, "
+                f"delivery date {result.get('delivery_date')}"
+            )
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "thread_id": self.thread_id,
+                "email": self.email,
+                "shipment_ids": self.shipment_ids,
+                "last_results": list(self.last_results.values()),
+                "history": list(self.history),
+                "updated_at": self.updated_at,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "ThreadContext":
+        fields = json.loads(data)
+        context = cls(
+            thread_id=fields["thread_id"],
+            email=fields["email"],
+            shipment_ids=fields["shipment_ids"],
+            last_results={
+                result["shipment_id"]: result for result in fields["last_results"]
+            },
+            updated_at=fields["updated_at"],
+        )
+        context.history.extend(fields["history"])
+        return context
+
+
+class ConversationContextStore:
+    """Per-thread context for shipper email conversations, keyed by Gmail thread id.
+
+    Threads that have been quiet for ``ttl_seconds`` are forgotten, and at most
+    ``max_threads`` are kept (least recently updated go first). Contexts live
+    in SQLite at ``path``, so API worker processes sharing the file see each
+    other's threads; the default ``:memory:`` keeps them to this store.
+    """
+
+    QUESTION_PREVIEW = 120  # characters of each earlier question kept in history
+
+    def __init__(
+        self,
+        ttl_seconds: float = 6 * 3600,
+        max_threads: int = 10_000,
+        clock: Callable[[], float] = time.time,
+        path: str = ":memory:",
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self.clock = clock
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_contexts ("
+            " thread_id TEXT PRIMARY KEY,"
+            " context TEXT NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS thread_contexts_updated"
+            " ON thread_contexts (updated_at)"
+        )
+        self._conn.commit()
+
+    def _load(self, thread_id: str) -> Optional[ThreadContext]:
+        row = self._conn.execute(
+            "SELECT context FROM thread_contexts WHERE thread_id = ?", (thread_id,)
+        ).fetchone()
+        return ThreadContext.from_json(row[0]) if row else None
+
+    def get(self, thread_id: str, email: str) -> Optional[ThreadContext]:
+        """Context of a thread, if it is still fresh and belongs to ``email``."""
+        with self._lock:
+            context = self._load(thread_id)
+            if (
+                context is not None
+                and self.clock() - context.updated_at > self.ttl_seconds
+            ):
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM thread_contexts WHERE thread_id = ?", (thread_id,)
+                    )
+                context = None
+        if context is None or context.email != email:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return context
+
+    def record(
+        self, thread_id: str, email: str, query: str, results: List[dict]
+    ) -> ThreadContext:
+        """Remember the question asked in a thread and the shipments it resolved to."""
+        with self._lock, self._conn:
+            # Taken before reading, so a question recorded by another worker at
+            # the same time is not lost
+            self._conn.execute("BEGIN IMMEDIATE")
+            context = self._load(thread_id)
+            if context is None or context.email != email:
+                context = ThreadContext(thread_id=thread_id, email=email)
+
+            resolved = [
+                result["shipment_id"]
+                for result in results
+                if result and result.get("shipment_id") is not None
+            ]
+            for shipment_id in resolved:
+                if shipment_id not in context.shipment_ids:
+                    context.shipment_ids.append(shipment_id)
+            if resolved:
+                context.last_results = {
+                    result["shipment_id"]: result for result in results if result
+                }
+
+            question = " ".join(query.split())[: self.QUESTION_PREVIEW]
+            answered = ", ".join(str(shipment_id) for shipment_id in resolved) or "none"
+            context.history.append(
+                f'Asked "{question}", answered shipments: {answered}'
+            )
+            context.updated_at = self.clock()
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO thread_contexts VALUES (?, ?, ?)",
+                (thread_id, context.to_json(), context.updated_at),
+            )
+            self._conn.execute(
+                "DELETE FROM thread_contexts WHERE thread_id IN ("
+                " SELECT thread_id FROM thread_contexts"
+                " ORDER BY updated_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                (self.max_threads,),
+            )
+        return context
+
+    def evict_expired(self) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM thread_contexts WHERE updated_at < ?",
+                (self.clock() - self.ttl_seconds,),
+            )
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM thread_contexts"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
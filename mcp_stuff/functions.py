@@ -1,20 +1,26 @@
-import os
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import joinedload
 
 from database.data_schema import (
     Courier, 
     Shipment, 
+    ShipmentStatus,
     Shipper
 )
+from database.session import get_session
+from mcp_stuff.tool_registry import ToolRegistry
 
 load_dotenv()
 
+# Tools exposed to the LLM engines (FastMCP server and OpenAI LLMEngine)
+tms_tools = ToolRegistry()
+
+
+@tms_tools.tool()
 def get_shipment_by_id(email: str, shipment_id: int) -> Optional[Dict[Any, Any]]:
     """
     Retrieve a shipment record from the database by its ID and the shipper's email.
@@ -30,37 +36,30 @@ def get_shipment_by_id(email: str, shipment_id: int) -> Optional[Dict[Any, Any]]
     Raises:
         SQLAlchemyError: If there's any database-related error
     """
-    engine = create_engine(
-        os.getenv("DB_PATH"),
-        connect_args={"check_same_thread": False},  # Required for SQLite
-    )
-    SessionClass = sessionmaker(bind=engine)
-    db = SessionClass()
-
     if not email:
         raise SQLAlchemyError("Email is not provided. Cannot retrieve shipment info.")
     
     try:
-        
-        shipper = db.query(Shipper).filter(Shipper.email == email).first()
-        if not shipper:
-            raise SQLAlchemyError("No shipper found with the given email.")
-        
-        shipments = (
-            db.query(Shipment)
-            .filter(
-                Shipment.shipment_id == shipment_id,
-                Shipment.shipper_id == shipper.shipper_id
+        with get_session() as db:
+            shipper = db.query(Shipper).filter(Shipper.email == email).first()
+            if not shipper:
+                raise SQLAlchemyError("No shipper found with the given email.")
+
+            shipments = (
+                db.query(Shipment)
+                .filter(
+                    Shipment.shipment_id == shipment_id,
+                    Shipment.shipper_id == shipper.shipper_id
+                )
+                .first()
             )
-            .first()
-        )
 
-        print(f"Shipments: {shipments}")
+            print(f"Shipments: {shipments}")
 
-        if not shipments:
-            return None
+            if not shipments:
+                return None
 
-        return shipments.to_dict()
+            return shipments.to_dict()
 
     except SQLAlchemyError as e:
         # Log the error here if you have a logging system
@@ -69,6 +68,7 @@ def get_shipment_by_id(email: str, shipment_id: int) -> Optional[Dict[Any, Any]]
         )
 
 
+@tms_tools.tool()
 def get_shipment_by_bol_id(email: str, bol_id: int) -> Optional[Dict[Any, Any]]:
     """
     Retrieve a shipment record from the database by its BOL ID and the shipper's email.
@@ -84,34 +84,28 @@ def get_shipment_by_bol_id(email: str, bol_id: int) -> Optional[Dict[Any, Any]]:
     Raises:
         SQLAlchemyError: If there's any database-related error
     """
-    engine = create_engine(
-        os.getenv("DB_PATH"),
-        connect_args={"check_same_thread": False},  # Required for SQLite
-    )
-    SessionClass = sessionmaker(bind=engine)
-    db = SessionClass()
-
     if not email:
         raise SQLAlchemyError("Email is not provided. Cannot retrieve shipment info.")
     
     try:
-        shipper = db.query(Shipper).filter(Shipper.email == email).first()
-        if not shipper:
-            raise SQLAlchemyError("No shipper found with the given email.")
-            
-        shipments = (
-            db.query(Shipment)
-            .filter(
-                Shipment.bol_doc_id == bol_id,
-                Shipment.shipper_id == shipper.shipper_id
+        with get_session() as db:
+            shipper = db.query(Shipper).filter(Shipper.email == email).first()
+            if not shipper:
+                raise SQLAlchemyError("No shipper found with the given email.")
+
+            shipments = (
+                db.query(Shipment)
+                .filter(
+                    Shipment.bol_doc_id == bol_id,
+                    Shipment.shipper_id == shipper.shipper_id
+                )
+                .first()
             )
-            .first()   
-        )
 
-        if not shipments:
-            return None
+            if not shipments:
+                return None
 
-        return shipments.to_dict()
+            return shipments.to_dict()
 
     except SQLAlchemyError as e:
         # Log the error here if you have a logging system
@@ -120,36 +114,31 @@ def get_shipment_by_bol_id(email: str, bol_id: int) -> Optional[Dict[Any, Any]]:
         )
 
 
+@tms_tools.tool()
 def get_all_shipments(shipper_email: str) -> Optional[Dict[Any, Any]]:
     """
     Retrieve all shipments from the database for a given shipper email.
 
     Args:
-        email (str): Email of the shipper
+        shipper_email (str): Email of the shipper
 
     Returns:
         Optional[Dict[Any, Any]]: List of shipment dictionaries if found, None otherwise
 
     """
-    engine = create_engine(
-        os.getenv("DB_PATH"),
-        connect_args={"check_same_thread": False},  # Required for SQLite
-    )
-    SessionClass = sessionmaker(bind=engine)
-    db = SessionClass()
-
     try:
-        shipper = db.query(Shipper).filter(Shipper.email == shipper_email).first()
-        if not shipper:
-            raise SQLAlchemyError("No shipper found with the given email.")
+        with get_session() as db:
+            shipper = db.query(Shipper).filter(Shipper.email == shipper_email).first()
+            if not shipper:
+                raise SQLAlchemyError("No shipper found with the given email.")
 
-        shipments = db.query(Shipment).filter(Shipment.shipper_id == shipper.shipper_id).all()
-        return [shipment.to_dict() for shipment in shipments]
+            shipments = db.query(Shipment).filter(Shipment.shipper_id == shipper.shipper_id).all()
+            return [shipment.to_dict() for shipment in shipments]
     except SQLAlchemyError as e:
         raise SQLAlchemyError(f"Error retrieving shipments for email {shipper_email}: {str(e)}")
 
 
-def get_shipments_by_courier_contact(contact_number: str) -> list[Shipment]:
+def get_courier_by_contact(contact_number: str) -> Optional[Dict[Any, Any]]:
     """
     Retrieve a courier from the database by their contact number.
 
@@ -157,28 +146,78 @@ def get_shipments_by_courier_contact(contact_number: str) -> list[Shipment]:
         contact_number (str): Contact number of the courier
 
     Returns:
-        Courier: Courier object if found, None otherwise
+        Optional[Dict[Any, Any]]: Dictionary containing courier details if found, None otherwise
     """
+    with get_session() as db:
+        courier = db.query(Courier).filter_by(contact_number=contact_number).first()
+        return courier.to_dict() if courier else None
+
+
+def get_shipments_by_courier_id(
+    courier_id: int,
+    status: Optional[ShipmentStatus] = None,
+    limit: Optional[int] = None,
+    older_than: Optional[int] = None,
+    newer_than: Optional[int] = None,
+) -> list[Shipment]:
+    """
+    Retrieve the shipments assigned to a courier, newest (highest id) first.
 
-    engine = create_engine(
-        os.getenv("DB_PATH"),
-        connect_args={"check_same_thread": False},  # Required for SQLite
-    )
-    SessionClass = sessionmaker(bind=engine)
-    db = SessionClass()
+    Args:
+        courier_id (int): The id of the courier
+        status (Optional[ShipmentStatus]): Only shipments with this status
+        limit (Optional[int]): Return at most this many shipments
+        older_than (Optional[int]): Only shipments with a lower id than this one
+        newer_than (Optional[int]): Only shipments with a higher id than this one;
+            with a limit, the ones closest to it are returned
 
-    courier = db.query(Courier).filter_by(contact_number=contact_number).first()
+    Returns:
+        list[Shipment]: The courier's shipments
+    """
+    # Closing the session hands its pooled connection back right away; what
+    # Shipment.to_dict reads is loaded up front so the results outlive it
+    with get_session() as db:
+        query = (
+            db.query(Shipment)
+            .options(joinedload(Shipment.shipper), joinedload(Shipment.courier))
+            .filter_by(courier_id=courier_id)
+        )
+        if status is not None:
+            query = query.filter(Shipment.shipment_status == status)
+        if older_than is not None:
+            query = query.filter(Shipment.shipment_id < older_than)
+        if newer_than is not None:
+            # Walk up from newer_than so the limit keeps the closest shipments
+            query = query.filter(Shipment.shipment_id > newer_than)
+            shipments = query.order_by(Shipment.shipment_id).limit(limit).all()
+            return shipments[::-1]
+        return query.order_by(Shipment.shipment_id.desc()).limit(limit).all()
+
+
+def get_shipments_by_courier_contact(contact_number: str) -> list[Shipment]:
+    """
+    Retrieve the shipments of the courier with the given contact number.
+
+    Args:
+        contact_number (str): Contact number of the courier
+
+    Returns:
+        list[Shipment]: The courier's shipments, empty if there is no such courier
+    """
+    courier = get_courier_by_contact(contact_number)
     if courier:
-        shipments = db.query(Shipment).filter_by(courier_id=courier.courier_id).all()
-        return shipments
+        return get_shipments_by_courier_id(courier["courier_id"])
     else:
         return []
 
 
+@tms_tools.tool()
 def update_shipment_eta(shipment_id: int, seconds: int) -> Shipment:
     """
-    Takes the shipment id and the number of seconds to add to the eta.
-    Returns the updated shipment.
+    Update the eta of a shipment in the database.
+    Only supports adding seconds to the eta.
+    If original eta is not set, will be set to the current time + the number of seconds that are added.
+
     Args:
         shipment_id (int): The id of the shipment to update
         seconds (int): The number of seconds to add to the eta
@@ -186,14 +225,10 @@ def update_shipment_eta(shipment_id: int, seconds: int) -> Shipment:
     Returns:
         Shipment: The updated shipment
     """
-    engine = create_engine(
-        os.getenv("DB_PATH"),
-        connect_args={"check_same_thread": False},  # Required for SQLite
-    )
-    SessionClass = sessionmaker(bind=engine)
-    db = SessionClass()
+    if seconds <= 0:
+        raise ValueError("Seconds must be greater than 0")
 
-    if seconds > 0:
+    with get_session() as db:
         shipment = db.query(Shipment).filter_by(shipment_id=shipment_id).first()
         if not shipment.eta:
             shipment.eta = datetime.now() + timedelta(seconds=seconds)
@@ -201,25 +236,17 @@ def update_shipment_eta(shipment_id: int, seconds: int) -> Shipment:
             shipment.eta = shipment.eta + timedelta(seconds=seconds)
         db.commit()
         return shipment.to_dict()
-    else:
-        raise ValueError("Seconds must be greater than 0")
 
 
 def reset_shipment_eta(shipment_id: int, datetime: datetime) -> Shipment:
     """
     Reset the eta of a shipment in the database.
     """
-    engine = create_engine(
-        os.getenv("DB_PATH"),
-        connect_args={"check_same_thread": False},  # Required for SQLite
-    )
-    SessionClass = sessionmaker(bind=engine)
-    db = SessionClass()
-
-    shipment = db.query(Shipment).filter_by(shipment_id=shipment_id).first()
-    shipment.eta = datetime
-    db.commit()
-    return shipment.to_dict()
+    with get_session() as db:
+        shipment = db.query(Shipment).filter_by(shipment_id=shipment_id).first()
+        shipment.eta = datetime
+        db.commit()
+        return shipment.to_dict()
 
 
 if __name__ == "__main__":
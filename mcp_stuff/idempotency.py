@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from mcp_stuff.single_flight import SingleFlight
+from mcp_stuff.workers import is_running
+
+
+class IdempotencyStore:
+    """Responses of requests that were already handled, by idempotency key.
+
+    A retried request with the same key gets the stored response instead of
+    running again, so a client that timed out and retries does not shift a
+    shipment's ETA twice or email the shipper twice. Responses are kept in
+    SQLite for ``ttl_seconds``, which also covers retries after a restart, and
+    expired ones are dropped when the store is opened. A retry that arrives
+    while the first attempt is still running waits for it, also when the
+    attempt runs in another process sharing the file: an attempt claims its
+    key first, and the claim of a process that died is taken over. Failed
+    attempts are not stored and may be retried.
+    """
+
+    def __init__(
+        self,
+        path: str = "idempotency.db",
+        ttl_seconds: float = 86400,
+        poll_interval: float = 0.1,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # How often a retry checks on an attempt running in another process
+        self.poll_interval = poll_interval
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotent_responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency_claims ("
+            " key TEXT PRIMARY KEY,"
+            " worker INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self.prune()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM idempotent_responses"
+                " WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, response: Any) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO idempotent_responses VALUES (?, ?, ?)",
+                    (key, json.dumps(response), time.time()),
+                )
+
+    def prune(self) -> int:
+        """Forget responses older than the TTL; returns how many."""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM idempotent_responses WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+        return cursor.rowcount
+
+    async def run_once(self, key: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+        """The response stored under ``key``, running ``handler`` if there is none."""
+        if key in self._inflight:
+            self.replayed += 1
+        else:
+            stored = self.get(key)
+            if stored is not None:
+                self.replayed += 1
+                return stored
+        return await self._inflight.do(key, lambda: self._run(key, handler))
+
+    def _claim(self, key: str) -> bool:
+        with self._lock:
+            with self._conn:
+                if self._conn.execute(
+                    "INSERT OR IGNORE INTO idempotency_claims VALUES (?, ?)",
+                    (key, os.getpid()),
+                ).rowcount:
+                    return True
+                row = self._conn.execute(
+                    "SELECT worker FROM idempotency_claims WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return False
+                # Ours can only be left by an earlier process with the same id,
+                # as attempts in this process share one claim
+                if row[0] != os.getpid() and is_running(row[0]):
+                    return False
+                # The claiming process died mid-attempt
+                return bool(
+                    self._conn.execute(
+                        "UPDATE idempotency_claims SET worker = ?"
+                        " WHERE key = ? AND worker = ?",
+                        (os.getpid(), key, row[0]),
+                    ).rowcount
+                )
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM idempotency_claims WHERE key = ?", (key,)
+                )
+
+    async def _run(self, key: str, handler: Callable[[], Awaitable[Any]]) -> Any:
+        while not self._claim(key):
+            # Another process is running this request; wait for its response
+            stored = self.get(key)
+            if stored is not None:
+                return stored
+            await asyncio.sleep(self.poll_interval)
+        try:
+            # It may have finished between our look and our claim
+            stored = self.get(key)
+            if stored is not None:
+                return stored
+            response = await handler()
+            self.put(key, response)
+            return response
+        finally:
+            self._release(key)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from mcp_stuff.admission import Overloaded
+from mcp_stuff.workers import is_running
+from observability import tracing
+from observability.stage_stats import StageStats
+
+logger = logging.getLogger(__name__)
+
+# Runs one job of a kind on its payload; the return value is the job's result
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+FINISHED = ("done", "failed")
+
+
+class JobQueue:
+    """Durable queue of background jobs, run by a pool of asyncio workers.
+
+    ``submit`` only inserts a row into SQLite and returns the job id, so a
+    request handler can answer right away and the client follows the job with
+    ``get`` or ``wait``. ``run`` starts ``workers`` workers that take queued
+    jobs oldest first and run the handler registered for their kind. A job is
+    ``queued``, then ``running``, then ``done`` with the handler's result or
+    ``failed`` with its error; failed jobs are not retried.
+
+    At most ``max_queued`` jobs wait for a worker; ``submit`` refuses more
+    with ``Overloaded`` instead of letting a spike queue unbounded work.
+
+    A job continues the trace of the request that submitted it, so its spans
+    show up under that request.
+
+    Several processes, e.g. API workers, may share the file: each job is
+    claimed by one of them. Jobs survive restarts: jobs that were running in
+    a process that stopped are queued again when a queue starts, so a job may
+    run more than once. Finished jobs are kept for
+    ``ttl_seconds`` so clients can still collect the result.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        path: str = "jobs.db",
+        workers: int = 4,
+        ttl_seconds: float = 86400,
+        poll_interval: float = 1.0,
+        max_queued: Optional[int] = None,
+    ):
+        if workers < 1:
+            raise ValueError("Need at least one worker")
+        self.handlers = handlers
+        self.path = path
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        # Jobs submitted by other processes sharing the file are picked up this often
+        self.poll_interval = poll_interval
+        self.max_queued = max_queued
+        self.rejected = 0
+        self.stats = StageStats("jobs")
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Optional[asyncio.Condition] = None
+        self._started_at = time.monotonic()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'queued',"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " traceparent TEXT,"
+            " worker INTEGER"
+            ")"
+        )
+        # Columns added since the first version of the table
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("traceparent", "TEXT"), ("worker", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (status, created_at)"
+        )
+        self._conn.commit()
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        """Persist a job for the workers and return its id."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for jobs of kind {kind!r}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self.max_queued is not None and self._depth() >= self.max_queued:
+                self.rejected += 1
+                # A worker frees up about every median job time / workers
+                retry_after = self.stats.percentile(0.5) / self.workers
+                raise Overloaded(
+                    f"{self.max_queued} jobs are already queued",
+                    max(1, math.ceil(retry_after)),
+                )
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, payload, created_at, traceparent)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        kind,
+                        json.dumps(payload),
+                        time.time(),
+                        tracing.current_traceparent(),
+                    ),
+                )
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's status, and its result or error once it has finished."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, result, error, created_at, started_at,"
+                " finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, result, error, created_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once it has finished, or as it is after ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and job["status"] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._finished is None:
+                break
+            try:
+                async with self._finished:
+                    await asyncio.wait_for(
+                        self._finished.wait(), min(remaining, self.poll_interval)
+                    )
+            except asyncio.TimeoutError:
+                pass
+            job = self.get(job_id)
+        return job
+
+    def _claim(self) -> Optional[tuple]:
+        with self._lock:
+            with self._conn:
+                return self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, worker = ?"
+                    " WHERE id = (SELECT id FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created_at LIMIT 1)"
+                    " RETURNING id, kind, payload, created_at, started_at,"
+                    " traceparent",
+                    (time.time(), os.getpid()),
+                ).fetchone()
+
+    def _finish(
+        self, job_id: str, result: Any = None, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?,"
+                    " finished_at = ? WHERE id = ?",
+                    (
+                        "failed" if error is not None else "done",
+                        json.dumps(result) if error is None else None,
+                        error,
+                        time.time(),
+                        job_id,
+                    ),
+                )
+
+    async def _run_job(self, row: tuple) -> None:
+        job_id, kind, payload, created_at, started_at, traceparent = row
+        self.stats.in_flight += 1
+        try:
+            with tracing.span(
+                "job",
+                parent=tracing.SpanContext.parse(traceparent),
+                kind=kind,
+                job_id=job_id,
+                queued_ms=round((started_at - created_at) * 1000, 3),
+            ):
+                result = await self.handlers[kind](json.loads(payload))
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({kind}) failed")
+            self._finish(job_id, error=str(e) or type(e).__name__)
+            self.stats.failed += 1
+        else:
+            self._finish(job_id, result=result)
+            self.stats.processed += 1
+            self.stats.record(time.time() - created_at)
+        finally:
+            self.stats.in_flight -= 1
+        async with self._finished:
+            self._finished.notify_all()
+
+    async def _work(self, until_empty: bool) -> None:
+        while True:
+            # Cleared before looking, so a job submitted after the look wakes us
+            self._wakeup.clear()
+            row = self._claim()
+            if row is not None:
+                await self._run_job(row)
+                continue
+            if until_empty:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def requeue_interrupted(self) -> int:
+        """Queue again the jobs left running by stopped processes; returns how many.
+
+        Jobs running in other live processes sharing the file are left alone.
+        Ours can only be left over from an earlier process with the same id,
+        as this runs before our workers start.
+        """
+        requeued = 0
+        with self._lock:
+            with self._conn:
+                workers = self._conn.execute(
+                    "SELECT DISTINCT worker FROM jobs WHERE status = 'running'"
+                ).fetchall()
+                for (worker,) in workers:
+                    if worker is not None and worker != os.getpid():
+                        if is_running(worker):
+                            continue
+                    requeued += self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', started_at = NULL,"
+                        " worker = NULL WHERE status = 'running' AND worker IS ?",
+                        (worker,),
+                    ).rowcount
+        return requeued
+
+    async def run(self, until_empty: bool = False) -> None:
+        """Run jobs with the worker pool, forever or until none are queued."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._finished = asyncio.Condition()
+        self.requeue_interrupted()
+        self.prune()
+        try:
+            await asyncio.gather(
+                *(self._work(until_empty) for _ in range(self.workers))
+            )
+        finally:
+            self._loop = None
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        with self._lock:
+            return self._depth()
+
+    def _depth(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+
+    def prune(self) -> int:
+        """Forget jobs that finished more than the TTL ago; returns how many."""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('done', 'failed')"
+                    " AND finished_at < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+        return cursor.rowcount
+
+    def report(self) -> Dict[str, Any]:
+        """Queue depth, job counts and submit-to-finished latency percentiles."""
+        return {
+            **self.stats.to_dict(time.monotonic() - self._started_at),
+            "queued": self.depth(),
+            "rejected": self.rejected,
+            "workers": self.workers,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,86 +1,47 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Sequence
 
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
-
-from mcp_stuff.functions import (
-    get_all_shipments as get_all_shipments_func,
-)
-from mcp_stuff.functions import (
-    get_shipment_by_bol_id as get_shipment_by_bol_id_func,
-)
-from mcp_stuff.functions import (
-    get_shipment_by_id as get_shipment_by_id_func,
-)
-from mcp_stuff.functions import (
-    update_shipment_eta as update_shipment_eta_func,
+from mcp.types import Content
+
+from mcp_stuff.functions import (  # noqa: F401 - re-exported tool functions
+    get_all_shipments,
+    get_shipment_by_bol_id,
+    get_shipment_by_id,
+    tms_tools,
+    update_shipment_eta,
 )
+from observability import tracing
+from observability.metrics import enable_export
 
 load_dotenv()
 
-mcp = FastMCP("TMS MCP")
-
-
-@mcp.tool()
-def get_shipment_by_id(email: str, shipment_id: int) -> Optional[Dict[Any, Any]]:
-    """
-    Retrieve a shipment record from the database by its ID.
-
-    Args:
-        db (Session): SQLAlchemy database session
-        shipment_id (int): Unique identifier of the shipment
-
-    Returns:
-        Optional[Dict[Any, Any]]: Dictionary containing shipment details if found, None otherwise
-
-    Raises:
-        SQLAlchemyError: If there's any database-related error
-    """
-    return get_shipment_by_id_func(email, shipment_id)
-
-
-@mcp.tool()
-def get_shipment_by_bol_id(email: str, bol_id: int) -> Optional[Dict[Any, Any]]:
-    """
-    Retrieve a shipment record from the database by its BOL ID.
-
-    Args:
-        db (Session): SQLAlchemy database session
-        bol_id (str): Unique identifier of the BOL
-
-    Returns:
-        Optional[Dict[Any, Any]]: Dictionary containing shipment details if found, None otherwise
-
-    Raises:
-        SQLAlchemyError: If there's any database-related error
-    """
-    return get_shipment_by_bol_id_func(email, bol_id)
-
-
-@mcp.tool()
-def get_all_shipments(shipper_email: str) -> Optional[Dict[Any, Any]]:
-    """
-    Retrieve all shipments from the database for a given shipper email.
 
-    Args:
-        email (str): Email of the shipper
+class TracedFastMCP(FastMCP):
+    """Runs each tool call as a span of the trace sent in the request's _meta."""
 
-    Returns:
-        Optional[Dict[Any, Any]]: List of shipment dictionaries if found, None otherwise
+    async def call_tool(
+        self, name: str, arguments: Dict[str, Any]
+    ) -> Sequence[Content]:
+        try:
+            meta = self.get_context().request_context.meta
+        except ValueError:
+            # Called in-process rather than through an MCP session: no trace sent
+            meta = None
+        parent = tracing.extract(meta.model_dump() if meta is not None else None)
+        with tracing.span("mcp_tool", parent=parent, tool=name):
+            return await super().call_tool(name, arguments)
 
-    """
-    return get_all_shipments_func(shipper_email)
 
+mcp = TracedFastMCP("TMS MCP")
 
-@mcp.tool()
-def update_shipment_eta(shipment_id: int, seconds: int) -> Optional[Dict[Any, Any]]:
-    """
-    Update the eta of a shipment in the database.
-    Only supports adding seconds to the eta.
-    If original eta is not set, will be set to the current time + the number of seconds that are added.
-    """
-    return update_shipment_eta_func(shipment_id, seconds)
+# Tool schemas and dispatch come from the shared registry in mcp_stuff.functions,
+# so the MCP server and the OpenAI LLMEngine always expose the same tools.
+tms_tools.install(mcp)
 
 
 if __name__ == "__main__":
+    # Started per query by MCP_ChatBot, which reads the metrics back
+    enable_export()
+    tracing.configure("mcp_server")
     mcp.run()
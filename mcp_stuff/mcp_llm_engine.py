@@ -1,21 +1,28 @@
 ### Creating an MCP client
 
+import asyncio
 import json
 import logging
 import os
+import sys
+from contextlib import AsyncExitStack
 from typing import List, Optional
 
 import nest_asyncio
 from anthropic import Anthropic
 from dotenv import load_dotenv
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import get_default_environment, stdio_client
+
+from observability import tracing
+from observability.metrics import METRICS_DIR, track
 
 nest_asyncio.apply()
 
 load_dotenv()
 
 MODEL_NAME = "claude-3-5-haiku-20241022"
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -27,24 +34,43 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
 
+async def call_tool(
+    session: ClientSession, name: str, arguments: Optional[dict] = None
+) -> types.CallToolResult:
+    """ClientSession.call_tool, with the trace context in the request's _meta."""
+    return await session.send_request(
+        types.ClientRequest(
+            types.CallToolRequest(
+                method="tools/call",
+                params=types.CallToolRequestParams(
+                    name=name, arguments=arguments, _meta=tracing.inject({}) or None
+                ),
+            )
+        ),
+        types.CallToolResult,
+    )
+
+
 class MCP_ChatBot:
 
     def __init__(self):
-        # Initialize session and client objects
-        self.session: ClientSession = None
-
+        # Only the Anthropic client is shared: every run has its own MCP server
+        # session and tool list, so overlapping runs can share one chatbot
         self.anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        self.available_tools: List[dict] = []
 
-    async def process_query(self, query) -> str:
+    async def process_query(
+        self, query, session: ClientSession, available_tools: List[dict]
+    ) -> str:
         messages = [{"role": "user", "content": query}]
 
-        response = self.anthropic.messages.create(
-            max_tokens=2024,
-            model=MODEL_NAME,
-            tools=self.available_tools,
-            messages=messages,
-        )
+        with track("llm_call", MODEL_NAME):
+            response = await asyncio.to_thread(
+                self.anthropic.messages.create,
+                max_tokens=2024,
+                model=MODEL_NAME,
+                tools=available_tools,
+                messages=messages,
+            )
 
         process_query = True
 
@@ -68,9 +94,10 @@ class MCP_ChatBot:
                     # Call a tool
                     # result = execute_tool(tool_name, tool_args)
 
-                    result = await self.session.call_tool(
-                        tool_name, arguments=tool_args
-                    )
+                    with track("call_tool", tool_name):
+                        result = await call_tool(
+                            session, tool_name, arguments=tool_args
+                        )
 
                     messages.append(
                         {
@@ -84,12 +111,14 @@ class MCP_ChatBot:
                             ],
                         }
                     )
-                    response = self.anthropic.messages.create(
-                        max_tokens=2024,
-                        model=MODEL_NAME,
-                        tools=self.available_tools,
-                        messages=messages,
-                    )
+                    with track("llm_call", MODEL_NAME):
+                        response = await asyncio.to_thread(
+                            self.anthropic.messages.create,
+                            max_tokens=2024,
+                            model=MODEL_NAME,
+                            tools=available_tools,
+                            messages=messages,
+                        )
 
                     if (
                         len(response.content) == 1
@@ -113,7 +142,7 @@ class MCP_ChatBot:
                 if query.lower() == "quit":
                     break
 
-                await self.process_query(query)
+                await self.connect_to_server_and_run(query)
                 print("\n")
 
             except Exception as e:
@@ -122,34 +151,58 @@ class MCP_ChatBot:
     async def connect_to_server_and_run(self, query: str) -> list[dict]:
         # Create server parameters for stdio connection
         server_params = StdioServerParameters(
-            command="python3",  # Executable
+            # Our own interpreter, from the repository root, so the server
+            # starts in the same environment wherever the API was started
+            command=sys.executable,
             args=["-m", "mcp_stuff.mcp_code"],  # Optional command line arguments
-            env=None,  # Optional environment variables
+            cwd=PROJECT_ROOT,
+            # The server reads our database, exports its metrics (tool calls, DB
+            # queries) for /metrics and, when tracing is on, its spans next to ours
+            env={
+                **get_default_environment(),
+                **(
+                    {"DB_PATH": os.environ["DB_PATH"]}
+                    if "DB_PATH" in os.environ
+                    else {}
+                ),
+                "METRICS_DIR": os.path.abspath(METRICS_DIR),
+                **(
+                    {"TRACE_FILE": os.path.abspath(tracing.TRACE_FILE)}
+                    if tracing.TRACE_FILE
+                    else {}
+                ),
+            },
         )
 
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                self.session = session
+        async with AsyncExitStack() as stack:
+            with track("mcp_spawn"):
+                read, write = await stack.enter_async_context(
+                    stdio_client(server_params)
+                )
+                session = await stack.enter_async_context(ClientSession(read, write))
                 # Initialize the connection
                 await session.initialize()
 
-                # List available tools
+            # List available tools
+            with track("list_tools"):
                 response = await session.list_tools()
 
-                tools = response.tools
-                tools_names = [tool.name for tool in tools]
-                logger.info(f"\nConnected to server with tools: {tools_names}")
-            
-                self.available_tools = [
-                    {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "input_schema": tool.inputSchema,
-                    }
-                    for tool in response.tools
-                ]
+            tools = response.tools
+            tools_names = [tool.name for tool in tools]
+            logger.info(f"\nConnected to server with tools: {tools_names}")
 
-                return await self.process_query(query=query)
+            available_tools = [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema,
+                }
+                for tool in response.tools
+            ]
+
+            return await self.process_query(
+                query=query, session=session, available_tools=available_tools
+            )
 
 
 def get_tool_result(messages: list[dict]) -> dict:
@@ -220,12 +273,20 @@ def get_shipment_info(messages: List[dict]) -> Optional[dict]:
     if not tool_results:
         return None
 
-    return [{
-        "shipment_id": tool_result.get("shipment_id"),
-        "shipment_status": tool_result.get("shipment_status"),
-        "eta": tool_result.get("eta"),
-        "delivery_date": tool_result.get("delivery_date"),
-        "source_address": tool_result.get("source_address"),
-        "dest_address": tool_result.get("dest_address"),
-    } for tool_result in tool_results]
+    return [summarize_shipment(tool_result) for tool_result in tool_results]
+
+
+def summarize_shipment(shipment: dict) -> dict:
+    """
+    Keep the shipment fields used in replies to shippers.
+    """
+
+    return {
+        "shipment_id": shipment.get("shipment_id"),
+        "shipment_status": shipment.get("shipment_status"),
+        "eta": shipment.get("eta"),
+        "delivery_date": shipment.get("delivery_date"),
+        "source_address": shipment.get("source_address"),
+        "dest_address": shipment.get("dest_address"),
+    }
 
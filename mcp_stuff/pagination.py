@@ -0,0 +1,104 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from database.data_schema import ShipmentStatus
+from mcp_stuff.functions import get_shipments_by_courier_id
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+
+
+@dataclass(frozen=True)
+class ShipmentCursor:
+    """Position in a courier's shipment list, newest first.
+
+    Keyset pagination: a cursor holds the id of the shipment at the edge of the
+    page it came from, so a page is one indexed range scan however deep it is,
+    and shipments added meanwhile do not shift later pages. The status filter
+    travels with the cursor. Encoded short enough for Telegram's 64-byte
+    callback data.
+    """
+
+    shipment_id: int
+    # Pages before the shipment (newer ones) rather than after it
+    backwards: bool = False
+    status: Optional[ShipmentStatus] = None
+
+    def encode(self) -> str:
+        direction = "b" if self.backwards else "f"
+        status = self.status.value if self.status else ""
+        raw = f"{direction}{self.shipment_id}:{status}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "ShipmentCursor":
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            position, status = raw.decode().split(":", 1)
+            if position[:1] not in ("f", "b"):
+                raise ValueError(position)
+            return cls(
+                shipment_id=int(position[1:]),
+                backwards=position[0] == "b",
+                status=ShipmentStatus(status) if status else None,
+            )
+        except (ValueError, binascii.Error, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+@dataclass
+class ShipmentPage:
+    shipments: List[Any]
+    status: Optional[ShipmentStatus]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def get_shipments_page(
+    courier_id: int,
+    status: Optional[ShipmentStatus] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[ShipmentCursor] = None,
+) -> ShipmentPage:
+    """One page of a courier's shipments, newest first.
+
+    One extra shipment is read to know whether there is a page beyond this one.
+    Coming from a neighbouring page the other direction is known to have one.
+    """
+    if cursor is not None:
+        status = cursor.status
+    older_than = newer_than = None
+    if cursor is not None and cursor.backwards:
+        newer_than = cursor.shipment_id
+    elif cursor is not None:
+        older_than = cursor.shipment_id
+
+    shipments = get_shipments_by_courier_id(
+        courier_id,
+        status=status,
+        limit=page_size + 1,
+        older_than=older_than,
+        newer_than=newer_than,
+    )
+    more = len(shipments) > page_size
+    if newer_than is not None:
+        # The extra shipment is the newest one, beyond the page's first
+        shipments = shipments[1:] if more else shipments
+        has_newer, has_older = more, True
+    else:
+        shipments = shipments[:page_size]
+        has_newer, has_older = cursor is not None, more
+
+    next_cursor = prev_cursor = None
+    if shipments and has_older:
+        next_cursor = ShipmentCursor(shipments[-1].shipment_id, False, status)
+    if shipments and has_newer:
+        prev_cursor = ShipmentCursor(shipments[0].shipment_id, True, status)
+    return ShipmentPage(
+        shipments=shipments,
+        status=status,
+        next_cursor=next_cursor.encode() if next_cursor else None,
+        prev_cursor=prev_cursor.encode() if prev_cursor else None,
+    )
@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Runs one computation per key at a time and shares it between callers.
+
+    A caller whose key is already being computed waits for that computation
+    instead of starting its own; ``collapsed`` counts those callers. The
+    computation runs in its own task, so a caller that goes away (a client
+    disconnecting) does not cancel it for the others. Nothing is cached: once
+    a computation finishes, the next caller with its key starts a new one.
+
+    Flights live in this process only. With several API workers, identical
+    requests that land on different workers each run their own computation.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.collapsed = 0
+        self._flights: Dict[Hashable, asyncio.Task[Any]] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """The result of ``fn()``, or of the computation already running for ``key``."""
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda task: self._land(key, task))
+        return await asyncio.shield(task)
+
+    def _land(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieved here too, in case every caller went away before it failed
+            task.exception()
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": self.in_flight(),
+        }
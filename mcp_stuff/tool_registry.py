@@ -0,0 +1,306 @@
+import functools
+import inspect
+import re
+import typing
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+
+class UnknownToolError(KeyError):
+    """Raised when a tool name is not present in the registry."""
+
+
+class ToolArgumentError(ValueError):
+    """Raised when tool arguments are missing, unexpected or cannot be coerced."""
+
+
+_JSON_TYPES = {
+    int: "integer",
+    float: "number",
+    str: "string",
+    bool: "boolean",
+    dict: "object",
+    list: "array",
+}
+
+
+def _coerce_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError("booleans are not integers")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip().lstrip("#"))
+    raise ValueError(f"expected an integer, got {type(value).__name__}")
+
+
+def _coerce_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError("booleans are not numbers")
+    if isinstance(value, (int, float, str)):
+        return float(value)
+    raise ValueError(f"expected a number, got {type(value).__name__}")
+
+
+def _coerce_str(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"expected a string, got {type(value).__name__}")
+
+
+def _coerce_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def _coerce_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    raise ValueError(f"expected an ISO 8601 datetime, got {type(value).__name__}")
+
+
+def _passthrough(value: Any) -> Any:
+    return value
+
+
+_COERCERS: Dict[Any, Callable[[Any], Any]] = {
+    int: _coerce_int,
+    float: _coerce_float,
+    str: _coerce_str,
+    bool: _coerce_bool,
+    datetime: _coerce_datetime,
+}
+
+
+def _unwrap_optional(annotation: Any) -> Tuple[Any, bool]:
+    """Return the inner type of ``Optional[X]`` and whether ``None`` is allowed."""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0], True
+    return annotation, False
+
+
+def _json_schema(annotation: Any) -> Dict[str, Any]:
+    if annotation is datetime:
+        return {"type": "string", "format": "date-time"}
+    origin = typing.get_origin(annotation) or annotation
+    if origin in _JSON_TYPES:
+        return {"type": _JSON_TYPES[origin]}
+    return {}
+
+
+def _make_coercer(annotation: Any) -> Callable[[Any], Any]:
+    inner, nullable = _unwrap_optional(annotation)
+    coerce = _COERCERS.get(inner, _passthrough)
+    if not nullable:
+        return coerce
+
+    def coerce_optional(value: Any) -> Any:
+        return None if value is None else coerce(value)
+
+    return coerce_optional
+
+
+def _parse_docstring(docstring: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """Split a Google-style docstring into a one-line summary and per-argument docs."""
+    if not docstring:
+        return "", {}
+
+    summary_lines: List[str] = []
+    arg_docs: Dict[str, str] = {}
+    section = "summary"
+    for line in inspect.cleandoc(docstring).splitlines():
+        stripped = line.strip()
+        if re.match(r"^(Args|Arguments|Returns|Raises|Yields):$", stripped):
+            section = stripped[:-1].lower()
+            continue
+        if section == "summary" and stripped:
+            summary_lines.append(stripped)
+        elif section in ("args", "arguments"):
+            match = re.match(r"^(\w+)(?:\s*\([^)]*\))?:\s*(.*)$", stripped)
+            if match:
+                arg_docs[match.group(1)] = match.group(2)
+
+    return " ".join(summary_lines), arg_docs
+
+
+@dataclass
+class Tool:
+    """A registered tool with its generated schema and precompiled coercers."""
+
+    name: str
+    description: str
+    function: Callable[..., Any]
+    parameters: Dict[str, Any]
+    coercers: Dict[str, Callable[[Any], Any]] = field(repr=False)
+    required: FrozenSet[str] = field(default_factory=frozenset)
+
+    def validate(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Check required/unknown arguments and coerce values to the declared types."""
+        unexpected = args.keys() - self.coercers.keys()
+        if unexpected:
+            raise ToolArgumentError(
+                f"Unexpected arguments for {self.name}: {', '.join(sorted(unexpected))}"
+            )
+        missing = self.required - args.keys()
+        if missing:
+            raise ToolArgumentError(
+                f"Missing arguments for {self.name}: {', '.join(sorted(missing))}"
+            )
+
+        coerced = {}
+        for arg_name, value in args.items():
+            try:
+                coerced[arg_name] = self.coercers[arg_name](value)
+            except (TypeError, ValueError) as e:
+                raise ToolArgumentError(
+                    f"Invalid value for {self.name}.{arg_name}: {e}"
+                ) from e
+        return coerced
+
+    def __call__(self, **kwargs: Any) -> Any:
+        return self.function(**self.validate(kwargs))
+
+
+class ToolRegistry:
+    """Single source of truth for the tools exposed to the LLM engines.
+
+    Schemas are generated once from the function signatures and docstrings, and
+    calls are dispatched by dict lookup. The same registry produces the OpenAI
+    function descriptions used by ``LLMEngine`` and the tools served by FastMCP.
+    """
+
+    def __init__(self) -> None:
+        self._tools: Dict[str, Tool] = {}
+        self._openai_descriptions: Optional[List[Dict[str, Any]]] = None
+
+    def register(
+        self, function: Callable[..., Any], name: Optional[str] = None
+    ) -> Tool:
+        tool_name = name or function.__name__
+        if tool_name in self._tools:
+            raise ValueError(f"Tool {tool_name} is already registered")
+
+        hints = typing.get_type_hints(function)
+        description, arg_docs = _parse_docstring(function.__doc__)
+        properties: Dict[str, Any] = {}
+        coercers: Dict[str, Callable[[Any], Any]] = {}
+        required = []
+
+        for param in inspect.signature(function).parameters.values():
+            annotation = hints.get(param.name, Any)
+            schema = _json_schema(_unwrap_optional(annotation)[0])
+            if param.name in arg_docs:
+                schema["description"] = arg_docs[param.name]
+            properties[param.name] = schema
+            coercers[param.name] = _make_coercer(annotation)
+            if param.default is inspect.Parameter.empty:
+                required.append(param.name)
+
+        tool = Tool(
+            name=tool_name,
+            description=description,
+            function=function,
+            parameters={
+                "type": "object",
+                "properties": properties,
+                "required": required,
+            },
+            coercers=coercers,
+            required=frozenset(required),
+        )
+        self._tools[tool_name] = tool
+        self._openai_descriptions = None
+        return tool
+
+    def tool(
+        self, name: Optional[str] = None
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator registering a function as a tool; the function is returned as is."""
+
+        def decorator(function: Callable[..., Any]) -> Callable[..., Any]:
+            self.register(function, name=name)
+            return function
+
+        return decorator
+
+    def subset(self, names: Iterable[str]) -> "ToolRegistry":
+        """A registry exposing only the named tools, sharing their schemas."""
+        registry = ToolRegistry()
+        for name in names:
+            registry._tools[name] = self.get(name)
+        return registry
+
+    def get(self, name: str) -> Tool:
+        try:
+            return self._tools[name]
+        except KeyError:
+            raise UnknownToolError(name) from None
+
+    def execute_function(self, function_name: str, args: Dict[str, Any]) -> Any:
+        """
+        Execute a registered tool with the given arguments.
+        """
+        return self.get(function_name)(**args)
+
+    @property
+    def descriptions(self) -> List[Dict[str, Any]]:
+        """Tool descriptions in the OpenAI Responses API function format."""
+        if self._openai_descriptions is None:
+            self._openai_descriptions = [
+                {
+                    "type": "function",
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.parameters,
+                }
+                for tool in self._tools.values()
+            ]
+        return self._openai_descriptions
+
+    def install(self, mcp: Any) -> None:
+        """Register every tool on a FastMCP server, dispatching through the registry."""
+        for tool in self._tools.values():
+            mcp.add_tool(
+                _dispatcher(tool), name=tool.name, description=tool.description
+            )
+
+    def __iter__(self) -> Iterator[Tool]:
+        return iter(self._tools.values())
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._tools
+
+
+def _dispatcher(tool: Tool) -> Callable[..., Any]:
+    # functools.wraps exposes the original signature so FastMCP derives the same
+    # input schema, while calls still go through the registry's coercion.
+    @functools.wraps(tool.function)
+    def dispatch(**kwargs: Any) -> Any:
+        return tool(**kwargs)
+
+    return dispatch
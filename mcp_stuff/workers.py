@@ -0,0 +1,59 @@
+"""
+Coordination between the API's worker processes.
+
+Workers share their state through SQLite files in the working directory, so
+they only coordinate with processes on the same host: a process id is enough
+to tell whether the owner of a claimed row is still alive, and a file lock
+picks the one worker that runs a task that must not run twice.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+LEADER_RETRY_INTERVAL = 5.0  # seconds between attempts to take over a task
+
+
+def is_running(pid: int) -> bool:
+    """Whether a process with this id exists on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+async def run_exclusively(
+    lock_path: str,
+    run: Callable[[], Awaitable[None]],
+    retry_interval: float = LEADER_RETRY_INTERVAL,
+) -> None:
+    """
+    Run ``run()`` in the one process holding the lock at ``lock_path``.
+
+    The other processes keep trying to take the lock, so one of them takes
+    over when the holder exits; the operating system releases the lock of a
+    process that dies.
+    """
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                await asyncio.sleep(retry_interval)
+                continue
+            logger.info(f"Process {os.getpid()} holds {lock_path}")
+            try:
+                await run()
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return
+    finally:
+        os.close(fd)
@@ -0,0 +1,356 @@
+"""
+Prometheus metrics shared by the API, the MCP server subprocesses and the
+ingestion workers.
+
+Each process records into its own ``REGISTRY``. Processes other than the API,
+and each API worker when the API runs several, export a snapshot of it to
+``<METRICS_DIR>/<pid>.json``; the API's ``/metrics`` endpoint adds up its own
+registry and every snapshot in the directory, so the stages that run in an
+MCP subprocess (tool calls, database queries) show up next to the ones that
+run in the API, whichever worker answers. Snapshots of processes that have
+exited are folded into the collecting process and deleted, so the directory
+does not grow with every spawned MCP server.
+"""
+
+import atexit
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from mcp_stuff.workers import is_running
+from observability.tracing import span
+
+# Shared by every process of a deployment; relative to the working directory
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+EXPORT_INTERVAL = 5.0  # seconds between snapshots of a long-running process
+
+# Seconds; spans DB queries of a few ms up to LLM rounds of a minute
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _add(self, key: LabelValues, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, samples: List[List[Any]]) -> None:
+        for key, value in samples:
+            self._add(tuple(key), value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._add(self._key(labels), amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._add(self._key(labels), amount)
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self._add(self._key(labels), -amount)
+
+
+class Histogram(_Metric):
+    """Counts of observations per bucket, plus their sum, per label values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def samples(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(key), list(counts)] for key, counts in self._values.items()]
+
+    def merge(self, samples: List[List[Any]]) -> None:
+        with self._lock:
+            for key, counts in samples:
+                mine = self._values.setdefault(tuple(key), [0] * len(counts))
+                for index, count in enumerate(counts):
+                    mine[index] += count
+
+
+class MetricsRegistry:
+    """The metrics of one process, by name."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already a {metric.kind}")
+            return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str]
+    ) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str]) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric's values, as JSON for ``merge`` in another process."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: {
+                "kind": metric.kind,
+                "documentation": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", [])),
+                "samples": metric.samples(),
+            }
+            for metric in metrics
+        }
+
+    def merge(self, snapshot: Dict[str, Any], gauges: bool = True) -> None:
+        """Add another process's snapshot to these metrics."""
+        kinds = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+        for name, data in snapshot.items():
+            if data["kind"] == "gauge" and not gauges:
+                continue
+            kwargs = {"buckets": data["buckets"]} if data["kind"] == "histogram" else {}
+            metric = self._get_or_create(
+                kinds[data["kind"]],
+                name,
+                data["documentation"],
+                data["labelnames"],
+                **kwargs,
+            )
+            metric.merge(data["samples"])
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(metric.samples()):
+                labels = list(zip(metric.labelnames, key))
+                if not isinstance(metric, Histogram):
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                bounds = [_number(bound) for bound in metric.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, value):
+                    cumulative += count
+                    bucket_labels = _labels(labels + [("le", bound)])
+                    lines.append(f"{metric.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_duration_seconds",
+    "Time spent in each stage of answering a request",
+    ["stage", "operation"],
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "stage_errors_total", "Stage runs that raised an error", ["stage", "operation"]
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    "stage_in_flight", "Stage runs in progress", ["stage", "operation"]
+)
+
+
+@contextmanager
+def track(stage: str, operation: str = "") -> Iterator[None]:
+    """
+    Time a stage, count its errors and keep it in the in-flight gauge meanwhile.
+
+    The stage is also traced, as a span of the request it runs for.
+    """
+    STAGE_IN_FLIGHT.inc(stage=stage, operation=operation)
+    start = time.perf_counter()
+    try:
+        with span(stage, operation=operation):
+            yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage, operation=operation)
+        raise
+    finally:
+        STAGE_IN_FLIGHT.dec(stage=stage, operation=operation)
+        STAGE_SECONDS.observe(
+            time.perf_counter() - start, stage=stage, operation=operation
+        )
+
+
+def export_snapshot(directory: str = METRICS_DIR) -> None:
+    """Write this process's metrics to ``<directory>/<pid>.json``."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def enable_export(
+    directory: str = METRICS_DIR,
+    interval: Optional[float] = EXPORT_INTERVAL,
+    exit_on_sigterm: bool = True,
+) -> None:
+    """
+    Export this process's metrics every ``interval`` seconds and when it exits.
+
+    With ``exit_on_sigterm``, SIGTERM, which is how the MCP client stops its
+    server subprocess, exits through the normal shutdown so the last snapshot
+    is written too. Servers that handle SIGTERM themselves, like uvicorn, pass
+    False.
+    """
+
+    def export_periodically() -> None:
+        while True:
+            time.sleep(interval)
+            export_snapshot(directory)
+
+    if interval:
+        threading.Thread(target=export_periodically, daemon=True).start()
+    atexit.register(export_snapshot, directory)
+    if exit_on_sigterm and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def collect(directory: str = METRICS_DIR) -> str:
+    """
+    This process's metrics plus those exported by the other processes, in the
+    Prometheus text format.
+    """
+    combined = MetricsRegistry()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            pid = int(os.path.basename(path)[: -len(".json")])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        if is_running(pid):
+            snapshot = _read(path)
+            if snapshot is not None:
+                combined.merge(snapshot)
+            continue
+        # Exited: claim the snapshot so no other collector counts it twice,
+        # keep its counts in this process and drop the file
+        claimed = f"{path}.{os.getpid()}.claimed"
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue
+        snapshot = _read(claimed)
+        os.remove(claimed)
+        if snapshot is not None:
+            REGISTRY.merge(snapshot, gauges=False)
+    combined.merge(REGISTRY.snapshot())
+    return combined.render()
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
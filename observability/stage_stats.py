@@ -0,0 +1,37 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict
+
+
+@dataclass
+class StageStats:
+    """Counts and recent latencies of one stage of work, for its reports."""
+
+    name: str
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    in_flight: int = 0
+    # Latencies of the most recent items, used for percentiles
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def record(self, latency: float) -> None:
+        self.latencies.append(latency)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_dict(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "throughput_per_s": self.processed / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+        }
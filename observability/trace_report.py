@@ -0,0 +1,113 @@
+"""
+The slowest requests in a trace file, with where their time went.
+
+Groups the spans exported to ``TRACE_FILE`` by trace, prints the latency
+percentiles of each kind of request (the trace's root span), then the
+slowest traces as span trees, so a tail-latency outlier can be followed from
+the bot or ingestion worker through the API and MCP server down to the
+database queries.
+
+    python -m observability.trace_report [--file traces.jsonl] [--top 5]
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from typing import Any, Dict, List
+
+Span = Dict[str, Any]
+
+
+def load_traces(path: str) -> Dict[str, List[Span]]:
+    """The spans in a trace file by trace id, in start order."""
+    traces: Dict[str, List[Span]] = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                # Cut short by a process that was killed mid-write
+                continue
+            traces[span["trace_id"]].append(span)
+    for spans in traces.values():
+        spans.sort(key=lambda span: span["start"])
+    return dict(traces)
+
+
+def root(spans: List[Span]) -> Span:
+    """The span that started the trace, or its earliest one if that is missing."""
+    ids = {span["span_id"] for span in spans}
+    roots = [span for span in spans if span["parent_id"] not in ids]
+    return roots[0] if roots else spans[0]
+
+
+def duration_ms(spans: List[Span]) -> float:
+    """Wall time from the first span's start to the last span's end."""
+    start = min(span["start"] for span in spans)
+    end = max(span["start"] + span["duration_ms"] / 1000 for span in spans)
+    return (end - start) * 1000
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def render_tree(spans: List[Span]) -> List[str]:
+    """One line per span, indented under its parent, with its offset and time."""
+    children: Dict[Any, List[Span]] = defaultdict(list)
+    ids = {span["span_id"] for span in spans}
+    for span in spans:
+        children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+    start = min(span["start"] for span in spans)
+    lines: List[str] = []
+
+    def visit(span: Span, depth: int) -> None:
+        attributes = " ".join(
+            f"{key}={value}" for key, value in span["attributes"].items() if value
+        )
+        error = f" ERROR {span['error'].splitlines()[0]}" if span["error"] else ""
+        lines.append(
+            f"{'  ' * depth}{span['name']} [{span['service']}]"
+            f" +{(span['start'] - start) * 1000:.0f}ms"
+            f" {span['duration_ms']:.0f}ms {attributes}{error}".rstrip()
+        )
+        for child in children[span["span_id"]]:
+            visit(child, depth + 1)
+
+    for top in children[None]:
+        visit(top, 0)
+    return lines
+
+
+def report(traces: Dict[str, List[Span]], top: int) -> List[str]:
+    by_name: Dict[str, List[float]] = defaultdict(list)
+    for spans in traces.values():
+        by_name[root(spans)["name"]].append(duration_ms(spans))
+    lines = []
+    for name, durations in sorted(by_name.items()):
+        lines.append(
+            f"{name:<40} n={len(durations):<6}"
+            f" p50={percentile(durations, 0.50):8.0f}ms"
+            f" p95={percentile(durations, 0.95):8.0f}ms"
+            f" p99={percentile(durations, 0.99):8.0f}ms"
+        )
+    slowest = sorted(traces.items(), key=lambda item: -duration_ms(item[1]))[:top]
+    for trace_id, spans in slowest:
+        lines.append("")
+        lines.append(f"trace {trace_id} {duration_ms(spans):.0f}ms")
+        lines.extend(render_tree(spans))
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--file", default=os.getenv("TRACE_FILE", "traces.jsonl"))
+    parser.add_argument("--top", type=int, default=5, help="slowest traces shown")
+    args = parser.parse_args()
+    print("\n".join(report(load_traces(args.file), args.top)))
+
+
+if __name__ == "__main__":
+    main()
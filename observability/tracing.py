@@ -0,0 +1,178 @@
+"""
+Request tracing across the bot, the API, the MCP server subprocesses and the
+ingestion workers.
+
+A trace follows one courier message or shipper email through every process
+it crosses. The context travels as a W3C ``traceparent`` value: in an HTTP
+header between the bot or ingestion worker and the API, in a job's row
+between the API and its job workers, and in the ``_meta`` of MCP tool calls
+between the API and the MCP server. Each process appends the spans it
+finishes, one JSON object per line, to ``TRACE_FILE``; spans of a trace share
+its ``trace_id``, so the slow ones can be picked out per request with
+``python -m observability.trace_report``.
+
+Tracing is off unless ``TRACE_FILE`` is set. Contexts are still passed on
+then, so the processes that do export keep joining the same traces.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+# Shared by every process of a deployment; unset disables the export
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACEPARENT = "traceparent"
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @classmethod
+    def parse(cls, traceparent: Optional[str]) -> Optional["SpanContext"]:
+        """The context in a ``traceparent`` value, or None if it is malformed."""
+        match = _TRACEPARENT_RE.match((traceparent or "").strip().lower())
+        if match is None or set(match.group(1)) == {"0"}:
+            return None
+        return cls(match.group(1), match.group(2))
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_id: Optional[str]
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        duration = time.perf_counter() - self._started
+        if _exporter is not None:
+            _exporter.export(self, duration)
+
+
+class FileExporter:
+    """Appends finished spans to a JSON-lines file shared between processes."""
+
+    def __init__(self, path: str, service: str):
+        self.path = path
+        self.service = service
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span, duration: float) -> None:
+        line = json.dumps(
+            {
+                "trace_id": span.context.trace_id,
+                "span_id": span.context.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "service": self.service,
+                "pid": os.getpid(),
+                "start": span.start,
+                "duration_ms": round(duration * 1000, 3),
+                "error": span.error,
+                "attributes": span.attributes,
+            },
+            default=str,
+        )
+        # One write per line on an O_APPEND file, so lines of concurrent
+        # processes do not interleave
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+_exporter: Optional[FileExporter] = None
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def configure(service: str, path: Optional[str] = TRACE_FILE) -> None:
+    """Export this process's spans to ``path`` under ``service``; None stops it."""
+    global _exporter
+    _exporter = FileExporter(path, service) if path else None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """The ``traceparent`` to hand to the next hop, if a span is running."""
+    span = _current.get()
+    return span.context.traceparent if span is not None else None
+
+
+def inject(carrier: Dict[str, str]) -> Dict[str, str]:
+    """Add the running span's ``traceparent`` to headers or MCP ``_meta``."""
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        carrier[TRACEPARENT] = traceparent
+    return carrier
+
+
+def extract(carrier: Optional[Mapping[str, Any]]) -> Optional[SpanContext]:
+    """The context sent by the previous hop, if any."""
+    if not carrier:
+        return None
+    return SpanContext.parse(carrier.get(TRACEPARENT))
+
+
+def _new_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+def start_span(
+    name: str, parent: Optional[SpanContext] = None, **attributes: Any
+) -> Span:
+    """
+    A span that is not made current, for callbacks that start and end apart.
+
+    Without ``parent`` it is a child of the running span, or starts a trace.
+    """
+    if parent is None:
+        running = _current.get()
+        parent = running.context if running is not None else None
+    trace_id = parent.trace_id if parent is not None else _new_id(32)
+    return Span(
+        name=name,
+        context=SpanContext(trace_id, _new_id(16)),
+        parent_id=parent.span_id if parent is not None else None,
+        attributes=attributes,
+    )
+
+
+@contextmanager
+def span(
+    name: str, parent: Optional[SpanContext] = None, **attributes: Any
+) -> Iterator[Span]:
+    """Run a block as a span, the parent of the spans started inside it."""
+    current = start_span(name, parent, **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
@@ -1,4 +1,5 @@
 import os
+from contextlib import asynccontextmanager
 from typing import Any, Optional
 
 import uvicorn
@@ -6,20 +7,31 @@ from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
-from google.auth.transport.requests import Request as GoogleRequest
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from starlette.middleware.sessions import SessionMiddleware
 
+from gmail_integration.gmail_auth import GmailAuth, get_gmail_auth
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Set this environment variable to allow OAuth2 on HTTP (only for development)
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
-app = FastAPI(title="Gmail API Authentication")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    auth = get_auth()
+    # Load the token and build the service before the first request comes in
+    auth.service()
+    auth.start_refresher(interval=TOKEN_REFRESH_INTERVAL)
+    try:
+        yield
+    finally:
+        auth.stop_refresher()
+
+
+app = FastAPI(title="Gmail API Authentication", lifespan=lifespan)
 # For development, use a strong random secret key in production
 app.add_middleware(
     SessionMiddleware,
@@ -42,33 +54,22 @@ TOKEN_FILE = os.path.join(os.path.dirname(__file__), "token_auth.json")
 # The scopes required for your application
 SCOPES = ["https://mail.google.com/"]  # For full read/write access
 
+# Seconds between checks whether the access token is about to expire
+TOKEN_REFRESH_INTERVAL = 60
+
+
+def get_auth() -> GmailAuth:
+    return get_gmail_auth(TOKEN_FILE, SCOPES)
+
 
 def get_gmail_service() -> Optional[Any]:
-    """Gets an authenticated Gmail service instance."""
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-
-    # If there are no (valid) credentials available, return None,
-    # and the frontend needs to initiate the OAuth flow.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(GoogleRequest())
-                with open(TOKEN_FILE, "w") as token:
-                    token.write(creds.to_json())
-            except Exception as e:
-                print(f"Token refresh failed: {e}")
-                return None
-        else:
-            return None  # No valid credentials, need full OAuth flow
+    """Gets an authenticated Gmail service instance.
 
-    try:
-        service = build("gmail", "v1", credentials=creds)
-        return service
-    except HttpError as error:
-        print(f"Error building Gmail service: {error}")
-        return None
+    Returns None if there are no valid credentials, in which case the frontend
+    needs to initiate the OAuth flow. The service is cached, and the token is
+    refreshed in the background before it expires.
+    """
+    return get_auth().service()
 
 
 @app.get("/authorize")
@@ -118,8 +119,7 @@ async def oauth2callback(request: Request):
         print(f"Credentials obtained: {creds.valid}")
 
         # Save the credentials for future use on the server
-        with open(TOKEN_FILE, "w") as token:
-            token.write(creds.to_json())
+        get_auth().save(creds)
         print(f"Credentials saved to {TOKEN_FILE}")
 
         # Redirect back to frontend after successful authentication
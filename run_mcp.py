@@ -1,27 +1,160 @@
+import asyncio
 import os
 import sys
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import List, Optional
+
 import requests
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from sqlalchemy.exc import SQLAlchemyError
+from starlette.routing import Match
 
 from gmail_integration.gmail_client import GmailClient
-from mcp_stuff.functions import get_shipments_by_courier_contact
+from gmail_integration.outbound_queue import OutboundQueue
+from mcp_stuff.admission import AdmissionLimiter, Overloaded
+from mcp_stuff.conversation_context import ConversationContextStore, ThreadContext
+from database.data_schema import ShipmentStatus, ensure_indexes
+from database.session import get_engine
+from mcp_stuff.functions import get_courier_by_contact, get_shipment_by_id
+from mcp_stuff.idempotency import IdempotencyStore
+from mcp_stuff.jobs import JobQueue
 from mcp_stuff.mcp_llm_engine import (
     MCP_ChatBot,
     get_shipment_info,
     get_shipment_order,
     get_shipper_email,
+    summarize_shipment,
+)
+from mcp_stuff.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    ShipmentCursor,
+    ShipmentPage,
+    get_shipments_page,
 )
 from mcp_stuff.reply_handler import (
     TEMPLATE_EMAIL_UPDATE_ETA,
     TEMPLATE_TG_UPDATE_ETA,
     get_reply_shipper
 )
+from mcp_stuff.single_flight import SingleFlight
+from mcp_stuff.workers import run_exclusively
+from observability import tracing
+from observability.metrics import REGISTRY, collect, enable_export
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start this worker's background tasks. With API_WORKERS > 1 every worker
+    process runs this; they share nothing but the SQLite files.
+    """
+    tracing.configure("api")
+    if API_WORKERS > 1:
+        # Any worker may answer /metrics, so each exports its own for the others
+        enable_export(exit_on_sigterm=False)
+    outbound = get_outbound_queue()
+    # One worker at a time sends email, so the Gmail send rate holds API-wide
+    sender = asyncio.create_task(run_exclusively(f"{outbound.path}.lock", outbound.run))
+    # Every worker runs jobs; each job is claimed by one of them
+    workers = asyncio.create_task(get_job_queue().run())
+    evictor = asyncio.create_task(evict_expired_contexts())
+    try:
+        yield
+    finally:
+        sender.cancel()
+        workers.cancel()
+        evictor.cancel()
+
+
+async def evict_expired_contexts():
+    """Drop the context of threads quiet for longer than THREAD_CONTEXT_TTL."""
+    while True:
+        await asyncio.to_thread(get_conversation_store().evict_expired)
+        await asyncio.sleep(THREAD_CONTEXT_EVICT_INTERVAL)
+
+
+app = FastAPI(lifespan=lifespan)
+
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # uvicorn worker processes
+THREAD_CONTEXT_TTL = 6 * 3600  # seconds a quiet email thread's context is kept
+THREAD_CONTEXT_EVICT_INTERVAL = 3600  # seconds between sweeps of expired contexts
+IDEMPOTENCY_TTL = 24 * 3600  # seconds a handled update is answered from storage
+JOB_WORKERS = 4  # courier updates run at once, each an MCP subprocess + LLM calls
+JOB_TTL = 24 * 3600  # seconds a finished job's result can be collected
+JOB_MAX_WAIT = 60  # seconds GET /jobs/{job_id} may hold a request for the result
+JOB_QUEUE_LIMIT = 200  # queued courier updates before new ones get a 429
+
+# /query answers inline, each with an MCP subprocess + LLM calls, so only a few
+# run at once; reads such as /get_courier_shipments are not limited and never
+# wait behind them
+QUERY_CONCURRENCY = 4
+QUERY_QUEUE_SIZE = 32  # /query requests waiting for a slot before new ones get a 429
+QUERY_MAX_WAIT = 30  # seconds a /query request waits for a slot before a 429
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "API requests answered", ["method", "path", "status"]
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to answer API requests", ["method", "path"]
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "API requests being answered", ["method", "path"]
+)
+
+
+def route_path(scope: dict) -> str:
+    """The path template a request is routed to, e.g. /jobs/{job_id}."""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    labels = {"method": request.method, "path": route_path(request.scope)}
+    HTTP_IN_FLIGHT.inc(**labels)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec(**labels)
+        HTTP_SECONDS.observe(time.perf_counter() - start, **labels)
+        HTTP_REQUESTS.inc(**labels, status=str(status))
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Answer each request in a span, continuing the caller's trace if it sent one."""
+    with tracing.span(
+        f"{request.method} {route_path(request.scope)}",
+        parent=tracing.extract(request.headers),
+    ) as span:
+        response = await call_next(request)
+        span.set(status=response.status_code)
+        return response
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """Shed load with a 429 that tells the client when to come back."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-app = FastAPI()
 
 # Add CORS middleware
 app.add_middleware(
@@ -32,12 +165,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-chatbot = MCP_ChatBot()
 
-gmail_client = GmailClient(
-    credentials_file="credentials.json",
-    token_file="token.json",
-)
+@lru_cache(maxsize=None)
+def get_chatbot() -> MCP_ChatBot:
+    """Create the MCP chatbot (and its Anthropic client) on first use."""
+    return MCP_ChatBot()
+
+
+@lru_cache(maxsize=None)
+def get_gmail_client() -> GmailClient:
+    """Authenticate against Gmail on first use instead of at import time."""
+    return GmailClient(
+        credentials_file="credentials.json",
+        token_file="token.json",
+    )
+
+
+@lru_cache(maxsize=None)
+def get_outbound_queue() -> OutboundQueue:
+    """Created on first use; Gmail itself is only authenticated on the first send."""
+    return OutboundQueue(
+        send_batch=lambda messages: get_gmail_client().send_messages(messages),
+        path="outbound_mail.db",
+    )
+
+
+@lru_cache(maxsize=None)
+def get_conversation_store() -> ConversationContextStore:
+    # Shared by the API workers, so a thread's follow-up may go to any of them
+    return ConversationContextStore(
+        ttl_seconds=THREAD_CONTEXT_TTL, path="conversation_context.db"
+    )
+
+
+@lru_cache(maxsize=None)
+def get_idempotency_store() -> IdempotencyStore:
+    return IdempotencyStore(path="idempotency.db", ttl_seconds=IDEMPOTENCY_TTL)
+
+
+@lru_cache(maxsize=None)
+def get_query_flights() -> SingleFlight:
+    return SingleFlight()
+
+
+@lru_cache(maxsize=None)
+def get_query_limiter() -> AdmissionLimiter:
+    return AdmissionLimiter(
+        "/query",
+        concurrency=QUERY_CONCURRENCY,
+        queue_size=QUERY_QUEUE_SIZE,
+        max_wait=QUERY_MAX_WAIT,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue:
+    return JobQueue(
+        handlers={
+            "courier_shipment_update": lambda payload: apply_courier_update(
+                payload["shipment_query"]
+            )
+        },
+        path="jobs.db",
+        workers=JOB_WORKERS,
+        ttl_seconds=JOB_TTL,
+        max_queued=JOB_QUEUE_LIMIT,
+    )
+
 
 # Load environment variables
 load_dotenv()
@@ -53,37 +247,147 @@ if not token:
     raise RuntimeError("TELEGRAM_BOT_TOKEN not set in environment variables")
 
 
+def answer_from_context(context: ThreadContext, email: str) -> Optional[List[dict]]:
+    """Re-read the shipments a thread already resolved to, without the LLM."""
+    shipments = [
+        get_shipment_by_id(email, shipment_id) for shipment_id in context.shipment_ids
+    ]
+    found = [summarize_shipment(shipment) for shipment in shipments if shipment]
+    return found or None
+
+
+def query_key(email: str, query: str, thread_id: Optional[str]) -> tuple:
+    """Queries that only differ in case or whitespace get the same answer.
+
+    ``thread_id`` is only given when the thread has a stored context, which
+    changes the answer; otherwise the same question shares one answer
+    whichever thread it was asked in.
+    """
+    return (email.strip().casefold(), " ".join(query.split()).casefold(), thread_id)
+
+
 @app.post("/query")
-async def process_query(email: str, query: str):
+async def process_query(email: str, query: str, thread_id: Optional[str] = None):
+    """
+    Answer a shipper's question about their shipments.
+
+    Identical questions asked while one is being answered, e.g. the same email
+    sent to several addresses or a client retrying after a timeout, share that
+    answer instead of starting their own MCP + LLM run. Only QUERY_CONCURRENCY
+    answers run at once; when QUERY_QUEUE_SIZE more are waiting, further
+    requests get a 429 with Retry-After.
+    """
     try:
-        query = f"Email: {email}\nQuery: {query}"
-        result = await chatbot.connect_to_server_and_run(query=query)
+        # The store is SQLite shared by the workers, so it is used off the event loop
+        context = None
+        if thread_id:
+            context = await asyncio.to_thread(
+                get_conversation_store().get, thread_id, email
+            )
 
-        if result:
-            processed_result = get_shipment_info(result)
-            reply = get_reply_shipper(processed_result)
+        key = query_key(email, query, thread_id if context else None)
+        flights = get_query_flights()
+        span = tracing.current_span()
+        if span is not None and key in flights:
+            # The answer's spans are in the trace of the request that started it
+            span.set(shared_answer=True)
 
-            return {"response": reply}
-        else:
-            return {
-                "response": "No shipment info found. Please specify the shipment id or BOL id."
-            }
+        async def answer() -> dict:
+            async with get_query_limiter().admit():
+                return await answer_query(email, query, context)
 
+        answered = await flights.do(key, answer)
+        # Every request sharing the answer records it in its own thread
+        if thread_id and answered.get("shipments"):
+            await asyncio.to_thread(
+                get_conversation_store().record,
+                thread_id,
+                email,
+                query,
+                answered["shipments"],
+            )
+        return {"response": answered["response"]}
+    except Overloaded:
+        raise
     except SQLAlchemyError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def answer_query(
+    email: str, query: str, context: Optional[ThreadContext]
+) -> dict:
+    """The reply to ``query`` and the shipments it is about."""
+    processed_result = None
+    if context and not context.references_new_shipment(query):
+        # A follow-up about shipments this thread is already about; the lookups
+        # are blocking database reads, so they run off the event loop
+        processed_result = await asyncio.to_thread(answer_from_context, context, email)
+
+    if processed_result is None:
+        prompt = f"Email: {email}\nQuery: {query}"
+        if context:
+            prompt = f"{context.to_prompt()}\n\n{prompt}"
+        result = await get_chatbot().connect_to_server_and_run(query=prompt)
+
+        if not result:
+            return {
+                "response": "No shipment info found. Please specify the shipment id or BOL id."
+            }
+        processed_result = get_shipment_info(result)
+
+    reply = get_reply_shipper(processed_result)
+    return {"response": reply, "shipments": processed_result}
+
+
+@app.get("/query_stats")
+async def query_stats():
+    """
+    How many /query requests shared an answer already being computed, and how
+    many are running, waiting for a slot or were turned away.
+    """
+    return {
+        "response": {**get_query_flights().report(), **get_query_limiter().report()}
+    }
+
+
 @app.get("/get_courier_shipments")
-async def get_courier_shipments(contact_number: str):
+async def get_courier_shipments(
+    contact_number: str,
+    status: Optional[ShipmentStatus] = None,
+    page_size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """
+    One page of a courier's shipments, newest first.
+
+    Pass a response's ``next_cursor`` or ``prev_cursor`` as ``cursor`` to get the
+    neighbouring page; a cursor keeps the status filter it was made with.
+    """
+    try:
+        page_cursor = ShipmentCursor.decode(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if page_cursor and status is not None and status != page_cursor.status:
+        raise HTTPException(
+            status_code=400, detail="The cursor belongs to another status filter"
+        )
     try:
 
-        result = get_shipments_by_courier_contact(contact_number)
+        # Keyed by the phone number the courier shared with the bot, never by a
+        # bare courier id anyone could enumerate
+        courier = get_courier_by_contact(contact_number)
+        if courier is None:
+            page = ShipmentPage([], status, None, None)
+        else:
+            page = get_shipments_page(
+                courier["courier_id"], status, page_size, page_cursor
+            )
 
         filtered_shipments = []
 
-        for shipment in result:
+        for shipment in page.shipments:
             shpmt = shipment.to_dict()
             filtered_shipments.append(
                 {
@@ -95,34 +399,116 @@ async def get_courier_shipments(contact_number: str):
                     "source_address": shpmt["source_address"],
                 }
             )
-        return {"response": filtered_shipments}
+        return {
+            "response": filtered_shipments,
+            "status": page.status.value if page.status else None,
+            "next_cursor": page.next_cursor,
+            "prev_cursor": page.prev_cursor,
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/courier_shipment_updates")
-async def courier_shipment_updates(phone_number: str, shipment_query: str):
+@app.post("/courier_shipment_updates", status_code=202)
+async def courier_shipment_updates(
+    phone_number: str,
+    shipment_query: str,
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Queue a courier's update, to be applied and emailed to the shipper by a
+    background worker, and answer with the job right away.
+
+    The job's result is collected from ``/jobs/{job_id}``. Requests carrying an
+    ``Idempotency-Key`` header are queued once per key; retries get the same
+    job without touching the shipment or the shipper again. When
+    JOB_QUEUE_LIMIT updates are already queued, the request gets a 429 with
+    Retry-After.
+    """
+
+    async def submit() -> dict:
+        job_id = get_job_queue().submit(
+            "courier_shipment_update",
+            {"phone_number": phone_number, "shipment_query": shipment_query},
+        )
+        return {"job_id": job_id}
+
     try:
-        result = await chatbot.connect_to_server_and_run(query=shipment_query)
+        if idempotency_key:
+            ticket = await get_idempotency_store().run_once(
+                f"courier_shipment_updates:{idempotency_key}", submit
+            )
+        else:
+            ticket = await submit()
+    except Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+    return {"response": get_job_queue().get(ticket["job_id"])}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=JOB_MAX_WAIT)):
+    """
+    Status of a background job, with its result or error once it has finished.
+
+    With ``wait`` the request is held for up to that many seconds until the job
+    finishes, so clients can follow a job without polling in a tight loop.
+    """
+    job = await get_job_queue().wait(job_id, timeout=wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return {"response": job}
 
-        shipper_email = get_shipper_email(result)
-        # courier_number = get_courier_number(result)
-        shipment_order = get_shipment_order(result)
 
-        message_supplier = TEMPLATE_EMAIL_UPDATE_ETA.format(shipment_id=shipment_order)
-        message_courier = TEMPLATE_TG_UPDATE_ETA.format(shipment_id=shipment_order)
+@app.get("/job_stats")
+async def job_stats():
+    """Depth of the job queue and submit-to-finished latency."""
+    return {"response": get_job_queue().report()}
 
-        gmail_client.send_email(
+
+async def apply_courier_update(shipment_query: str) -> dict:
+    """Run the courier's update through the LLM + MCP tools and queue the email.
+
+    Runs in a job worker, see ``courier_shipment_updates``.
+    """
+    result = await get_chatbot().connect_to_server_and_run(query=shipment_query)
+
+    shipper_email = get_shipper_email(result)
+    # courier_number = get_courier_number(result)
+    shipment_order = get_shipment_order(result)
+
+    message_supplier = TEMPLATE_EMAIL_UPDATE_ETA.format(shipment_id=shipment_order)
+    message_courier = TEMPLATE_TG_UPDATE_ETA.format(shipment_id=shipment_order)
+
+    get_outbound_queue().enqueue(
+        GmailClient.build_message(
             to_email=shipper_email,
             subject="Shipment Update",
             body=message_supplier,
         )
-        print(f"Sent email to {shipper_email}")
+    )
+    print(f"Queued email to {shipper_email}")
 
-        return {"response": message_courier}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"response": message_courier}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Request and stage metrics of the API and the processes exporting to
+    METRICS_DIR (MCP servers, ingestion workers), in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        await asyncio.to_thread(collect), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/outbound_mail_stats")
+async def outbound_mail_stats():
+    """Depth of the outbound email queue and enqueue-to-sent latency."""
+    return {"response": get_outbound_queue().report()}
 
 
 @app.post("/set_tg_bot_name/{name}")
@@ -137,4 +523,7 @@ async def set_name(name: str):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Once per start, before any worker or MCP server queries the database
+    ensure_indexes(get_engine())
+    # By import string, so each worker process imports and sets up its own app
+    uvicorn.run("run_mcp:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
@@ -1,25 +1,92 @@
+import asyncio
+import dataclasses
 import logging
+import os
 import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
 
-import requests
+import httpx
 
-from gmail_integration.gmail_client import Email, GmailClient
+from gmail_integration.body_cleaner import BodyCleaner
+from gmail_integration.dedup_store import DedupStore
+from gmail_integration.gmail_auth import get_gmail_auth
+from gmail_integration.gmail_client import Email, GmailClient, InboxSync
+from gmail_integration.history_checkpoint import HistoryCheckpoint
+from gmail_integration.mailbox_scheduler import (
+    Mailbox,
+    MailboxScheduler,
+    discover_mailboxes,
+    mailbox_owner,
+)
+from gmail_integration.outbound_queue import OutboundQueue
+from gmail_integration.pipeline import Pipeline, Stage
+from observability import tracing
+from observability.metrics import enable_export
 
 mcp_api_url = "http://0.0.0.0:8000"
 
-def call_mcp_server(email: str, query: str) -> str:
+# One <name>.json Gmail token per connected mailbox
+MAILBOX_DIR = os.getenv("MAILBOX_DIR", "mailboxes")
+# History checkpoint, dedup store and outbound queue of each mailbox
+STATE_DIR = os.getenv("MAILBOX_STATE_DIR", "mailbox_state")
+# Served from token.json, with state in the working directory, if MAILBOX_DIR is empty
+DEFAULT_MAILBOX = "default"
+
+MIN_POLL_INTERVAL = 10  # seconds between syncs of a mailbox with recent activity
+MAX_POLL_INTERVAL = 300  # seconds between syncs of an idle mailbox
+MAILBOX_SCAN_INTERVAL = 60  # seconds between checks for added/removed mailboxes
+STATS_INTERVAL = 60  # seconds between pipeline stats reports
+FETCH_CONCURRENCY = 4  # mailboxes synced at once
+DEDUP_CACHE_SIZE = 10_000  # message ids kept in memory per mailbox
+DEDUP_RETENTION = 14 * 24 * 3600  # seconds an answered message id is remembered
+DEDUP_PRUNE_INTERVAL = 3600  # seconds between prunes of a mailbox's dedup store
+QUERY_CONCURRENCY = 4  # concurrent /query calls (each runs an MCP + LLM round)
+QUERY_TIMEOUT = 120  # seconds
+QUERY_OVERLOAD_RETRIES = 3  # times a /query refused with a 429 is sent again
+QUERY_MAX_RETRY_AFTER = 60  # seconds waited at most before such a retry
+
+
+class QueryFailed(Exception):
+    """The API gave no answer to a query, after any retries of a 429."""
+
+
+async def call_mcp_server(
+    client: httpx.AsyncClient, email: str, query: str, thread_id: Optional[str] = None
+) -> str:
+    """The API's answer to an email's query; raises QueryFailed if there is none."""
     url = mcp_api_url + "/query"
     params = {"email": email, "query": query}
-    headers = {"accept": "application/json"}
+    if thread_id:
+        # Lets the server reuse what earlier messages of the thread resolved
+        params["thread_id"] = thread_id
 
-    try:
-        response = requests.post(url, headers=headers, params=params, data="")
-        response.raise_for_status()
+    # Starts the email's trace; the API and MCP server continue it
+    with tracing.span("email_query", thread_id=thread_id) as span:
+        headers = tracing.inject({"accept": "application/json"})
+        try:
+            for attempt in range(QUERY_OVERLOAD_RETRIES + 1):
+                response = await client.post(
+                    url, headers=headers, params=params, content=""
+                )
+                retry_after = response.headers.get("Retry-After", "")
+                if (
+                    response.status_code != 429
+                    or attempt == QUERY_OVERLOAD_RETRIES
+                    or not retry_after.isdigit()
+                ):
+                    break
+                # The API is shedding load; come back when it expects room
+                await asyncio.sleep(min(int(retry_after), QUERY_MAX_RETRY_AFTER))
+            response.raise_for_status()
 
-        return response.json()["response"]
-    except requests.RequestException as e:
-        logging.error(f"Error calling MCP server: {e}")
-        return f"Error: {str(e)}"
+            return response.json()["response"]
+        except httpx.HTTPError as e:
+            logging.error(f"Error calling MCP server: {e}")
+            span.error = f"{type(e).__name__}: {e}"
+            # Not answered, so the email is left for the next sync to retry
+            raise QueryFailed(str(e)) from e
 
 
 def create_query(email: Email) -> str:
@@ -30,30 +97,351 @@ def create_query(email: Email) -> str:
     return query
 
 
-if __name__ == "__main__":
-    gmail_client = GmailClient(
-        credentials_file="credentials.json",
-        token_file="token.json",
+@dataclass
+class PendingSync:
+    """A sync of a mailbox whose emails are still going through the pipeline."""
+
+    sync: InboxSync
+    # Emails of the sync not answered or failed yet, including ones that an
+    # earlier sync of the mailbox is still handling
+    remaining: int
+    # Emails that failed; the checkpoint does not move past them
+    failed_ids: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class MailboxConnection:
+    """Gmail client and local state of one mailbox served by this worker."""
+
+    name: str
+    gmail_client: GmailClient
+    history_checkpoint: HistoryCheckpoint
+    dedup_store: DedupStore
+    outbound_queue: OutboundQueue
+    sender: Optional["asyncio.Task[None]"] = None
+    # Syncs in the order they were fetched, completed oldest first
+    pending_syncs: Deque[PendingSync] = field(default_factory=deque)
+    pruned_at: float = 0.0
+
+    def take_completed_syncs(self) -> List[PendingSync]:
+        """Remove and return the oldest syncs whose emails were all dealt with."""
+        completed = []
+        while self.pending_syncs and self.pending_syncs[0].remaining == 0:
+            completed.append(self.pending_syncs.popleft())
+        return completed
+
+    def sync(self, completed: List[PendingSync]) -> InboxSync:
+        """Checkpoint the ``completed`` syncs, then sync the inbox again."""
+        for pending in completed:
+            self.gmail_client.complete_sync(
+                self.history_checkpoint,
+                pending.sync,
+                mark_as_read=True,
+                failed_ids=pending.failed_ids,
+            )
+        if time.time() - self.pruned_at >= DEDUP_PRUNE_INTERVAL:
+            self.dedup_store.prune(DEDUP_RETENTION)
+            self.pruned_at = time.time()
+        return self.gmail_client.sync_new_messages(self.history_checkpoint)
+
+    def answer(self, email: Email, reply: dict) -> None:
+        """Queue ``reply`` and record ``email`` as answered in one transaction."""
+        self.outbound_queue.enqueue(
+            reply,
+            in_transaction=lambda conn: self.dedup_store.add_many(
+                [email.message_id], conn=conn
+            ),
+        )
+
+    @classmethod
+    def open(cls, name: str, token_file: str, state_dir: str) -> "MailboxConnection":
+        os.makedirs(state_dir, exist_ok=True)
+        # Processed ids share the outbound queue's file, to be committed with replies
+        state_db = os.path.join(state_dir, "outbound_mail.db")
+        # A client of its own for sending: sends run in a worker thread next to
+        # the inbox syncs, and a client's HTTP transport is not thread-safe
+        sending_client = GmailClient(
+            credentials_file="credentials.json", token_file=token_file
+        )
+        return cls(
+            name=name,
+            gmail_client=GmailClient(
+                credentials_file="credentials.json", token_file=token_file
+            ),
+            history_checkpoint=HistoryCheckpoint(
+                os.path.join(state_dir, "gmail_history.json")
+            ),
+            dedup_store=DedupStore(state_db, cache_size=DEDUP_CACHE_SIZE),
+            outbound_queue=OutboundQueue(sending_client.send_messages, path=state_db),
+        )
+
+    def close(self) -> None:
+        if self.sender is not None:
+            self.sender.cancel()
+        self.dedup_store.close()
+        self.outbound_queue.close()
+
+
+def build_pipeline(
+    scheduler: MailboxScheduler,
+    connections: Dict[str, MailboxConnection],
+    http_client: httpx.AsyncClient,
+    body_cleaner: BodyCleaner,
+    fetch_concurrency: int = FETCH_CONCURRENCY,
+    query_concurrency: int = QUERY_CONCURRENCY,
+) -> Pipeline:
+    """fetch -> dedupe -> clean -> query -> reply, with bounded queues in between.
+
+    The pipeline is fed with the mailboxes ``scheduler`` says are due. A mailbox's
+    history checkpoint only moves past a sync once each of its emails has been
+    answered, so emails lost to a crash are listed again by the next sync.
+    """
+    # (mailbox, message id) -> syncs waiting for the message, from the dedupe
+    # stage until it is answered; answered ones are in the mailbox's dedup store
+    in_progress: Dict[Tuple[str, str], List[PendingSync]] = {}
+
+    def settle(email: Email, answered: bool) -> None:
+        for pending in in_progress.pop((email.mailbox, email.message_id)):
+            pending.remaining -= 1
+            if not answered:
+                pending.failed_ids.add(email.message_id)
+
+    def settled_on_failure(
+        handler: Callable[[Email], Awaitable[Any]],
+    ) -> Callable[[Email], Awaitable[Any]]:
+        # A stage after dedupe failing releases the email, so the next sync of
+        # the mailbox, which lists it again, retries it
+        async def handle(email: Email) -> Any:
+            try:
+                return await handler(email)
+            except Exception:
+                settle(email, answered=False)
+                raise
+
+        return handle
+
+    # The scheduler hands out a mailbox again only after its sync completed, so
+    # a mailbox's gmail_client is used by one thread at a time (its HTTP
+    # transport is not thread-safe); replies are sent by its outbound_queue
+    async def fetch(mailbox: Mailbox) -> List[Tuple[PendingSync, Email]]:
+        emails: List[Email] = []
+        try:
+            connection = connections[mailbox.name]
+            sync = await asyncio.to_thread(
+                connection.sync, connection.take_completed_syncs()
+            )
+            emails = sync.emails
+        finally:
+            scheduler.completed(mailbox, len(emails))
+        print(f"Found {len(emails)} new messages in {mailbox.name}")
+        pending = PendingSync(sync, remaining=len(emails))
+        connection.pending_syncs.append(pending)
+        return [
+            (pending, dataclasses.replace(email, mailbox=mailbox.name))
+            for email in emails
+        ]
+
+    async def dedupe(item: Tuple[PendingSync, Email]) -> Optional[Email]:
+        pending, email = item
+        key = (email.mailbox, email.message_id)
+        if key in in_progress:
+            # Listed again while an earlier sync handles it; wait for that outcome
+            in_progress[key].append(pending)
+            return None
+        if email.message_id in connections[email.mailbox].dedup_store:
+            pending.remaining -= 1
+            return None
+        in_progress[key] = [pending]
+        return email
+
+    async def clean(email: Email) -> Email:
+        # Only the new text goes to the LLM, and gets quoted in the reply
+        return dataclasses.replace(email, body=body_cleaner.clean(email.body))
+
+    async def query(email: Email) -> Tuple[Email, str]:
+        result = await call_mcp_server(
+            http_client, email=email.sender, query=email.body, thread_id=email.thread_id
+        )
+        logging.info(f"Request: {email.sender} {email.body}")
+        logging.info(f"Response: {result}")
+        return email, result
+
+    async def reply(item: Tuple[Email, str]) -> None:
+        email, result = item
+        answered = False
+        try:
+            connection = connections[email.mailbox]
+            # The queue persists the reply and sends it in the background, so the
+            # message counts as answered from here on, even across restarts
+            connection.answer(email, connection.gmail_client.build_reply(email, result))
+            answered = True
+        finally:
+            settle(email, answered)
+
+    return Pipeline(
+        [
+            Stage(
+                "fetch",
+                fetch,
+                concurrency=fetch_concurrency,
+                queue_size=1,
+                fan_out=True,
+            ),
+            Stage("dedupe", dedupe, concurrency=1, queue_size=50),
+            Stage("clean", settled_on_failure(clean), concurrency=1, queue_size=20),
+            Stage(
+                "query",
+                settled_on_failure(query),
+                concurrency=query_concurrency,
+                queue_size=20,
+            ),
+            Stage("reply", reply, concurrency=1, queue_size=20),
+        ]
     )
 
-    unique_message_ids = set()
 
+def owned_mailboxes(worker_index: int, worker_count: int) -> Dict[str, str]:
+    """Mailbox name -> token file of the mailboxes this worker is responsible for.
+
+    Without any tokens in MAILBOX_DIR, worker 0 serves token.json as before.
+    """
+    tokens = discover_mailboxes(MAILBOX_DIR)
+    if not tokens:
+        tokens = {DEFAULT_MAILBOX: "token.json"}
+    return {
+        name: token_file
+        for name, token_file in tokens.items()
+        if mailbox_owner(name, worker_count) == worker_index
+    }
+
+
+def refresh_mailboxes(
+    scheduler: MailboxScheduler,
+    connections: Dict[str, MailboxConnection],
+    worker_index: int,
+    worker_count: int,
+) -> None:
+    """Start serving newly connected mailboxes and stop serving removed ones."""
+    owned = owned_mailboxes(worker_index, worker_count)
+
+    for name in list(connections):
+        if name not in owned:
+            scheduler.remove(name)
+            connections.pop(name).close()
+            print(f"Stopped serving mailbox {name}")
+
+    for name, token_file in owned.items():
+        if name in connections:
+            continue
+        # Only the default mailbox may start the interactive OAuth flow
+        if (
+            name != DEFAULT_MAILBOX
+            and get_gmail_auth(token_file, GmailClient.SCOPES).credentials() is None
+        ):
+            logging.error(f"No valid token for mailbox {name}, skipping it")
+            continue
+        state_dir = "." if name == DEFAULT_MAILBOX else os.path.join(STATE_DIR, name)
+        connection = MailboxConnection.open(name, token_file, state_dir)
+        connection.sender = asyncio.create_task(connection.outbound_queue.run())
+        connections[name] = connection
+        scheduler.add(name, token_file)
+        print(f"Serving mailbox {name}")
+
+
+async def watch_mailboxes(
+    scheduler: MailboxScheduler,
+    connections: Dict[str, MailboxConnection],
+    worker_index: int,
+    worker_count: int,
+    interval: float,
+) -> None:
     while True:
+        await asyncio.sleep(interval)
+        try:
+            refresh_mailboxes(scheduler, connections, worker_index, worker_count)
+        except Exception:
+            logging.exception("Failed to refresh mailboxes")
+
 
-        print("Getting unread messages...")
-        emails: list[Email] = gmail_client.get_unread_messages(
-            max_results=10, mark_as_read=True
+async def report_stats(
+    pipeline: Pipeline,
+    scheduler: MailboxScheduler,
+    connections: Dict[str, MailboxConnection],
+    body_cleaner: BodyCleaner,
+    interval: float,
+) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        for stage in pipeline.report():
+            print(
+                f"[{stage['stage']}] processed={stage['processed']} "
+                f"dropped={stage['dropped']} failed={stage['failed']} "
+                f"in_flight={stage['in_flight']} queued={stage['queued']} "
+                f"throughput={stage['throughput_per_s']:.2f}/s "
+                f"p50={stage['p50_ms']:.0f}ms p95={stage['p95_ms']:.0f}ms"
+            )
+        cleaning = body_cleaner.report()
+        print(
+            f"[clean] tokens_saved={cleaning['tokens_saved']} "
+            f"of {cleaning['original_tokens']} ({cleaning['saved_ratio']:.0%})"
         )
-        emails = [email for email in emails if email.message_id not in unique_message_ids]
-        print(f"Found {len(emails)} unread messages")
+        for mailbox in scheduler.report():
+            outbound = connections[mailbox["mailbox"]].outbound_queue.report()
+            print(
+                f"[mailbox {mailbox['mailbox']}] polls={mailbox['polls']} "
+                f"messages={mailbox['messages']} "
+                f"interval={mailbox['interval_s']:.0f}s "
+                f"outbound_queued={outbound['queued']} "
+                f"outbound_sent={outbound['processed']} "
+                f"outbound_failed={outbound['failed']} "
+                f"outbound_p95={outbound['p95_ms']:.0f}ms"
+            )
 
-        unique_message_ids.update([email.message_id for email in emails])
 
-        for email in emails:
-            result = call_mcp_server(email=email.sender, query=email.body)
-            logging.info(f"Request: {email.sender} {email.body}")
-            logging.info(f"Response: {result}")
+async def main() -> None:
+    worker_index = int(os.getenv("WORKER_INDEX", "0"))
+    worker_count = int(os.getenv("WORKER_COUNT", "1"))
+    if not 0 <= worker_index < worker_count:
+        raise RuntimeError("WORKER_INDEX must be between 0 and WORKER_COUNT - 1")
 
-            gmail_client.reply_to_email(email, result)
+    scheduler = MailboxScheduler(
+        min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL
+    )
+    connections: Dict[str, MailboxConnection] = {}
+    refresh_mailboxes(scheduler, connections, worker_index, worker_count)
+    print(f"Worker {worker_index}/{worker_count} serving {len(connections)} mailboxes")
+    # Gmail fetch and send times, read back by the API's /metrics
+    enable_export()
+    tracing.configure("processing")
+
+    body_cleaner = BodyCleaner()
+
+    async with httpx.AsyncClient(timeout=QUERY_TIMEOUT) as http_client:
+        pipeline = build_pipeline(scheduler, connections, http_client, body_cleaner)
+        background = [
+            asyncio.create_task(
+                watch_mailboxes(
+                    scheduler,
+                    connections,
+                    worker_index,
+                    worker_count,
+                    MAILBOX_SCAN_INTERVAL,
+                )
+            ),
+            asyncio.create_task(
+                report_stats(
+                    pipeline, scheduler, connections, body_cleaner, STATS_INTERVAL
+                )
+            ),
+        ]
+        try:
+            await pipeline.run(scheduler.due())
+        finally:
+            for task in background:
+                task.cancel()
+            for connection in connections.values():
+                connection.close()
 
-        time.sleep(10)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,18 +1,35 @@
+import asyncio
 import os
 import sys
 import urllib.parse
+from collections import Counter
+from typing import Any, Awaitable, Dict, Hashable, List, Optional, Tuple
 
 import aiohttp
+from aiohttp import web
 from dotenv import load_dotenv
-from telegram import KeyboardButton, ReplyKeyboardMarkup, Update
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    Message,
+    ReplyKeyboardMarkup,
+    Update,
+)
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
+    CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     MessageHandler,
     filters,
 )
 
+from courier_store import CourierStore
+from request_trace import request_trace
+from update_coalescer import UpdateCoalescer
+
 
 load_dotenv()
 
@@ -22,15 +39,259 @@ if sys.platform == "darwin" and os.environ.get("ADD_ADHOC_CERT") == "true":
     os.environ["SSL_CERT_FILE"] = "/opt/homebrew/etc/openssl@3/cert.pem"
 
 
-# In-memory set to track users who have shared contact info
-shared_contacts = dict()
-api_base_url =  "http://0.0.0.0:8000"
+api_base_url = "http://0.0.0.0:8000"
+# Telegram user -> courier; persisted so couriers share their number only once
+COURIER_STORE_PATH = os.getenv("COURIER_STORE_PATH", "couriers.db")
+
+# One HTTP session per application, created in post_init and closed in post_shutdown
+API_CONNECTIONS = 20  # pooled keep-alive connections to the API
+API_KEEPALIVE = 60  # seconds an idle pooled connection is kept open
+API_CONNECT_TIMEOUT = 5  # seconds
+API_TIMEOUT = 120  # seconds; shipment updates run a full MCP + LLM round
+API_RETRIES = 2
+API_RETRY_BACKOFF = 0.5  # seconds, doubled on every retry
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+API_MAX_RETRY_AFTER = 30  # seconds; longer Retry-After answers are not waited out
+
+# Shipments are listed a page per message; Telegram caps messages at 4096 chars
+SHIPMENTS_PAGE_SIZE = 5
+SHIPMENTS_CALLBACK = (
+    "shipments:"  # callback data of the paging buttons: prefix + cursor
+)
+SHIPMENT_STATUSES = ("pending", "in_transit", "delivered", "cancelled")
+
+# Updates from different users are handled concurrently, each user's in order
+BOT_CONCURRENT_UPDATES = 32  # updates being handled at once, across all users
+BOT_PENDING_UPDATES = 1024  # updates taken off the queue, including waiting ones
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+# Parallel webhook requests may arrive out of order, and a request only queues
+# its update, so one connection keeps Telegram's order at little cost
+WEBHOOK_MAX_CONNECTIONS = 1
+
+# Shipment updates run as background jobs on the API; the bot follows each job
+JOB_POLL_WAIT = 30  # seconds the API holds each status request until the job ends
+JOB_TIMEOUT = 600  # seconds the bot follows a job before giving up on it
+
+# A courier's messages sent in quick succession are sent as one shipment update
+UPDATE_COALESCE_WINDOW = 2.0  # seconds of quiet that close a batch
+UPDATE_COALESCE_MAX_DELAY = 10.0  # seconds a batch is held at most
+
+
+def create_http_session(base_url: str = api_base_url) -> aiohttp.ClientSession:
+    """Client session with a bounded keep-alive pool for calls to the API."""
+    connector = aiohttp.TCPConnector(
+        limit=API_CONNECTIONS,
+        limit_per_host=API_CONNECTIONS,
+        keepalive_timeout=API_KEEPALIVE,
+    )
+    timeout = aiohttp.ClientTimeout(total=API_TIMEOUT, connect=API_CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(
+        base_url=base_url,
+        connector=connector,
+        timeout=timeout,
+        headers={"accept": "application/json"},
+    )
+
+
+async def post_init(application: Application) -> None:
+    application.bot_data["http_session"] = create_http_session(api_base_url)
+    application.bot_data["couriers"] = CourierStore(COURIER_STORE_PATH)
+    application.bot_data["coalescer"] = UpdateCoalescer(
+        lambda user_id, messages: send_status_update(application, user_id, messages),
+        window=UPDATE_COALESCE_WINDOW,
+        max_delay=UPDATE_COALESCE_MAX_DELAY,
+    )
+
+
+async def post_shutdown(application: Application) -> None:
+    # Held messages still go out, while the session and the store are open
+    coalescer = application.bot_data.pop("coalescer", None)
+    if coalescer is not None:
+        await coalescer.drain()
+    session = application.bot_data.pop("http_session", None)
+    if session is not None:
+        await session.close()
+    couriers = application.bot_data.pop("couriers", None)
+    if couriers is not None:
+        couriers.close()
+
+
+def get_http_session(context: ContextTypes.DEFAULT_TYPE) -> aiohttp.ClientSession:
+    return context.application.bot_data["http_session"]
+
+
+def get_couriers(context: ContextTypes.DEFAULT_TYPE) -> CourierStore:
+    return context.application.bot_data["couriers"]
+
+
+def get_coalescer(context: ContextTypes.DEFAULT_TYPE) -> UpdateCoalescer:
+    return context.application.bot_data["coalescer"]
+
+
+async def call_api(
+    session: aiohttp.ClientSession,
+    method: str,
+    path: str,
+    params: Dict[str, str],
+    retries: int = API_RETRIES,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Optional[Any]]:
+    """
+    Call the API and return the status and, for a 200 or 202, the JSON body.
+
+    Failed connection attempts are always retried. Timeouts, dropped connections
+    and 429/502/503/504 answers are only retried for GET requests and requests
+    with an Idempotency-Key header: any other POST may already have updated a
+    shipment and emailed the shipper. A 429 is retried after its Retry-After.
+    """
+    idempotent = method == "GET" or "Idempotency-Key" in (headers or {})
+    for attempt in range(retries + 1):
+        retry_allowed = attempt < retries
+        delay = API_RETRY_BACKOFF * 2**attempt
+        try:
+            async with session.request(
+                method, path, params=params, headers=headers
+            ) as resp:
+                if resp.status in RETRYABLE_STATUSES and idempotent and retry_allowed:
+                    await resp.read()
+                    retry_after = resp.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        if int(retry_after) > API_MAX_RETRY_AFTER:
+                            return resp.status, None
+                        delay = int(retry_after)
+                else:
+                    data = await resp.json() if resp.status in (200, 202) else None
+                    return resp.status, data
+        except aiohttp.ClientConnectorError:
+            if not retry_allowed:
+                raise
+        except (aiohttp.ServerDisconnectedError, asyncio.TimeoutError):
+            if not (idempotent and retry_allowed):
+                raise
+        await asyncio.sleep(delay)
+
+
+def _ordering_key(update: object) -> Optional[Hashable]:
+    """Updates with the same key are handled one at a time, in arrival order."""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return "user", update.effective_user.id
+        if update.effective_chat is not None:
+            return "chat", update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Handles updates of different users concurrently and each user's in order.
+
+    A courier waiting on a slow shipment update no longer holds up the other
+    couriers, and a courier's own follow-up messages are still answered in the
+    order they were sent. ``BaseUpdateProcessor``'s semaphore bounds the updates
+    taken off the queue (``max_pending_updates``); a second one bounds the
+    handlers actually running, so updates queued behind a busy user do not take
+    running slots from everyone else.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = BOT_CONCURRENT_UPDATES,
+        max_pending_updates: int = BOT_PENDING_UPDATES,
+    ):
+        super().__init__(max(concurrency, max_pending_updates))
+        self.concurrency = concurrency
+        self._running = asyncio.BoundedSemaphore(concurrency)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        # Updates holding or waiting for each lock, to drop locks nobody needs
+        self._waiting: Counter = Counter()
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        key = _ordering_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] += 1
+        try:
+            async with lock, self._running:
+                await coroutine
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+async def serve_webhook(
+    application: Application,
+    webhook_url: str,
+    listen: str = WEBHOOK_LISTEN,
+    port: int = WEBHOOK_PORT,
+    secret_token: Optional[str] = None,
+) -> None:
+    """
+    Receive updates on ``webhook_url`` instead of polling for them, until cancelled.
+
+    Telegram's requests are answered as soon as the update is queued, so a slow
+    handler never makes Telegram retry or throttle the webhook. ``listen`` and
+    ``port`` are where the server binds; TLS is expected to be terminated in
+    front of it, at the public ``webhook_url``.
+    """
+    path = urllib.parse.urlsplit(webhook_url).path or "/"
+
+    async def receive(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+        if secret_token and token != secret_token:
+            return web.Response(status=403)
+        update = Update.de_json(await request.json(), application.bot)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    web_app = web.Application()
+    web_app.router.add_post(path, receive)
+    runner = web.AppRunner(web_app, access_log=None)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, listen, port).start()
+        # Only once we are listening: Telegram starts delivering right away
+        await application.bot.set_webhook(
+            webhook_url,
+            secret_token=secret_token,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a greeting message and ask for contact info if not already shared."""
     user_id = update.message.from_user.id
-    if user_id not in shared_contacts:
+    if user_id not in get_couriers(context):
         keyboard = [[KeyboardButton("Share phone number", request_contact=True)]]
         reply_markup = ReplyKeyboardMarkup(
             keyboard, one_time_keyboard=True, resize_keyboard=True
@@ -50,7 +311,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def update_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send user message as shipment status update to the API and reply with API response."""
     user_id = update.message.from_user.id
-    if user_id not in shared_contacts:
+    identity = get_couriers(context).get(user_id)
+    if identity is None:
         user_msg = update.message.text
         # Simple phone number validation (basic, can be improved)
         if (
@@ -58,7 +320,7 @@ async def update_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
             and user_msg.replace("+", "").replace("-", "").isdigit()
             and 7 < len(user_msg) < 20
         ):
-            shared_contacts[user_id] = user_msg
+            get_couriers(context).set(user_id, user_msg)
             keyboard = [[KeyboardButton("My shipments")]]
             reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
             await update.message.reply_text(
@@ -69,19 +331,90 @@ async def update_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "You need to share your phone number to continue. Please enter it manually (with country code, e.g. +1234567890):"
             )
     else:
-        user_msg = update.message.text
-        contact_number = shared_contacts.get(user_id)
-        encoded_contact_number = urllib.parse.quote_plus(contact_number) if contact_number else ''
-        url = f"{api_base_url}/courier_shipment_updates?phone_number={encoded_contact_number}&shipment_query={user_msg}"
-        headers = {"accept": "application/json"}
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, data="") as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    reply = data.get("response", "Update successful.")
-                else:
-                    reply = f"Failed to update status. Error code: {resp.status}"
-        await update.message.reply_text(reply)
+        # Answered by send_status_update, together with the messages that follow
+        get_coalescer(context).add(user_id, update.message)
+
+
+async def send_status_update(
+    application: Application, user_id: int, messages: List[Message]
+) -> None:
+    """Send a courier's coalesced messages as one status update and reply to the last."""
+    identity = application.bot_data["couriers"].get(user_id)
+    last = messages[-1]
+    params = {
+        "phone_number": identity.contact_number,
+        "shipment_query": "\n".join(message.text for message in messages),
+    }
+    # The same messages always make the same key, so the API applies a
+    # retried update once
+    key = f"tg-{user_id}-{messages[0].message_id}-{last.message_id}"
+    session = application.bot_data["http_session"]
+    # The API, its job worker and the MCP server continue this trace
+    with request_trace(
+        "status_update", user_id=user_id, messages=len(messages)
+    ) as trace:
+        headers = {"traceparent": trace.traceparent}
+        try:
+            status, data = await call_api(
+                session,
+                "POST",
+                "/courier_shipment_updates",
+                params,
+                headers={"Idempotency-Key": key, **headers},
+            )
+            if status == 202:
+                job = await wait_for_job(session, data["response"], headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            trace.error = f"{type(e).__name__}: {e}"
+            await last.reply_text(f"Failed to update status: {e}")
+            return
+        trace.set(status=status)
+        if status == 202 and job is not None:
+            trace.set(job_status=job["status"])
+    if status == 429:
+        reply = "Too many updates right now, please send yours again in a minute."
+    elif status != 202:
+        reply = f"Failed to update status. Error code: {status}"
+    elif job is None:
+        reply = "Failed to update status: the update was lost."
+    elif job["status"] == "done":
+        reply = (job["result"] or {}).get("response", "Update successful.")
+    elif job["status"] == "failed":
+        reply = f"Failed to update status: {job['error']}"
+    else:
+        reply = "Your update is still being processed."
+    await last.reply_text(reply)
+
+
+async def wait_for_job(
+    session: aiohttp.ClientSession,
+    job: Dict[str, Any],
+    timeout: float = JOB_TIMEOUT,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Follow a background job on the API until it finishes or ``timeout`` passes.
+
+    Each status request is held by the API until the job finishes or
+    JOB_POLL_WAIT passes. Returns the job as last seen, or None if the API does
+    not know it.
+    """
+    deadline = asyncio.get_running_loop().time() + timeout
+    while job["status"] not in ("done", "failed"):
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            break
+        status, data = await call_api(
+            session,
+            "GET",
+            f"/jobs/{job['job_id']}",
+            {"wait": str(min(JOB_POLL_WAIT, remaining))},
+            headers=headers,
+        )
+        if status != 200:
+            return None
+        job = data["response"]
+    return job
 
 
 async def request_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -100,8 +433,7 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     contact = update.message.contact
     if contact:
-        
-        shared_contacts[user_id] = contact.phone_number
+        get_couriers(context).set(user_id, contact.phone_number)
         keyboard = [[KeyboardButton("My shipments")]]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text(
@@ -109,85 +441,170 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
-async def fetch_shipments(contact_number: str, api_base_url: str):
-    """Fetch shipments from the API for the given contact number."""
-    encoded_contact_number = urllib.parse.quote_plus(contact_number) if contact_number else ''
-    url = f"{api_base_url}/get_courier_shipments?contact_number={encoded_contact_number}"
-    headers = {"accept": "application/json"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                return data.get("response", [])
-            else:
-                return None
+async def fetch_shipments(
+    session: aiohttp.ClientSession,
+    contact_number: str,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """Fetch one page of shipments from the API; None if that failed."""
+    params = {
+        "contact_number": contact_number or "",
+        "page_size": str(SHIPMENTS_PAGE_SIZE),
+    }
+    if status:
+        params["status"] = status
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        status_code, data = await call_api(
+            session, "GET", "/get_courier_shipments", params
+        )
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+    if status_code == 200:
+        return data
+    else:
+        return None
+
+
+def format_shipment(shipment: Dict[str, Any]) -> str:
+    status_map = {
+        "in_transit": "🚚 <b>In Transit</b>",
+        "delivered": "✅ <b>Delivered</b>",
+        "pending": "⏳ <b>Pending</b>",
+    }
+    status = status_map.get(shipment["shipment_status"], shipment["shipment_status"])
+    eta = shipment["eta"].replace("T", " ") if shipment["eta"] else "N/A"
+    delivery_date = (
+        shipment["delivery_date"].replace("T", " ")
+        if shipment["delivery_date"]
+        else "N/A"
+    )
+    return (
+        f"<b>📦 Shipment #{shipment['shipment_id']}</b>\n"
+        f"Status: {status}\n"
+        f"<b>ETA:</b> {eta}\n"
+        f"<b>Delivery Date:</b> {delivery_date}\n"
+        f"<b>From:</b>\n{shipment['source_address']}\n"
+        f"<b>To:</b>\n{shipment['dest_address']}\n"
+        f"<code>─────────────────────────────</code>"
+    )
+
+
+def render_shipments_page(
+    page: Dict[str, Any],
+) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Message text for a page of shipments and the buttons to its neighbours."""
+    title = "<b>Your Shipments:</b>"
+    if page.get("status"):
+        title = f"<b>Your {page['status'].replace('_', ' ')} shipments:</b>"
+    message = f"{title}\n\n" + "\n\n".join(
+        [format_shipment(s) for s in page["response"]]
+    )
+
+    buttons = []
+    if page.get("prev_cursor"):
+        buttons.append(
+            InlineKeyboardButton(
+                "« Newer", callback_data=SHIPMENTS_CALLBACK + page["prev_cursor"]
+            )
+        )
+    if page.get("next_cursor"):
+        buttons.append(
+            InlineKeyboardButton(
+                "Older »", callback_data=SHIPMENTS_CALLBACK + page["next_cursor"]
+            )
+        )
+    return message, InlineKeyboardMarkup([buttons]) if buttons else None
 
 
 async def my_shipments(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Send formatted shipment data to the user."""
+    """Send the first page of the user's shipments, optionally of one status."""
     user_id = update.message.from_user.id
-    if user_id not in shared_contacts:
+    identity = get_couriers(context).get(user_id)
+    if identity is None:
         await update.message.reply_text("Please share your phone number first.")
         return
 
-    contact_number = shared_contacts.get(user_id)
-    shipments_data = await fetch_shipments(contact_number, api_base_url)
-    if shipments_data is None:
+    # "/my_shipments in_transit"; the keyboard button has no arguments
+    status = context.args[0].lower() if context.args else None
+    if status is not None and status not in SHIPMENT_STATUSES:
+        await update.message.reply_text(
+            f"Unknown status. Use one of: {', '.join(SHIPMENT_STATUSES)}"
+        )
+        return
+
+    page = await fetch_shipments(
+        get_http_session(context),
+        identity.contact_number,
+        status=status,
+    )
+    if page is None:
         await update.message.reply_text(
             "Failed to retrieve shipments. Please try again later."
         )
         return
-    if not shipments_data:
+    if not page["response"]:
         await update.message.reply_text("No shipments found for your contact number.")
         return
 
-    def format_shipment(shipment):
-        status_map = {
-            "in_transit": "🚚 <b>In Transit</b>",
-            "delivered": "✅ <b>Delivered</b>",
-            "pending": "⏳ <b>Pending</b>",
-        }
-        status = status_map.get(
-            shipment["shipment_status"], shipment["shipment_status"]
-        )
-        eta = shipment["eta"].replace("T", " ") if shipment["eta"] else "N/A"
-        delivery_date = (
-            shipment["delivery_date"].replace("T", " ")
-            if shipment["delivery_date"]
-            else "N/A"
-        )
-        return (
-            f"<b>📦 Shipment #{shipment['shipment_id']}</b>\n"
-            f"Status: {status}\n"
-            f"<b>ETA:</b> {eta}\n"
-            f"<b>Delivery Date:</b> {delivery_date}\n"
-            f"<b>From:</b>\n{shipment['source_address']}\n"
-            f"<b>To:</b>\n{shipment['dest_address']}\n"
-            f"<code>─────────────────────────────</code>"
-        )
-
-    message = "<b>Your Shipments:</b>\n\n" + "\n\n".join(
-        [format_shipment(s) for s in shipments_data]
+    message, reply_markup = render_shipments_page(page)
+    await update.message.reply_text(
+        message, parse_mode="HTML", reply_markup=reply_markup
     )
-    await update.message.reply_text(message, parse_mode="HTML")
 
 
-def main():
-    # Load environment variables from .env
-    load_dotenv(".env")
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
-        print("Error: TELEGRAM_BOT_TOKEN not found in environment.")
+async def shipments_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Replace the shipments message with the page a paging button points to."""
+    query = update.callback_query
+    identity = get_couriers(context).get(query.from_user.id)
+    if identity is None:
+        await query.answer("Please share your phone number first.")
         return
 
-    # Initialize application
-    app = Application.builder().token(token).build()
+    page = await fetch_shipments(
+        get_http_session(context),
+        identity.contact_number,
+        cursor=query.data[len(SHIPMENTS_CALLBACK) :],
+    )
+    if page is None:
+        await query.answer("Failed to retrieve shipments. Please try again later.")
+        return
+    if not page["response"]:
+        await query.answer("No more shipments.")
+        return
+
+    await query.answer()
+    message, reply_markup = render_shipments_page(page)
+    await query.edit_message_text(message, parse_mode="HTML", reply_markup=reply_markup)
+
+
+def build_application(
+    token: str,
+    update_processor: Optional[BaseUpdateProcessor] = None,
+    bot_api_url: Optional[str] = None,
+) -> Application:
+    """The bot with its handlers; ``bot_api_url`` overrides Telegram's Bot API."""
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(update_processor or PerUserUpdateProcessor())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if bot_api_url:
+        builder = builder.base_url(f"{bot_api_url}/bot")
+    app = builder.build()
 
     # Handlers for commands and messages
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("my_shipments", my_shipments))
     app.add_handler(CommandHandler("phone", request_phone))
     app.add_handler(MessageHandler(filters.CONTACT, handle_contact))
+    app.add_handler(
+        CallbackQueryHandler(shipments_page, pattern=f"^{SHIPMENTS_CALLBACK}")
+    )
     app.add_handler(
         MessageHandler(
             filters.Regex(r"^(My shipment|my shipment|My shipments|my shipments)$"),
@@ -195,9 +612,36 @@ def main():
         )
     )
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, update_status))
+    return app
+
 
-    # Start polling and run until interrupted
-    app.run_polling()
+def main():
+    # Load environment variables from .env
+    load_dotenv(".env")
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        print("Error: TELEGRAM_BOT_TOKEN not found in environment.")
+        return
+
+    app = build_application(token)
+
+    # Receive updates through a webhook when a public URL is configured,
+    # otherwise poll for them and run until interrupted
+    webhook_url = os.getenv("TELEGRAM_WEBHOOK_URL")
+    if webhook_url:
+        try:
+            asyncio.run(
+                serve_webhook(
+                    app,
+                    webhook_url,
+                    port=int(os.getenv("TELEGRAM_WEBHOOK_PORT", WEBHOOK_PORT)),
+                    secret_token=os.getenv("TELEGRAM_WEBHOOK_SECRET"),
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
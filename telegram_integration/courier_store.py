@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class CourierIdentity:
+    # The API finds the courier's shipments by this number
+    contact_number: str
+
+
+class CourierStore:
+    """Which courier each Telegram user is.
+
+    Users are looked up in memory first and fall back to a SQLite table keyed by
+    Telegram user id, so a courier shares their phone number once and a bot
+    restart goes unnoticed. Entries are cached on first use; there is one per
+    courier, so the cache is not bounded.
+    """
+
+    def __init__(self, path: str = "couriers.db"):
+        self.path = path
+        self._cache: Dict[int, CourierIdentity] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS couriers ("
+            " user_id INTEGER PRIMARY KEY,"
+            " contact_number TEXT NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ")"
+        )
+        self._conn.commit()
+
+    def get(self, user_id: int) -> Optional[CourierIdentity]:
+        with self._lock:
+            identity = self._cache.get(user_id)
+            if identity is None:
+                row = self._conn.execute(
+                    "SELECT contact_number FROM couriers WHERE user_id = ?",
+                    (user_id,),
+                ).fetchone()
+                if row is not None:
+                    identity = self._cache[user_id] = CourierIdentity(*row)
+            return identity
+
+    def __contains__(self, user_id: object) -> bool:
+        return isinstance(user_id, int) and self.get(user_id) is not None
+
+    def set(self, user_id: int, contact_number: str) -> CourierIdentity:
+        identity = CourierIdentity(contact_number)
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO couriers"
+                    " (user_id, contact_number, updated_at) VALUES (?, ?, ?)",
+                    (user_id, contact_number, time.time()),
+                )
+            self._cache[user_id] = identity
+        return identity
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM couriers").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,70 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+# Shared with the API and MCP servers of the deployment; unset disables the export
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+
+@dataclass
+class RequestTrace:
+    """The root span of the trace of one request the bot makes to the API.
+
+    Its ``traceparent`` header makes the API's spans part of the same trace.
+    The bot is deployed on its own, so this writes the spans in the format of
+    the repository's ``observability.tracing`` instead of importing it.
+    """
+
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    trace_id: str = field(default_factory=lambda: os.urandom(16).hex())
+    span_id: str = field(default_factory=lambda: os.urandom(8).hex())
+    start: float = field(default_factory=time.time)
+    error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def export(self, duration: float, path: str) -> None:
+        line = json.dumps(
+            {
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": None,
+                "name": self.name,
+                "service": "bot",
+                "pid": os.getpid(),
+                "start": self.start,
+                "duration_ms": round(duration * 1000, 3),
+                "error": self.error,
+                "attributes": self.attributes,
+            },
+            default=str,
+        )
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def request_trace(
+    name: str, path: Optional[str] = None, **attributes: Any
+) -> Iterator[RequestTrace]:
+    """Trace a block as the root span of a new trace, exported to ``path``."""
+    path = path if path is not None else TRACE_FILE
+    trace = RequestTrace(name, attributes)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if path:
+            trace.export(time.perf_counter() - started, path)
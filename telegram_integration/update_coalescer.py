@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Batch:
+    first_at: float
+    last_at: float
+    items: List[Any] = field(default_factory=list)
+    # Set to stop waiting and flush right away
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class UpdateCoalescer:
+    """Merges items that arrive in quick succession per key into one batch.
+
+    A batch is flushed once its key has been quiet for ``window`` seconds, or
+    ``max_delay`` seconds after its first item so a chatty key is still
+    answered. Batches of the same key are flushed one at a time and in order;
+    items arriving during a flush start the next batch.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Hashable, List[Any]], Awaitable[None]],
+        window: float = 2.0,
+        max_delay: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not 0 <= window <= max_delay:
+            raise ValueError("Need 0 <= window <= max_delay")
+        self.flush = flush
+        self.window = window
+        self.max_delay = max_delay
+        self.clock = clock
+        self.items = 0
+        self.batches = 0
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._flush_locks: Dict[Hashable, asyncio.Lock] = {}
+        # Batches holding or waiting for each flush lock
+        self._waiting: Counter = Counter()
+        self._running: set[asyncio.Task[None]] = set()
+
+    def add(self, key: Hashable, item: Any) -> None:
+        now = self.clock()
+        self.items += 1
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(first_at=now, last_at=now)
+            task = asyncio.get_running_loop().create_task(self._collect(key, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        batch.last_at = now
+        batch.items.append(item)
+
+    def pending(self, key: Optional[Hashable] = None) -> int:
+        """Items not flushed yet, of one key or of all of them."""
+        if key is not None:
+            batch = self._batches.get(key)
+            return len(batch.items) if batch else 0
+        return sum(len(batch.items) for batch in self._batches.values())
+
+    async def _collect(self, key: Hashable, batch: _Batch) -> None:
+        try:
+            while not batch.wake.is_set():
+                deadline = min(
+                    batch.last_at + self.window, batch.first_at + self.max_delay
+                )
+                delay = deadline - self.clock()
+                if delay <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(batch.wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Closed: whatever comes next starts a new batch
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+        await self._flush(key, batch)
+
+    async def _flush(self, key: Hashable, batch: _Batch) -> None:
+        lock = self._flush_locks.get(key)
+        if lock is None:
+            lock = self._flush_locks[key] = asyncio.Lock()
+        self._waiting[key] += 1
+        try:
+            async with lock:
+                self.batches += 1
+                await self.flush(key, batch.items)
+        except Exception:
+            logger.exception("Flushing %d items of %r failed", len(batch.items), key)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._flush_locks[key]
+
+    async def drain(self) -> None:
+        """Flush every open batch now and wait for all flushes to finish."""
+        for batch in self._batches.values():
+            batch.wake.set()
+        await asyncio.gather(*self._running, return_exceptions=True)
@@ -0,0 +1,386 @@
+"""
+In-process fake of the Gmail REST API used by the tests and load tests.
+
+It serves the subset of endpoints ``GmailClient`` uses, including the batch
+endpoint, and counts HTTP round-trips. An optional per-request latency simulates
+the network distance to Google.
+"""
+
+import base64
+import itertools
+import json
+import re
+import threading
+import time
+import urllib.parse
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+Response = Tuple[int, Dict[str, Any]]
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def build_service(url: str) -> Any:
+    """A googleapiclient Gmail service talking to the fake server at ``url``.
+
+    For processes other than the one running the server.
+    """
+    document = json.loads(get_static_doc("gmail", "v1"))
+    document["rootUrl"] = url
+    document["baseUrl"] = url
+    return build_from_document(document, http=httplib2.Http())
+
+
+class FakeGmailServer:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.sent: List[Dict[str, Any]] = []
+        # When each message in ``sent`` was sent, as time.time()
+        self.sent_at: List[float] = []
+        self.round_trips = 0
+        # Round-trips to the batch endpoint, and the API calls they carried
+        self.batch_requests = 0
+        self.batched_calls = 0
+        self.bytes_sent = 0
+        # (message id, format) of every messages.get call, including batched ones
+        self.message_fetches: List[Tuple[str, str]] = []
+        self.attachments: Dict[str, str] = {}
+        self.history_id = 1000
+        self.history: List[Dict[str, Any]] = []
+        # Oldest startHistoryId still served; older ones get a 404 like real Gmail
+        self.oldest_history_id = self.history_id
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._routes: List[Tuple[str, re.Pattern[str], Callable[..., Response]]] = [
+            ("GET", re.compile(r"^/gmail/v1/users/me/messages$"), self._list_messages),
+            (
+                "GET",
+                re.compile(r"^/gmail/v1/users/me/messages/([^/]+)$"),
+                self._get_message,
+            ),
+            (
+                "POST",
+                re.compile(r"^/gmail/v1/users/me/messages/batchModify$"),
+                self._batch_modify,
+            ),
+            ("POST", re.compile(r"^/gmail/v1/users/me/messages/send$"), self._send),
+            (
+                "GET",
+                re.compile(
+                    r"^/gmail/v1/users/me/messages/([^/]+)/attachments/([^/]+)$"
+                ),
+                self._get_attachment,
+            ),
+            ("GET", re.compile(r"^/gmail/v1/users/me/profile$"), self._profile),
+            ("GET", re.compile(r"^/gmail/v1/users/me/history$"), self._list_history),
+        ]
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeGmailServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeGmailServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def build_service(self) -> Any:
+        """Build a googleapiclient Gmail service that talks to this server."""
+        return build_service(self.url)
+
+    def add_message(
+        self,
+        sender: str,
+        subject: str,
+        body: str,
+        thread_id: Optional[str] = None,
+        date: str = "Mon, 23 Jun 2025 10:00:00 +0000",
+        labels: Tuple[str, ...] = ("INBOX", "UNREAD"),
+        attachments: Sequence[Tuple[str, str, bytes]] = (),
+    ) -> str:
+        """Store a message in the Gmail API representation; returns its id.
+
+        ``attachments`` are ``(filename, mime_type, content)`` tuples; like Gmail,
+        their content is only served through the attachments endpoint.
+        """
+        with self._lock:
+            message_id = f"{next(self._ids):016x}"
+            self.history_id += 1
+            history_id = self.history_id
+
+        parts = [
+            {
+                "partId": "0",
+                "mimeType": "text/plain",
+                "filename": "",
+                "headers": [],
+                "body": {"size": len(body), "data": _b64(body.encode())},
+            }
+        ]
+        for index, (filename, mime_type, content) in enumerate(attachments, start=1):
+            attachment_id = f"att-{message_id}-{index}"
+            self.attachments[attachment_id] = _b64(content)
+            parts.append(
+                {
+                    "partId": str(index),
+                    "mimeType": mime_type,
+                    "filename": filename,
+                    "headers": [],
+                    "body": {"size": len(content), "attachmentId": attachment_id},
+                }
+            )
+
+        self.messages[message_id] = {
+            "id": message_id,
+            "threadId": thread_id or message_id,
+            "labelIds": list(labels),
+            "historyId": str(history_id),
+            "snippet": body[:100],
+            "payload": {
+                "mimeType": (
+                    "multipart/mixed" if attachments else "multipart/alternative"
+                ),
+                "headers": [
+                    {"name": "From", "value": sender},
+                    {"name": "To", "value": "broker@example.com"},
+                    {"name": "Subject", "value": subject},
+                    {"name": "Date", "value": date},
+                    {"name": "Message-ID", "value": f"<{message_id}@example.com>"},
+                ],
+                "body": {"size": 0},
+                "parts": parts,
+            },
+        }
+        self.history.append(
+            {
+                "id": str(history_id),
+                "messagesAdded": [
+                    {
+                        "message": {
+                            "id": message_id,
+                            "threadId": thread_id or message_id,
+                            "labelIds": list(labels),
+                        }
+                    }
+                ],
+            }
+        )
+        return message_id
+
+    def expire_history(self) -> None:
+        """Drop all history so older checkpoints fail with 404."""
+        self.oldest_history_id = self.history_id
+        self.history.clear()
+
+    # HTTP plumbing
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _serve(self) -> None:
+                length = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with server._lock:
+                    server.round_trips += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if self.command == "POST" and self.path.startswith("/batch"):
+                    with server._lock:
+                        server.batch_requests += 1
+                    content_type, payload = server._batch(
+                        self.headers["content-type"], body
+                    )
+                    status = 200
+                else:
+                    status, response = server.dispatch(self.command, self.path, body)
+                    content_type = "application/json"
+                    payload = json.dumps(response).encode()
+
+                if status == 204:
+                    payload = b""
+                with server._lock:
+                    server.bytes_sent += len(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def dispatch(self, method: str, path: str, body: bytes) -> Response:
+        parsed = urllib.parse.urlparse(path)
+        query = urllib.parse.parse_qs(parsed.query)
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(parsed.path)
+            if method == route_method and match:
+                payload = json.loads(body) if body else {}
+                return handler(query, payload, *match.groups())
+        return 404, {"error": {"code": 404, "message": f"No route for {path}"}}
+
+    def _batch(self, content_type: str, body: bytes) -> Tuple[str, bytes]:
+        request = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = "batch_fake_gmail"
+        chunks = []
+        for part in request.iter_parts():
+            inner = part.get_payload(decode=False)
+            head, _, inner_body = inner.replace("\r\n", "\n").partition("\n\n")
+            method, path, _ = head.split("\n", 1)[0].split(" ", 2)
+            status, response = self.dispatch(method, path, inner_body.strip().encode())
+            with self._lock:
+                self.batched_calls += 1
+            content_id = part["Content-ID"].strip("<>")
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(response)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode()
+
+    @staticmethod
+    def _header(message: Dict[str, Any], name: str) -> str:
+        for header in message["payload"]["headers"]:
+            if header["name"] == name:
+                return header["value"]
+        return ""
+
+    # Gmail API endpoints
+
+    def _list_messages(self, query: Dict[str, List[str]], _: Any) -> Response:
+        labels = set(query.get("labelIds", []))
+        max_results = int(query.get("maxResults", ["100"])[0])
+        offset = int(query.get("pageToken", ["0"])[0])
+        # Only the "from:<address>" search operator is supported
+        sender = query.get("q", [""])[0].partition("from:")[2]
+        matches = [
+            {"id": message["id"], "threadId": message["threadId"]}
+            for message in reversed(list(self.messages.values()))
+            if labels.issubset(message["labelIds"])
+            and sender in self._header(message, "From")
+        ]
+        response: Dict[str, Any] = {"resultSizeEstimate": len(matches)}
+        if matches[offset : offset + max_results]:
+            response["messages"] = matches[offset : offset + max_results]
+        if offset + max_results < len(matches):
+            response["nextPageToken"] = str(offset + max_results)
+        return 200, response
+
+    def _get_message(
+        self, query: Dict[str, List[str]], _: Any, message_id: str
+    ) -> Response:
+        message = self.messages.get(message_id)
+        if message is None:
+            return 404, {
+                "error": {"code": 404, "message": "Requested entity was not found."}
+            }
+
+        message_format = query.get("format", ["full"])[0]
+        self.message_fetches.append((message_id, message_format))
+        if message_format == "minimal":
+            return 200, {k: v for k, v in message.items() if k != "payload"}
+        if message_format == "metadata":
+            wanted = {name.lower() for name in query.get("metadataHeaders", [])}
+            headers = [
+                header
+                for header in message["payload"]["headers"]
+                if not wanted or header["name"].lower() in wanted
+            ]
+            payload = {"mimeType": message["payload"]["mimeType"], "headers": headers}
+            return 200, {**message, "payload": payload}
+        return 200, message
+
+    def _get_attachment(
+        self, _: Any, __: Any, message_id: str, attachment_id: str
+    ) -> Response:
+        data = self.attachments[attachment_id]
+        return 200, {"attachmentId": attachment_id, "size": len(data), "data": data}
+
+    def _batch_modify(self, _: Any, payload: Dict[str, Any]) -> Response:
+        for message_id in payload.get("ids", []):
+            message = self.messages[message_id]
+            message["labelIds"] = [
+                label
+                for label in message["labelIds"]
+                if label not in payload.get("removeLabelIds", [])
+            ] + payload.get("addLabelIds", [])
+        return 204, {}
+
+    def _send(self, _: Any, payload: Dict[str, Any]) -> Response:
+        with self._lock:
+            self.sent.append(payload)
+            self.sent_at.append(time.time())
+        return 200, {
+            "id": f"sent-{len(self.sent)}",
+            "threadId": payload.get("threadId", ""),
+        }
+
+    def _profile(self, *_: Any) -> Response:
+        return 200, {
+            "emailAddress": "broker@example.com",
+            "messagesTotal": len(self.messages),
+            "historyId": str(self.history_id),
+        }
+
+    def _list_history(self, query: Dict[str, List[str]], _: Any) -> Response:
+        start = int(query["startHistoryId"][0])
+        if start < self.oldest_history_id:
+            return 404, {
+                "error": {"code": 404, "message": "Requested entity was not found."}
+            }
+
+        label = query.get("labelId", [None])[0]
+        records = [
+            record
+            for record in self.history
+            if int(record["id"]) > start
+            and all(
+                label is None or label in added["message"]["labelIds"]
+                for added in record["messagesAdded"]
+            )
+        ]
+        offset = int(query.get("pageToken", ["0"])[0])
+        page_size = int(query.get("maxResults", ["100"])[0])
+        response: Dict[str, Any] = {"historyId": str(self.history_id)}
+        if records[offset : offset + page_size]:
+            response["history"] = records[offset : offset + page_size]
+        if offset + page_size < len(records):
+            response["nextPageToken"] = str(offset + page_size)
+        return 200, response
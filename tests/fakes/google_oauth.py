@@ -0,0 +1,96 @@
+"""
+In-process fake of Google's OAuth 2.0 token endpoint.
+
+Answers refresh-token grants with a new access token and counts them; an optional
+latency simulates the round trip to oauth2.googleapis.com. Credentials loaded from
+a token file always use Google's token endpoint, so ``patch_token_endpoint``
+redirects them here.
+"""
+
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from unittest import mock
+
+from google.oauth2.credentials import Credentials
+
+SCOPES = ["https://mail.google.com/"]
+
+
+class FakeTokenServer:
+    def __init__(self, latency: float = 0.0, expires_in: int = 3600):
+        self.latency = latency
+        self.expires_in = expires_in
+        self.refreshes = 0
+        self._tokens = itertools.count(1)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def token_uri(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/token"
+
+    def patch_token_endpoint(self) -> Any:
+        return mock.patch(
+            "google.oauth2.credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT", self.token_uri
+        )
+
+    def write_token_file(self, path: str, expires_in: float) -> Credentials:
+        """Write a token file whose access token expires in ``expires_in`` seconds."""
+        expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(
+            seconds=expires_in
+        )
+        creds = Credentials(
+            token="initial-token",
+            refresh_token="refresh-token",
+            token_uri=self.token_uri,
+            client_id="client-id",
+            client_secret="client-secret",
+            scopes=SCOPES,
+            expiry=expiry,
+        )
+        with open(path, "w") as f:
+            f.write(creds.to_json())
+        return creds
+
+    def __enter__(self) -> "FakeTokenServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("content-length") or 0))
+                if server.latency:
+                    time.sleep(server.latency)
+                server.refreshes += 1
+                payload = json.dumps(
+                    {
+                        "access_token": f"access-token-{next(server._tokens)}",
+                        "expires_in": server.expires_in,
+                        "token_type": "Bearer",
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,181 @@
+"""
+In-process fake of the Anthropic Messages API used by the tests and load tests.
+
+It stands in for the LLM behind ``MCP_ChatBot``: point the Anthropic client at
+it with ``ANTHROPIC_BASE_URL``. The first turn of a conversation is answered
+with a call to the tool the prompt asks for, picked with a few regular
+expressions instead of a model: an ETA update for a delay report, a shipment
+by id or BOL id, or else all of the shipper's shipments. A turn that hands
+back a tool result is answered with text, which ends the conversation. An
+optional per-call latency simulates the time the model takes.
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_EMAIL_RE = re.compile(r"^Email: (\S+)$", re.MULTILINE)
+_DELAY_RE = re.compile(r"(\d+)\s*(hour|hr|minute|min)", re.IGNORECASE)
+_BOL_RE = re.compile(r"\bbol\D{0,10}(\d+)", re.IGNORECASE)
+_SHIPMENT_RE = re.compile(r"(?:shipment|order|#)\D{0,15}(\d+)", re.IGNORECASE)
+
+
+def choose_tool(prompt: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """The tool call a model would make for ``prompt``, None if it would ask back."""
+    email = _EMAIL_RE.search(prompt)
+    # The API puts the shipper's question after "Query:"; courier updates come as is
+    query = prompt.rpartition("Query:")[2]
+    shipment = _SHIPMENT_RE.search(query)
+    delay = _DELAY_RE.search(query)
+    bol = _BOL_RE.search(query)
+    if delay and shipment:
+        unit = 3600 if delay.group(2).lower().startswith("h") else 60
+        return "update_shipment_eta", {
+            "shipment_id": int(shipment.group(1)),
+            "seconds": int(delay.group(1)) * unit,
+        }
+    if email and bol:
+        return "get_shipment_by_bol_id", {
+            "email": email.group(1),
+            "bol_id": int(bol.group(1)),
+        }
+    if email and shipment:
+        return "get_shipment_by_id", {
+            "email": email.group(1),
+            "shipment_id": int(shipment.group(1)),
+        }
+    if email:
+        return "get_all_shipments", {"shipper_email": email.group(1)}
+    return None
+
+
+class FakeAnthropicServer:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        # Tool calls the fake model made, by tool name
+        self.tool_calls: Counter = Counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeAnthropicServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeAnthropicServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def create_message(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a ``messages.create`` request."""
+        messages: List[Dict[str, Any]] = request["messages"]
+        last = messages[-1]["content"]
+        tools = {tool["name"] for tool in request.get("tools", [])}
+        with self._lock:
+            self.calls += 1
+            message_id = next(self._ids)
+
+        call = choose_tool(last) if isinstance(last, str) else None
+        if call is not None and call[0] in tools:
+            name, arguments = call
+            with self._lock:
+                self.tool_calls[name] += 1
+            content = [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{message_id:08d}",
+                    "name": name,
+                    "input": arguments,
+                }
+            ]
+            stop_reason = "tool_use"
+        else:
+            text = (
+                "Here is what I found."
+                if not isinstance(last, str)
+                else "Which shipment is this about?"
+            )
+            content = [{"type": "text", "text": text}]
+            stop_reason = "end_turn"
+
+        return {
+            "id": f"msg_{message_id:08d}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "fake"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": len(json.dumps(messages)) // 4,
+                "output_tokens": len(json.dumps(content)) // 4,
+            },
+        }
+
+    # HTTP plumbing
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("content-length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                if self.path.split("?", 1)[0] == "/v1/messages":
+                    if server.latency:
+                        time.sleep(server.latency)
+                    status, payload = 200, server.create_message(body)
+                else:
+                    status = 404
+                    payload = {
+                        "type": "error",
+                        "error": {"type": "not_found_error", "message": self.path},
+                    }
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+class SlowToPickTool(FakeAnthropicServer):
+    """Takes ``delay`` seconds to pick the tool for prompts containing ``marker``."""
+
+    def __init__(self, marker: str, delay: float = 1.0, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.marker = marker
+        self.delay = delay
+
+    def create_message(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        last = request["messages"][-1]["content"]
+        if isinstance(last, str) and self.marker in last:
+            time.sleep(self.delay)
+        return super().create_message(request)
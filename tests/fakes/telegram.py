@@ -0,0 +1,224 @@
+"""
+In-process fake of the Telegram Bot API used by the tests and load tests.
+
+It serves the methods the bot calls (getMe, getUpdates, setWebhook,
+deleteWebhook, sendMessage) and records every message the bot sends. Couriers'
+messages are queued with ``send_text`` and ``send_contact``; they are handed out through long-polled
+getUpdates or, once a webhook is set, POSTed to it over up to
+``max_connections`` parallel connections like Telegram does.
+"""
+
+import http.client
+import itertools
+import json
+import queue
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BOT_ID = 4242
+
+Response = Tuple[int, Dict[str, Any]]
+
+
+class FakeTelegramServer:
+    def __init__(self) -> None:
+        # (chat id, text) of every message the bot sent, in order
+        self.sent: List[Tuple[int, str]] = []
+        # When each message in ``sent`` was sent, as time.time()
+        self.sent_at: List[float] = []
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self._updates: List[Dict[str, Any]] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._changed = threading.Condition()
+        self._deliveries: queue.Queue[Optional[Dict[str, Any]]] = queue.Queue()
+        self._senders: List[threading.Thread] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeTelegramServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        for _ in self._senders:
+            self._deliveries.put(None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeTelegramServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def send_text(self, user_id: int, text: str) -> None:
+        """A private message from ``user_id`` to the bot."""
+        self._receive(user_id, {"text": text})
+
+    def send_contact(self, user_id: int, phone_number: str) -> None:
+        """``user_id`` shares their phone number with the bot."""
+        contact = {
+            "phone_number": phone_number,
+            "first_name": "Courier",
+            "user_id": user_id,
+        }
+        self._receive(user_id, {"contact": contact})
+
+    def _receive(self, user_id: int, content: Dict[str, Any]) -> None:
+        update = {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Courier"},
+                **content,
+            },
+        }
+        with self._changed:
+            if self.webhook_url:
+                self._deliveries.put(update)
+            else:
+                self._updates.append(update)
+                self._changed.notify_all()
+
+    def wait_for_replies(self, count: int, timeout: float = 30.0) -> None:
+        with self._changed:
+            if not self._changed.wait_for(lambda: len(self.sent) >= count, timeout):
+                raise TimeoutError(f"{len(self.sent)} of {count} replies sent")
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float = 30.0) -> None:
+        """Wait until ``predicate`` holds, checked whenever the bot sends a message."""
+        with self._changed:
+            if not self._changed.wait_for(predicate, timeout):
+                raise TimeoutError(f"Still waiting after {len(self.sent)} replies")
+
+    def replies_to(self, chat_id: int) -> List[str]:
+        return [text for chat, text in self.sent if chat == chat_id]
+
+    # Bot API methods
+
+    def _get_me(self, params: Dict[str, Any]) -> Response:
+        return 200, {
+            "id": BOT_ID,
+            "is_bot": True,
+            "first_name": "Fake",
+            "username": "fake_bot",
+        }
+
+    def _get_updates(self, params: Dict[str, Any]) -> Response:
+        offset = int(params.get("offset", 0))
+        deadline = time.monotonic() + float(params.get("timeout", 0))
+        with self._changed:
+            # Updates below the offset are confirmed and dropped, as by Telegram
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._changed.wait(deadline - time.monotonic())
+            return 200, list(self._updates[: int(params.get("limit", 100))])
+
+    def _set_webhook(self, params: Dict[str, Any]) -> Response:
+        with self._changed:
+            self.webhook_url = params["url"]
+            self.webhook_secret = params.get("secret_token")
+            pending, self._updates = self._updates, []
+        max_connections = int(params.get("max_connections", 40))
+        while len(self._senders) < max_connections:
+            sender = threading.Thread(target=self._deliver, daemon=True)
+            sender.start()
+            self._senders.append(sender)
+        for update in pending:
+            self._deliveries.put(update)
+        return 200, True
+
+    def _delete_webhook(self, params: Dict[str, Any]) -> Response:
+        self.webhook_url = None
+        return 200, True
+
+    def _send_message(self, params: Dict[str, Any]) -> Response:
+        chat_id = int(params["chat_id"])
+        with self._changed:
+            self.sent.append((chat_id, params["text"]))
+            self.sent_at.append(time.time())
+            self._changed.notify_all()
+        return 200, {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Fake"},
+            "text": params["text"],
+        }
+
+    def _deliver(self) -> None:
+        """One of Telegram's webhook connections: POST updates one at a time."""
+        connection = None
+        while True:
+            update = self._deliveries.get()
+            if update is None:
+                return
+            url = urllib.parse.urlsplit(self.webhook_url)
+            if connection is None:
+                connection = http.client.HTTPConnection(url.hostname, url.port)
+            headers = {"Content-Type": "application/json"}
+            if self.webhook_secret:
+                headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+            connection.request("POST", url.path, json.dumps(update), headers)
+            connection.getresponse().read()
+
+    # HTTP plumbing
+
+    def _handler_class(self) -> type:
+        methods = {
+            "getMe": self._get_me,
+            "getUpdates": self._get_updates,
+            "setWebhook": self._set_webhook,
+            "deleteWebhook": self._delete_webhook,
+            "sendMessage": self._send_message,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                # /bot<token>/<method>; parameters are form-encoded, non-string
+                # values as JSON
+                method = self.path.rsplit("/", 1)[-1]
+                params = dict(urllib.parse.parse_qsl(body))
+                if method in methods:
+                    status, result = methods[method](params)
+                    payload = {"ok": True, "result": result}
+                else:
+                    status = 404
+                    payload = {
+                        "ok": False,
+                        "error_code": 404,
+                        "description": "Not Found",
+                    }
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # A long poll the bot gave up on while shutting down
+                    pass
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import shutil
+import time
+
+import httpx
+import pytest
+
+from mcp_stuff import mcp_llm_engine
+from mcp_stuff.admission import AdmissionLimiter, Overloaded
+from mcp_stuff.conversation_context import ConversationContextStore
+from mcp_stuff.jobs import JobQueue
+from mcp_stuff.mcp_llm_engine import MCP_ChatBot
+from mcp_stuff.single_flight import SingleFlight
+from tests.fakes.llm import SlowToPickTool
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import run_mcp  # noqa: E402
+
+TEST_DB = os.path.join(os.path.dirname(__file__), "..", "database", "test_shipments.db")
+SHIPPER = "shipper.3plcopilot@gmail.com"
+
+
+def test_requests_beyond_the_queue_are_refused():
+    limiter = AdmissionLimiter("test", concurrency=2, queue_size=1, max_wait=5)
+    order = []
+
+    async def work(n, release):
+        async with limiter.admit():
+            order.append(n)
+            await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(work(n, release)) for n in range(3)]
+        await asyncio.sleep(0.01)
+        assert limiter.report()["running"] == 2 and limiter.report()["waiting"] == 1
+        with pytest.raises(Overloaded) as refused:
+            await work(3, release)
+        release.set()
+        await asyncio.gather(*tasks)
+        return refused.value
+
+    refused = asyncio.run(scenario())
+    assert order == [0, 1, 2]
+    assert refused.retry_after >= 1
+    report = limiter.report()
+    assert (report["admitted"], report["rejected"], report["running"]) == (3, 1, 0)
+
+
+def test_waiting_too_long_is_refused_and_frees_the_queue():
+    limiter = AdmissionLimiter("test", concurrency=1, queue_size=1, max_wait=0.05)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            async with limiter.admit():
+                pass
+        # A caller that goes away while waiting gives up its place too
+        leaving = asyncio.ensure_future(limiter.admit().__aenter__())
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        await asyncio.gather(leaving, return_exceptions=True)
+        assert limiter.report()["waiting"] == 0
+        release.set()
+        await holder
+        async with limiter.admit():
+            return limiter.report()["running"]
+
+    assert asyncio.run(scenario()) == 1
+    assert limiter.report()["running"] == 0
+
+
+def test_query_is_shed_while_reads_are_served(monkeypatch):
+    async def answer_query(email, query, context):
+        await asyncio.sleep(0.3)
+        return {"response": f"answer to {query}"}
+
+    limiter = AdmissionLimiter("/query", concurrency=1, queue_size=1, max_wait=5)
+    monkeypatch.setattr(run_mcp, "answer_query", answer_query)
+    monkeypatch.setattr(run_mcp, "get_query_flights", lambda: SingleFlight())
+    monkeypatch.setattr(run_mcp, "get_query_limiter", lambda: limiter)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=run_mcp.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://api"
+        ) as client:
+
+            async def ask(n):
+                return await client.post(
+                    "/query", params={"email": "s@example.com", "query": f"q{n}"}
+                )
+
+            queries = [asyncio.ensure_future(ask(n)) for n in range(3)]
+            await asyncio.sleep(0.05)
+            start = time.monotonic()
+            stats = await client.get("/query_stats")
+            read_time = time.monotonic() - start
+            return await asyncio.gather(*queries), stats.json(), read_time
+
+    answers, stats, read_time = asyncio.run(scenario())
+    assert sorted(answer.status_code for answer in answers) == [200, 200, 429]
+    refused = next(answer for answer in answers if answer.status_code == 429)
+    assert int(refused.headers["Retry-After"]) >= 1
+    # The read did not wait behind the running and queued answers
+    assert read_time < 0.2
+    assert stats["response"]["running"] == 1 and stats["response"]["waiting"] == 1
+
+
+def test_overlapping_answers_both_succeed(tmp_path, monkeypatch):
+    db = tmp_path / "tms.db"
+    shutil.copy(TEST_DB, db)
+    monkeypatch.setenv("DB_PATH", f"sqlite:///{db}")
+    monkeypatch.setattr(mcp_llm_engine, "METRICS_DIR", str(tmp_path / "metrics"))
+    limiter = AdmissionLimiter("/query", concurrency=4, queue_size=4, max_wait=30)
+    monkeypatch.setattr(run_mcp, "get_query_flights", lambda: SingleFlight())
+    monkeypatch.setattr(run_mcp, "get_query_limiter", lambda: limiter)
+    monkeypatch.setattr(
+        run_mcp, "get_conversation_store", lambda: ConversationContextStore()
+    )
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=run_mcp.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://api", timeout=60
+        ) as client:
+
+            async def ask(query, after=0.0):
+                await asyncio.sleep(after)
+                return await client.post(
+                    "/query", params={"email": SHIPPER, "query": query}
+                )
+
+            # The second answer is done while the first still waits for its tool
+            return await asyncio.gather(
+                ask("Where is my shipment 7?"),
+                ask("Where is my shipment 5?", after=0.3),
+            )
+
+    with SlowToPickTool("shipment 7") as llm:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", llm.url)
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "fake")
+        # One chatbot for both answers, as get_chatbot hands out
+        chatbot = MCP_ChatBot()
+        monkeypatch.setattr(run_mcp, "get_chatbot", lambda: chatbot)
+        answers = asyncio.run(scenario())
+
+    assert [answer.status_code for answer in answers] == [200, 200]
+    assert "Shipment ID: 7" in answers[0].json()["response"]
+    assert "Shipment ID: 5" in answers[1].json()["response"]
+    assert llm.tool_calls == {"get_shipment_by_id": 2}
+
+
+def test_full_job_queue_answers_429(tmp_path, monkeypatch):
+    async def update(payload):
+        return None
+
+    jobs = JobQueue(
+        {"courier_shipment_update": update},
+        path=str(tmp_path / "jobs.db"),
+        max_queued=2,
+    )
+    monkeypatch.setattr(run_mcp, "get_job_queue", lambda: jobs)
+    monkeypatch.setattr(run_mcp, "get_idempotency_store", lambda: None)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=run_mcp.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://api"
+        ) as client:
+            return [
+                await client.post(
+                    "/courier_shipment_updates",
+                    params={"phone_number": "+1 555 0100", "shipment_query": "7"},
+                )
+                for _ in range(3)
+            ]
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [202, 202, 429]
+    assert responses[2].headers["Retry-After"] == "1"
+    assert jobs.report()["rejected"] == 1 and jobs.depth() == 2
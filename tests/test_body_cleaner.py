@@ -0,0 +1,108 @@
+from gmail_integration.body_cleaner import BodyCleaner, clean_body
+
+GMAIL_REPLY = """\
+And what about the delivery date?
+
+Thanks,
+Jane Doe
+Acme Logistics | +1 555 0100
+
+On Mon, Jun 2, 2025 at 10:15 AM Broker <broker@example.com>
+wrote:
+
+> Shipment ID: 42
+> Shipment Status: in_transit
+>
+> On Sun, Jun 1, 2025 at 9:00 AM Jane Doe <jane@acme.example> wrote:
+> > Where is shipment 42?
+"""
+
+OUTLOOK_REPLY = """\
+Please update the ETA for BOL 123456.
+
+________________________________
+From: Broker <broker@example.com>
+Sent: Monday, June 2, 2025 10:15 AM
+To: Jane Doe <jane@acme.example>
+Subject: Re: Shipment 42
+
+Shipment ID: 42
+"""
+
+DISCLAIMER = """\
+Where is shipment 7?
+
+CONFIDENTIALITY NOTICE: This email and any attachments are intended only for the
+named recipient and may contain privileged information.
+"""
+
+
+def test_gmail_quotes_and_signature_are_stripped():
+    cleaned = clean_body(GMAIL_REPLY)
+    assert cleaned.text == "And what about the delivery date?"
+    assert cleaned.tokens < cleaned.original_tokens
+    assert cleaned.tokens_saved == cleaned.original_tokens - cleaned.tokens
+
+
+def test_outlook_history_is_stripped():
+    assert clean_body(OUTLOOK_REPLY).text == "Please update the ETA for BOL 123456."
+
+
+def test_outlook_header_without_separator_is_stripped():
+    body = OUTLOOK_REPLY.replace("________________________________\n", "")
+    assert clean_body(body).text == "Please update the ETA for BOL 123456."
+
+
+def test_route_block_is_kept():
+    body = (
+        "Hi, can you quote this load?\n\n"
+        "From: Gdansk, PL\nTo: Berlin, DE\nDate: June 12\nWeight: 18 t\n\n"
+        "Thanks,\nJane Doe"
+    )
+    assert clean_body(body).text == body[: body.index("\n\nThanks")]
+
+
+def test_disclaimer_is_stripped():
+    assert clean_body(DISCLAIMER).text == "Where is shipment 7?"
+
+
+def test_plain_message_is_kept():
+    body = "Hi,\n\nwhere is shipment 42?\nIt was due yesterday.\n"
+    assert clean_body(body).text == body.strip()
+
+
+def test_sign_off_inside_a_long_message_is_kept():
+    body = "Thanks!\n" + "\n".join(f"Shipment {i} is late." for i in range(10))
+    assert clean_body(body).text == body
+
+
+def test_thanks_before_the_question_is_kept():
+    body = "Hi team,\nThanks!\nCan you tell me where BOL 123456 is?"
+    assert clean_body(body).text == body
+
+
+def test_only_a_closing_sign_off_starts_the_signature():
+    body = (
+        "Hello,\n\nThank you.\nAlso, shipment 7 still shows pending in the portal."
+        "\n\nJane"
+    )
+    assert clean_body(body).text == body
+
+    body = (
+        "Thanks!\nWhere is shipment 7?\n\nBest regards,\nJane Doe\nHead of Operations"
+    )
+    assert clean_body(body).text == "Thanks!\nWhere is shipment 7?"
+
+
+def test_body_that_is_only_quoted_is_kept():
+    body = "> Where is shipment 42?\n"
+    assert clean_body(body).text == body.strip()
+
+
+def test_cleaner_totals_tokens_saved():
+    cleaner = BodyCleaner()
+    cleaner.clean(GMAIL_REPLY)
+    cleaner.clean(OUTLOOK_REPLY)
+    report = cleaner.report()
+    assert report["emails"] == 2
+    assert 0 < report["tokens_saved"] < report["original_tokens"]
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "telegram_integration")
+)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import bot  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bot, "API_RETRY_BACKOFF", 0)
+
+
+def _serve(statuses, scenario):
+    """Run ``scenario(session, calls, ports)`` against an API answering with ``statuses``."""
+    calls = []
+    # Client port of each request, i.e. which connection it came in on
+    ports = []
+
+    async def handler(request):
+        calls.append((request.method, dict(request.query)))
+        ports.append(request.transport.get_extra_info("peername")[1])
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        headers = {"Retry-After": "0"} if status == 429 else None
+        return web.json_response({"response": ["ok"]}, status=status, headers=headers)
+
+    async def run():
+        app = web.Application()
+        app.router.add_route("*", "/{path}", handler)
+        async with TestServer(app) as server:
+            session = bot.create_http_session(str(server.make_url("")))
+            try:
+                return await scenario(session, calls, ports)
+            finally:
+                await session.close()
+
+    return asyncio.run(run())
+
+
+def test_connections_are_reused():
+    async def scenario(session, calls, ports):
+        for _ in range(5):
+            page = await bot.fetch_shipments(session, "+1 555 0100")
+            assert page["response"] == ["ok"]
+        return calls, ports
+
+    calls, ports = _serve([200], scenario)
+    params = {"page_size": "5", "contact_number": "+1 555 0100"}
+    assert calls == [("GET", params)] * 5
+    # All five requests went over one kept-alive connection
+    assert len(set(ports)) == 1
+
+
+def test_reads_are_retried():
+    async def scenario(session, calls, ports):
+        return await bot.call_api(session, "GET", "/get_courier_shipments", {}), calls
+
+    (status, data), calls = _serve([503, 502, 200], scenario)
+    assert (status, data) == (200, {"response": ["ok"]})
+    assert len(calls) == 3
+
+
+def test_updates_are_not_retried():
+    async def scenario(session, calls, ports):
+        return (
+            await bot.call_api(session, "POST", "/courier_shipment_updates", {}),
+            calls,
+        )
+
+    (status, data), calls = _serve([503, 200], scenario)
+    assert (status, data) == (503, None)
+    assert len(calls) == 1
+
+
+def test_shed_updates_are_retried_after_retry_after():
+    async def scenario(session, calls, ports):
+        return (
+            await bot.call_api(
+                session,
+                "POST",
+                "/courier_shipment_updates",
+                {},
+                headers={"Idempotency-Key": "tg-1-1-1"},
+            ),
+            calls,
+        )
+
+    (status, data), calls = _serve([429, 202], scenario)
+    assert (status, data) == (202, {"response": ["ok"]})
+    assert len(calls) == 2
+
+
+def test_session_lives_with_the_application(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, "COURIER_STORE_PATH", str(tmp_path / "couriers.db"))
+    application = SimpleNamespace(bot_data={})
+
+    async def lifecycle():
+        await bot.post_init(application)
+        session = application.bot_data["http_session"]
+        assert not session.closed
+        await bot.post_shutdown(application)
+        return session
+
+    assert asyncio.run(lifecycle()).closed
+    assert "http_session" not in application.bot_data
+    assert "couriers" not in application.bot_data
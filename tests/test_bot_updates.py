@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from telegram import Update
+
+from tests.fakes.telegram import FakeTelegramServer
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "telegram_integration")
+)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import bot  # noqa: E402
+import request_trace  # noqa: E402
+
+
+def _update(update_id, user_id):
+    return Update.de_json(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Courier"},
+                "text": f"message {update_id}",
+            },
+        },
+        None,
+    )
+
+
+def test_users_are_concurrent_and_each_user_is_ordered():
+    processor = bot.PerUserUpdateProcessor(concurrency=4)
+    handled = []
+
+    async def handle(update, delay):
+        await asyncio.sleep(delay)
+        handled.append((update.effective_user.id, update.update_id))
+
+    async def scenario():
+        # User 1's first message is slow; user 2's messages need not wait for it
+        updates = [(_update(1, 1), 0.1), (_update(2, 1), 0), (_update(3, 2), 0)]
+        updates += [(_update(4, 2), 0), (_update(5, 1), 0)]
+        await asyncio.gather(
+            *(
+                processor.process_update(update, handle(update, delay))
+                for update, delay in updates
+            )
+        )
+
+    asyncio.run(scenario())
+    assert handled == [(2, 3), (2, 4), (1, 1), (1, 2), (1, 5)]
+    # Nobody is waiting any more, so no per-user state is left behind
+    assert processor._locks == {} and not processor._waiting
+
+
+def test_concurrency_is_bounded():
+    processor = bot.PerUserUpdateProcessor(concurrency=3)
+    running = 0
+    peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def scenario():
+        await asyncio.gather(
+            *(processor.process_update(_update(i, i), handle()) for i in range(20))
+        )
+
+    asyncio.run(scenario())
+    assert peak == 3
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _answered(telegram, chat_id):
+    """How many of a courier's messages were answered, checking their order."""
+    queries = [
+        query
+        for reply in telegram.replies_to(chat_id)
+        for query in reply.removeprefix("done ").split("\n")
+    ]
+    assert queries == [f"{chat_id}:{i}" for i in range(len(queries))]
+    return len(queries)
+
+
+def test_webhook_answers_each_courier_in_order(monkeypatch, tmp_path):
+    """Couriers' messages arrive through the webhook and reach the API."""
+    traceparents = []
+
+    async def shipment_update(request):
+        traceparents.append(request.headers["traceparent"])
+        query = request.query["shipment_query"]
+        # The first courier's first update takes a while
+        if query.startswith("1:0"):
+            await asyncio.sleep(0.2)
+        job = {
+            "job_id": query,
+            "status": "done",
+            "result": {"response": f"done {query}"},
+        }
+        return web.json_response({"response": job}, status=202)
+
+    async def scenario():
+        api = web.Application()
+        api.router.add_post("/courier_shipment_updates", shipment_update)
+        async with TestServer(api) as api_server:
+            monkeypatch.setattr(bot, "api_base_url", str(api_server.make_url("")))
+            monkeypatch.setattr(bot, "COURIER_STORE_PATH", str(tmp_path / "c.db"))
+            monkeypatch.setattr(bot, "UPDATE_COALESCE_WINDOW", 0.05)
+            monkeypatch.setattr(request_trace, "TRACE_FILE", str(tmp_path / "t.jsonl"))
+            with FakeTelegramServer() as telegram:
+                application = bot.build_application(
+                    "123456:placeholder", bot_api_url=telegram.url
+                )
+                port = _free_port()
+                webhook = asyncio.create_task(
+                    bot.serve_webhook(
+                        application,
+                        f"http://127.0.0.1:{port}/telegram",
+                        listen="127.0.0.1",
+                        port=port,
+                        secret_token="s3cret",
+                    )
+                )
+                while telegram.webhook_url is None:
+                    await asyncio.sleep(0.01)
+                for user_id in (1, 2):
+                    application.bot_data["couriers"].set(
+                        user_id, f"+1 555 010{user_id}"
+                    )
+                for i in range(3):
+                    for user_id in (1, 2):
+                        telegram.send_text(user_id, f"{user_id}:{i}")
+                await asyncio.to_thread(
+                    telegram.wait_until,
+                    lambda: _answered(telegram, 1) == _answered(telegram, 2) == 3,
+                    10,
+                )
+                webhook.cancel()
+                await asyncio.gather(webhook, return_exceptions=True)
+                return telegram
+
+    telegram = asyncio.run(scenario())
+    assert telegram.webhook_secret == "s3cret"
+    # Courier 2 was not held up behind courier 1's slow update
+    assert telegram.sent[0][0] == 2
+    # Each update started a trace, which the API was asked to continue
+    with open(tmp_path / "t.jsonl") as f:
+        roots = [json.loads(line) for line in f]
+    assert sorted(traceparents) == sorted(
+        f"00-{span['trace_id']}-{span['span_id']}-01" for span in roots
+    )
+    assert {span["attributes"]["job_status"] for span in roots} == {"done"}
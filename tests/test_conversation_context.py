@@ -0,0 +1,70 @@
+from mcp_stuff.conversation_context import ConversationContextStore
+
+SHIPPER = "shipper@example.com"
+SHIPMENT = {"shipment_id": 42, "shipment_status": "in_transit", "eta": "2025-06-01"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_follow_up_reuses_resolved_shipments():
+    store = ConversationContextStore()
+    assert store.get("thread-1", SHIPPER) is None
+
+    store.record("thread-1", SHIPPER, "Where is shipment 42?", [SHIPMENT])
+    context = store.get("thread-1", SHIPPER)
+
+    assert context.shipment_ids == [42]
+    assert not context.references_new_shipment("And the delivery date?")
+    assert not context.references_new_shipment("Any news on 42?")
+    assert context.references_new_shipment("What about shipment 43?")
+    prompt = context.to_prompt()
+    assert "Shipments already identified in this thread: 42" in prompt
+    assert "status in_transit, ETA 2025-06-01" in prompt
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_context_belongs_to_the_sender():
+    store = ConversationContextStore()
+    store.record("thread-1", SHIPPER, "Where is shipment 42?", [SHIPMENT])
+    assert store.get("thread-1", "someone-else@example.com") is None
+
+
+def test_history_is_compacted():
+    store = ConversationContextStore()
+    for i in range(10):
+        store.record("thread-1", SHIPPER, f"Question {i}\n\n" + "x" * 500, [SHIPMENT])
+    context = store.get("thread-1", SHIPPER)
+
+    assert len(context.history) == 5
+    assert context.history[0].startswith('Asked "Question 5 xxx')
+    assert all(len(entry) < 200 for entry in context.history)
+
+
+def test_quiet_threads_expire():
+    clock = FakeClock()
+    store = ConversationContextStore(ttl_seconds=60, clock=clock)
+    store.record("thread-1", SHIPPER, "Where is shipment 42?", [SHIPMENT])
+    clock.now = 30
+    store.record("thread-2", SHIPPER, "Where is shipment 42?", [SHIPMENT])
+
+    clock.now = 70
+    assert store.get("thread-1", SHIPPER) is None
+    assert store.get("thread-2", SHIPPER) is not None
+    clock.now = 100
+    assert store.evict_expired() == 1
+    assert len(store) == 0
+
+
+def test_thread_count_is_bounded():
+    store = ConversationContextStore(max_threads=3)
+    for i in range(5):
+        store.record(f"thread-{i}", SHIPPER, "Where is shipment 42?", [SHIPMENT])
+    assert len(store) == 3
+    assert store.get("thread-0", SHIPPER) is None
+    assert store.get("thread-4", SHIPPER) is not None
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import sys
+
+from sqlalchemy import create_engine, text
+
+from database.data_schema import Base, ensure_indexes
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "telegram_integration")
+)
+from courier_store import CourierIdentity, CourierStore  # noqa: E402
+
+
+def test_couriers_survive_a_restart(tmp_path):
+    path = str(tmp_path / "couriers.db")
+    store = CourierStore(path)
+    store.set(111, "+1 555 0100")
+    store.set(222, "+1 555 0200")
+    store.close()
+
+    store = CourierStore(path)
+    assert store.get(111) == CourierIdentity("+1 555 0100")
+    assert store.get(222) == CourierIdentity("+1 555 0200")
+    assert 333 not in store
+    assert len(store) == 2
+
+
+def test_lookups_are_cached(tmp_path):
+    path = str(tmp_path / "couriers.db")
+    store = CourierStore(path)
+    store.set(111, "+1 555 0100")
+
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM couriers")
+    assert store.get(111) == CourierIdentity("+1 555 0100")
+    assert len(store) == 0
+
+
+def test_missing_indexes_are_added(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tms.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE couriers (courier_id INTEGER PRIMARY KEY, name TEXT,"
+                " contact_number TEXT, status TEXT, email TEXT)"
+            )
+        )
+
+    ensure_indexes(engine)
+    ensure_indexes(engine)
+
+    with engine.connect() as conn:
+        plan = conn.execute(
+            text("EXPLAIN QUERY PLAN SELECT * FROM couriers WHERE contact_number = 'x'")
+        ).fetchall()
+    assert "USING INDEX ix_couriers_contact_number" in plan[0][-1]
+    # Tables that do not exist yet are left to create_all
+    Base.metadata.create_all(engine)
+
+
+def test_stores_with_a_courier_id_column_still_open(tmp_path):
+    path = str(tmp_path / "couriers.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE couriers (user_id INTEGER PRIMARY KEY, contact_number TEXT"
+            " NOT NULL, courier_id INTEGER, updated_at REAL NOT NULL)"
+        )
+        conn.execute("INSERT INTO couriers VALUES (111, '+1 555 0100', 7, 0)")
+
+    store = CourierStore(path)
+    store.set(222, "+1 555 0200")
+    assert store.get(111) == CourierIdentity("+1 555 0100")
+    assert store.get(222) == CourierIdentity("+1 555 0200")
@@ -0,0 +1,35 @@
+import time
+
+from gmail_integration.dedup_store import DedupStore
+
+
+def test_ids_survive_reopen(tmp_path):
+    path = str(tmp_path / "processed.db")
+    store = DedupStore(path)
+    store.add("m1")
+    store.add_many(["m2", "m3", "m2"])
+    store.close()
+
+    store = DedupStore(path)
+    assert "m1" in store and "m3" in store
+    assert "m4" not in store
+    assert len(store) == 3
+
+
+def test_cache_is_bounded(tmp_path):
+    store = DedupStore(str(tmp_path / "processed.db"), cache_size=10)
+    store.add_many(f"m{i}" for i in range(100))
+    assert store.cached_ids() == 10
+    # Evicted ids are still found on disk
+    assert "m0" in store
+    assert store.cached_ids() == 10
+
+
+def test_prune_forgets_old_ids(tmp_path, monkeypatch):
+    store = DedupStore(str(tmp_path / "processed.db"))
+    store.add("old")
+    monkeypatch.setattr(time, "time", lambda: 10_000_000_000.0)
+    store.add("new")
+    assert store.prune(older_than_seconds=3600) == 1
+    assert "old" not in store
+    assert "new" in store
@@ -0,0 +1,72 @@
+import os
+import time
+
+import pytest
+
+from gmail_integration.gmail_auth import GmailAuth
+from tests.fakes.google_oauth import SCOPES, FakeTokenServer
+
+
+@pytest.fixture
+def token_server():
+    with FakeTokenServer() as server, server.patch_token_endpoint():
+        yield server
+
+
+def test_service_and_credentials_are_cached(tmp_path, token_server):
+    token_file = str(tmp_path / "token.json")
+    token_server.write_token_file(token_file, expires_in=3600)
+    auth = GmailAuth(token_file, SCOPES)
+
+    service = auth.service()
+    assert service is not None
+    assert auth.service() is service
+    assert auth.credentials() is auth.credentials()
+    assert token_server.refreshes == 0
+
+
+def test_new_token_file_is_picked_up(tmp_path, token_server):
+    token_file = str(tmp_path / "token.json")
+    token_server.write_token_file(token_file, expires_in=3600)
+    auth = GmailAuth(token_file, SCOPES)
+    service = auth.service()
+
+    # A new token written by another process, e.g. the OAuth callback
+    time.sleep(0.01)
+    token_server.write_token_file(token_file, expires_in=7200)
+    assert auth.service() is not service
+
+    os.remove(token_file)
+    assert auth.service() is None
+
+
+def test_token_is_refreshed_before_it_expires(tmp_path, token_server):
+    token_file = str(tmp_path / "token.json")
+    token_server.write_token_file(token_file, expires_in=120)
+    auth = GmailAuth(token_file, SCOPES, refresh_margin=300)
+
+    auth.start_refresher(interval=0.01)
+    deadline = time.monotonic() + 5
+    while token_server.refreshes == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    auth.stop_refresher()
+
+    assert token_server.refreshes == 1
+    assert auth.credentials().token == "access-token-1"
+    # The refreshed token is persisted for the next start
+    assert "access-token-1" in open(token_file).read()
+
+
+def test_expired_token_is_refreshed_on_demand(tmp_path, token_server):
+    token_file = str(tmp_path / "token.json")
+    token_server.write_token_file(token_file, expires_in=-60)
+    auth = GmailAuth(token_file, SCOPES)
+
+    assert auth.credentials().valid
+    assert token_server.refreshes == 1
+
+
+def test_missing_token_needs_oauth(tmp_path):
+    auth = GmailAuth(str(tmp_path / "token.json"), SCOPES)
+    assert auth.credentials() is None
+    assert auth.service() is None
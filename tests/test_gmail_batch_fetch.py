@@ -0,0 +1,60 @@
+import pytest
+
+from gmail_integration.gmail_client import GmailClient
+from tests.fakes.gmail import FakeGmailServer
+
+BURST_SIZE = 50
+
+
+@pytest.fixture
+def fake_gmail():
+    with FakeGmailServer() as server:
+        for i in range(BURST_SIZE):
+            server.add_message(
+                f"shipper{i}@example.com", f"Shipment {i}", f"Where is {i}?"
+            )
+        yield server
+
+
+def _fetch_unread(fake_gmail, batch_size):
+    client = GmailClient(service=fake_gmail.build_service(), batch_size=batch_size)
+    fake_gmail.round_trips = fake_gmail.batch_requests = fake_gmail.batched_calls = 0
+    emails = client.get_unread_messages(max_results=BURST_SIZE)
+    return emails, fake_gmail.round_trips, fake_gmail.batch_requests
+
+
+def test_unread_burst_is_fetched_in_one_batch(fake_gmail):
+    emails, round_trips, batches = _fetch_unread(fake_gmail, batch_size=50)
+    assert len(emails) == BURST_SIZE
+    assert {email.body for email in emails} == {
+        f"Where is {i}?" for i in range(BURST_SIZE)
+    }
+    # One list call plus one metadata and one full batch, instead of 1 + 50 gets
+    assert round_trips == 3
+    assert batches == 2
+    assert fake_gmail.batched_calls == 2 * BURST_SIZE
+
+    _, sequential_round_trips, batches = _fetch_unread(fake_gmail, batch_size=1)
+    assert sequential_round_trips == 2 * BURST_SIZE + 1
+    assert batches == fake_gmail.batched_calls == 2 * BURST_SIZE
+
+
+def test_batch_size_controls_round_trips(fake_gmail):
+    emails, round_trips, batches = _fetch_unread(fake_gmail, batch_size=20)
+    assert len(emails) == BURST_SIZE
+    assert round_trips == 1 + 2 * 3
+    assert batches == 2 * 3
+    assert fake_gmail.batched_calls == 2 * BURST_SIZE
+
+
+def test_emails_by_sender_use_batches(fake_gmail):
+    client = GmailClient(service=fake_gmail.build_service())
+    fake_gmail.round_trips = 0
+    emails = client.get_emails_by_sender("shipper7@example.com")
+    assert [email.subject for email in emails] == ["Shipment 7"]
+    assert fake_gmail.round_trips == 2
+
+
+def test_batch_size_is_validated():
+    with pytest.raises(ValueError):
+        GmailClient(service=object(), batch_size=101)
@@ -0,0 +1,109 @@
+import pytest
+
+from gmail_integration.gmail_client import GmailClient
+from gmail_integration.history_checkpoint import HistoryCheckpoint
+from tests.fakes.gmail import FakeGmailServer
+
+
+@pytest.fixture
+def fake_gmail():
+    with FakeGmailServer() as server:
+        yield server
+
+
+@pytest.fixture
+def client(fake_gmail):
+    client = GmailClient(service=fake_gmail.build_service())
+    client.PAGE_SIZE = 4  # force pagination with a handful of messages
+    return client
+
+
+def _add(fake_gmail, count, start=0):
+    return [
+        fake_gmail.add_message(f"shipper{i}@example.com", f"Shipment {i}", f"Body {i}")
+        for i in range(start, start + count)
+    ]
+
+
+def _sync(client, checkpoint):
+    sync = client.sync_new_messages(checkpoint)
+    client.complete_sync(checkpoint, sync)
+    return sync.emails
+
+
+def test_first_sync_drains_whole_unread_inbox(fake_gmail, client, tmp_path):
+    checkpoint = HistoryCheckpoint(str(tmp_path / "history.json"))
+    _add(fake_gmail, 25)
+
+    emails = _sync(client, checkpoint)
+
+    assert len(emails) == 25
+    assert checkpoint.load() == str(fake_gmail.history_id)
+
+
+def test_incremental_sync_returns_only_new_messages(fake_gmail, client, tmp_path):
+    checkpoint = HistoryCheckpoint(str(tmp_path / "history.json"))
+    _add(fake_gmail, 5)
+    _sync(client, checkpoint)
+
+    new_ids = _add(fake_gmail, 9, start=5)
+    emails = _sync(client, checkpoint)
+    assert sorted(email.message_id for email in emails) == sorted(new_ids)
+
+    fake_gmail.round_trips = 0
+    assert _sync(client, checkpoint) == []
+    # An idle inbox costs a single history call, no listing or fetching
+    assert fake_gmail.round_trips == 1
+
+
+def test_expired_checkpoint_falls_back_to_full_resync(fake_gmail, client, tmp_path):
+    checkpoint = HistoryCheckpoint(str(tmp_path / "history.json"))
+    checkpoint.save("1")
+    fake_gmail.expire_history()
+    _add(fake_gmail, 3)
+
+    with pytest.warns(UserWarning, match="expired"):
+        sync = client.sync_new_messages(checkpoint)
+    client.complete_sync(checkpoint, sync, mark_as_read=True)
+
+    assert len(sync.emails) == 3
+    assert checkpoint.load() == str(fake_gmail.history_id)
+    assert all("UNREAD" not in m["labelIds"] for m in fake_gmail.messages.values())
+
+
+def test_sync_is_listed_again_until_completed(fake_gmail, client, tmp_path):
+    checkpoint = HistoryCheckpoint(str(tmp_path / "history.json"))
+    _add(fake_gmail, 2)
+    _sync(client, checkpoint)
+    new_ids = _add(fake_gmail, 3, start=2)
+
+    # A crash before the emails are answered leaves checkpoint and labels alone
+    client.sync_new_messages(checkpoint)
+    sync = client.sync_new_messages(checkpoint)
+    assert sorted(email.message_id for email in sync.emails) == sorted(new_ids)
+
+    client.complete_sync(checkpoint, sync, mark_as_read=True, failed_ids=new_ids[:1])
+    assert client.sync_new_messages(checkpoint).emails == sync.emails
+    assert "UNREAD" in fake_gmail.messages[new_ids[0]]["labelIds"]
+    assert "UNREAD" not in fake_gmail.messages[new_ids[1]]["labelIds"]
+
+    client.complete_sync(checkpoint, sync)
+    assert client.sync_new_messages(checkpoint).emails == []
+
+
+def test_messages_that_fail_to_fetch_hold_the_checkpoint(fake_gmail, client, tmp_path):
+    checkpoint = HistoryCheckpoint(str(tmp_path / "history.json"))
+    _add(fake_gmail, 1)
+    _sync(client, checkpoint)
+    fetched, lost = _add(fake_gmail, 2, start=1)
+    gone = fake_gmail.messages.pop(lost)
+
+    with pytest.warns(UserWarning, match="Failed to fetch"):
+        sync = client.sync_new_messages(checkpoint)
+    client.complete_sync(checkpoint, sync)
+    assert [email.message_id for email in sync.emails] == [fetched]
+    assert sync.history_id is None
+
+    fake_gmail.messages[lost] = gone
+    retried = client.sync_new_messages(checkpoint)
+    assert sorted(email.message_id for email in retried.emails) == [fetched, lost]
@@ -0,0 +1,66 @@
+import io
+import os
+
+import pytest
+
+from gmail_integration.gmail_client import GmailClient
+from tests.fakes.gmail import FakeGmailServer
+
+BOL_PDF = os.urandom(300 * 1024)
+
+
+@pytest.fixture
+def fake_gmail():
+    with FakeGmailServer() as server:
+        yield server
+
+
+def _add_thread(fake_gmail, replies):
+    thread_id = None
+    ids = []
+    for day in range(replies):
+        message_id = fake_gmail.add_message(
+            "shipper@example.com",
+            "BOL for shipment 7",
+            f"Reply {day}",
+            thread_id=thread_id,
+            date=f"Mon, {23 + day} Jun 2025 10:00:00 +0000",
+            attachments=[("bol.pdf", "application/pdf", BOL_PDF)],
+        )
+        thread_id = thread_id or message_id
+        ids.append(message_id)
+    return ids
+
+
+def test_bodies_are_fetched_only_for_latest_reply(fake_gmail):
+    thread_ids = _add_thread(fake_gmail, replies=4)
+    other_id = fake_gmail.add_message("other@example.com", "Status?", "Where is 9?")
+    client = GmailClient(service=fake_gmail.build_service())
+
+    emails = client.get_unread_messages()
+
+    assert sorted(email.message_id for email in emails) == sorted(
+        [thread_ids[-1], other_id]
+    )
+    full_fetches = {mid for mid, fmt in fake_gmail.message_fetches if fmt == "full"}
+    assert full_fetches == {thread_ids[-1], other_id}
+    latest = next(email for email in emails if email.message_id == thread_ids[-1])
+    assert latest.body == "Reply 3"
+
+
+def test_attachments_are_downloaded_on_demand(fake_gmail):
+    _add_thread(fake_gmail, replies=1)
+    client = GmailClient(service=fake_gmail.build_service())
+
+    fake_gmail.bytes_sent = 0
+    (email,) = client.get_unread_messages()
+    # Listing and parsing never transfers the attachment itself
+    assert fake_gmail.bytes_sent < len(BOL_PDF) / 10
+
+    (attachment,) = email.attachments
+    assert (attachment.filename, attachment.size) == ("bol.pdf", len(BOL_PDF))
+
+    client.ATTACHMENT_CHUNK_SIZE = 4096
+    destination = io.BytesIO()
+    assert client.save_attachment(attachment, destination) == len(BOL_PDF)
+    assert destination.getvalue() == BOL_PDF
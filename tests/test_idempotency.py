@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from mcp_stuff.idempotency import IdempotencyStore
+from mcp_stuff.jobs import JobQueue
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import run_mcp  # noqa: E402
+
+
+def test_handled_requests_are_replayed_after_a_restart(tmp_path):
+    path = str(tmp_path / "idempotency.db")
+    runs = []
+
+    async def handler():
+        runs.append(1)
+        return {"response": "ETA updated"}
+
+    async def scenario(store):
+        return [await store.run_once("k", handler) for _ in range(2)]
+
+    store = IdempotencyStore(path)
+    assert asyncio.run(scenario(store)) == [{"response": "ETA updated"}] * 2
+    store.close()
+
+    store = IdempotencyStore(path)
+    assert asyncio.run(store.run_once("k", handler)) == {"response": "ETA updated"}
+    assert len(runs) == 1 and store.replayed == 1
+
+
+def test_concurrent_retries_wait_for_the_first_attempt(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"))
+    runs = []
+
+    async def handler():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"response": len(runs)}
+
+    async def scenario():
+        return await asyncio.gather(*(store.run_once("k", handler) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == [{"response": 1}] * 3
+    assert len(runs) == 1 and store.replayed == 2
+    assert store._inflight.in_flight() == 0
+
+
+def test_failures_are_not_stored(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"))
+    attempts = []
+
+    async def handler():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("LLM timed out")
+        return {"response": "ok"}
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.run_once("k", handler))
+    assert asyncio.run(store.run_once("k", handler)) == {"response": "ok"}
+    assert len(attempts) == 2
+
+
+def test_expired_responses_are_pruned(tmp_path, monkeypatch):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"), ttl_seconds=3600)
+    store.put("old", {"response": 1})
+    monkeypatch.setattr(time, "time", lambda: 10_000_000_000.0)
+    store.put("new", {"response": 2})
+    assert store.get("old") is None
+    assert store.prune() == 1
+    assert store.get("new") == {"response": 2}
+
+
+def test_endpoint_queues_each_key_once(tmp_path, monkeypatch):
+    applied = []
+
+    async def apply_courier_update(payload):
+        applied.append(payload["shipment_query"])
+        return {"response": f"updated {len(applied)}"}
+
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"))
+    jobs = JobQueue(
+        {"courier_shipment_update": apply_courier_update},
+        path=str(tmp_path / "jobs.db"),
+    )
+    monkeypatch.setattr(run_mcp, "get_idempotency_store", lambda: store)
+    monkeypatch.setattr(run_mcp, "get_job_queue", lambda: jobs)
+    # Without the lifespan no workers run, so the jobs stay queued
+    client = TestClient(run_mcp.app)
+    params = {"phone_number": "+1 555 0100", "shipment_query": "2h late"}
+
+    def post(**headers):
+        response = client.post(
+            "/courier_shipment_updates", params=params, headers=headers
+        )
+        assert response.status_code == 202
+        return response.json()["response"]["job_id"]
+
+    first = post(**{"Idempotency-Key": "tg-1-10-11"})
+    retry = post(**{"Idempotency-Key": "tg-1-10-11"})
+    other = post(**{"Idempotency-Key": "tg-1-12-12"})
+    unkeyed = post()
+
+    assert first == retry
+    assert len({first, other, unkeyed}) == 3
+    asyncio.run(jobs.run(until_empty=True))
+    assert len(applied) == 3
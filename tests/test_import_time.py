@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from benchmarks.import_profile import (
+    ENTRY_POINTS,
+    IMPORT_BUDGETS_SECONDS,
+    measure_cold_start,
+)
+
+BUDGET_SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1.0"))
+
+
+@pytest.mark.parametrize("entry_point", ENTRY_POINTS, ids=lambda e: e.name)
+def test_imports_without_credentials(entry_point):
+    # Importing must not build heavy clients (OAuth, Gmail discovery, DB engine),
+    # so it also has to succeed without credentials.json / token.json present.
+    measure_cold_start(entry_point, repeat=1)
+
+
+@pytest.mark.timing
+@pytest.mark.parametrize("entry_point", ENTRY_POINTS, ids=lambda e: e.name)
+def test_cold_start_within_budget(entry_point):
+    cold_start = measure_cold_start(entry_point)
+    budget = IMPORT_BUDGETS_SECONDS[entry_point.name] * BUDGET_SCALE
+
+    assert cold_start <= budget, (
+        f"{entry_point.name} cold start took {cold_start:.2f}s, budget is {budget:.2f}s; "
+        "run `python -m benchmarks.import_profile` to see the slowest imports"
+    )
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+
+from gmail_integration.outbound_queue import OutboundQueue
+from mcp_stuff.conversation_context import ConversationContextStore
+from mcp_stuff.jobs import JobQueue
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import run_mcp  # noqa: E402
+
+
+def test_workers_run_jobs_concurrently(tmp_path):
+    running = 0
+    peak = 0
+
+    async def update(payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        if payload["n"] == 3:
+            raise RuntimeError("LLM timed out")
+        return {"response": payload["n"] * 10}
+
+    jobs = JobQueue({"update": update}, path=str(tmp_path / "jobs.db"), workers=3)
+    ids = [jobs.submit("update", {"n": n}) for n in range(10)]
+    assert jobs.get(ids[0])["status"] == "queued" and jobs.depth() == 10
+
+    asyncio.run(jobs.run(until_empty=True))
+
+    assert peak == 3
+    finished = [jobs.get(job_id) for job_id in ids]
+    assert finished[3]["status"] == "failed"
+    assert finished[3]["error"] == "LLM timed out"
+    assert [job["result"] for job in finished if job["status"] == "done"] == [
+        {"response": n * 10} for n in range(10) if n != 3
+    ]
+    report = jobs.report()
+    assert (report["processed"], report["failed"], report["queued"]) == (9, 1, 0)
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    results = []
+
+    async def update(payload):
+        results.append(payload)
+        return None
+
+    jobs = JobQueue({"update": update}, path=path)
+    queued = jobs.submit("update", {"n": 1})
+    interrupted = jobs.submit("update", {"n": 2})
+    # The process stopped while running the second job
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE jobs SET status = 'running' WHERE id = ?", (interrupted,))
+    jobs.close()
+
+    jobs = JobQueue({"update": update}, path=path)
+    asyncio.run(jobs.run(until_empty=True))
+    assert results == [{"n": 1}, {"n": 2}]
+    assert jobs.get(queued)["status"] == jobs.get(interrupted)["status"] == "done"
+    assert jobs.get("unknown") is None
+
+
+def test_finished_jobs_are_pruned(tmp_path, monkeypatch):
+    async def update(payload):
+        return payload
+
+    jobs = JobQueue({"update": update}, path=str(tmp_path / "jobs.db"), ttl_seconds=60)
+    old = jobs.submit("update", {})
+    asyncio.run(jobs.run(until_empty=True))
+    waiting = jobs.submit("update", {})
+
+    monkeypatch.setattr(time, "time", lambda: 10_000_000_000.0)
+    assert jobs.prune() == 1
+    assert jobs.get(old) is None and jobs.get(waiting)["status"] == "queued"
+
+
+def test_status_endpoint_holds_until_the_job_finishes(tmp_path, monkeypatch):
+    release = asyncio.Event()
+
+    async def apply_courier_update(payload):
+        await release.wait()
+        return {"response": f"ETA updated for {payload['shipment_query']}"}
+
+    jobs = JobQueue(
+        {"courier_shipment_update": apply_courier_update},
+        path=str(tmp_path / "jobs.db"),
+        workers=1,
+    )
+    monkeypatch.setattr(run_mcp, "get_job_queue", lambda: jobs)
+    monkeypatch.setattr(run_mcp, "get_idempotency_store", lambda: None)
+    outbound = OutboundQueue(lambda messages: [], path=str(tmp_path / "out.db"))
+    monkeypatch.setattr(run_mcp, "get_outbound_queue", lambda: outbound)
+    contexts = ConversationContextStore()
+    monkeypatch.setattr(run_mcp, "get_conversation_store", lambda: contexts)
+
+    with TestClient(run_mcp.app) as client:
+        queued = client.post(
+            "/courier_shipment_updates",
+            params={"phone_number": "+1 555 0100", "shipment_query": "shipment 7"},
+        )
+        assert queued.status_code == 202
+        job_id = queued.json()["response"]["job_id"]
+
+        start = time.monotonic()
+        pending = client.get(f"/jobs/{job_id}", params={"wait": 0.2}).json()
+        assert time.monotonic() - start >= 0.2
+        assert pending["response"]["status"] == "running"
+
+        client.portal.call(release.set)
+        done = client.get(f"/jobs/{job_id}", params={"wait": 5}).json()["response"]
+        assert done["status"] == "done"
+        assert done["result"] == {"response": "ETA updated for shipment 7"}
+
+        assert client.get("/jobs/unknown").status_code == 404
+        assert client.get(f"/jobs/{job_id}", params={"wait": 3600}).status_code == 422
@@ -0,0 +1,115 @@
+import asyncio
+from collections import Counter
+
+from gmail_integration.mailbox_scheduler import (
+    MailboxScheduler,
+    discover_mailboxes,
+    mailbox_owner,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(clock, **kwargs):
+    return MailboxScheduler(
+        min_interval=10, max_interval=80, jitter=0.0, clock=clock, **kwargs
+    )
+
+
+def test_each_mailbox_has_exactly_one_owner():
+    names = [f"mailbox-{i}" for i in range(1000)]
+    owners = {name: mailbox_owner(name, 4) for name in names}
+
+    assert set(owners.values()) == {0, 1, 2, 3}
+    assert min(Counter(owners.values()).values()) > 200
+    # Stable across calls (and processes: no salted hash())
+    assert owners == {name: mailbox_owner(name, 4) for name in names}
+
+    # A fifth worker only takes mailboxes over, nothing moves between the others
+    moved = [name for name in names if mailbox_owner(name, 5) != owners[name]]
+    assert all(mailbox_owner(name, 5) == 4 for name in moved)
+    assert len(moved) < 300
+
+
+def test_most_overdue_mailbox_goes_first():
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+    for name in ["a", "b", "c"]:
+        scheduler.add(name, f"{name}.json")
+        clock.now += 1
+
+    first = scheduler.next_due()
+    second = scheduler.next_due()
+    assert [first.name, second.name] == ["a", "b"]
+
+    # "a" is not handed out again while its sync is running
+    clock.now = 100
+    assert scheduler.next_due().name == "c"
+    assert scheduler.next_due() is None
+
+    scheduler.completed(first, new_messages=0)
+    assert scheduler.next_due() is None
+    clock.now += 20
+    assert scheduler.next_due().name == "a"
+
+
+def test_intervals_adapt_to_activity():
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+    mailbox = scheduler.add("a", "a.json")
+
+    intervals = []
+    for new_messages in [0, 0, 0, 0, 0, 3, 0]:
+        assert scheduler.next_due() is mailbox
+        scheduler.completed(mailbox, new_messages)
+        intervals.append(mailbox.interval)
+        clock.now = mailbox.next_poll_at
+
+    assert intervals == [20, 40, 80, 80, 80, 10, 20]
+
+
+def test_removed_mailboxes_are_not_scheduled():
+    clock = FakeClock()
+    scheduler = _scheduler(clock)
+    scheduler.add("a", "a.json")
+    scheduler.add("b", "b.json")
+    scheduler.remove("a")
+
+    assert scheduler.next_due().name == "b"
+    assert scheduler.next_due() is None
+    assert "a" not in scheduler
+
+
+def test_due_waits_for_the_next_poll():
+    scheduler = MailboxScheduler(min_interval=0.05, max_interval=0.05, jitter=0.0)
+    scheduler.add("a", "a.json")
+    scheduler.add("b", "b.json")
+
+    async def scenario():
+        polled = []
+        async for mailbox in scheduler.due():
+            polled.append(mailbox.name)
+            scheduler.completed(mailbox, new_messages=1)
+            if len(polled) == 6:
+                return polled
+
+    polled = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert Counter(polled) == {"a": 3, "b": 3}
+
+
+def test_mailboxes_are_discovered_from_token_files(tmp_path):
+    (tmp_path / "sales.json").write_text("{}")
+    (tmp_path / "ops.json").write_text("{}")
+    (tmp_path / "notes.txt").write_text("")
+
+    assert discover_mailboxes(str(tmp_path)) == {
+        "ops": str(tmp_path / "ops.json"),
+        "sales": str(tmp_path / "sales.json"),
+    }
+    assert discover_mailboxes(str(tmp_path / "missing")) == {}
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import shutil
+
+from mcp_stuff import mcp_llm_engine
+from mcp_stuff.mcp_llm_engine import MCP_ChatBot, get_shipment_info
+from tests.fakes.llm import FakeAnthropicServer, SlowToPickTool
+
+TEST_DB = os.path.join(os.path.dirname(__file__), "..", "database", "test_shipments.db")
+SHIPPER = "shipper.3plcopilot@gmail.com"
+
+
+def test_query_runs_through_the_mcp_server_offline(tmp_path, monkeypatch):
+    db = tmp_path / "tms.db"
+    shutil.copy(TEST_DB, db)
+    monkeypatch.setenv("DB_PATH", f"sqlite:///{db}")
+    monkeypatch.setattr(mcp_llm_engine, "METRICS_DIR", str(tmp_path / "metrics"))
+
+    with FakeAnthropicServer() as llm:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", llm.url)
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "fake")
+        messages = asyncio.run(
+            MCP_ChatBot().connect_to_server_and_run(
+                query=f"Email: {SHIPPER}\nQuery: Where is my shipment 7?"
+            )
+        )
+
+    # The server got our database, wherever this test was started from
+    shipments = get_shipment_info(messages)
+    assert [shipment["shipment_id"] for shipment in shipments] == [7]
+    assert llm.calls == 2 and llm.tool_calls == {"get_shipment_by_id": 1}
+
+
+def test_overlapping_runs_share_one_chatbot(tmp_path, monkeypatch):
+    db = tmp_path / "tms.db"
+    shutil.copy(TEST_DB, db)
+    monkeypatch.setenv("DB_PATH", f"sqlite:///{db}")
+    monkeypatch.setattr(mcp_llm_engine, "METRICS_DIR", str(tmp_path / "metrics"))
+
+    async def both(chatbot):
+        async def later(query):
+            await asyncio.sleep(0.3)
+            return await chatbot.connect_to_server_and_run(query=query)
+
+        # The text-only run ends, and closes its MCP server, while the first
+        # one is still waiting to call its tool
+        return await asyncio.gather(
+            chatbot.connect_to_server_and_run(
+                query=f"Email: {SHIPPER}\nQuery: Where is my shipment 7?"
+            ),
+            later("Hello?"),
+        )
+
+    with SlowToPickTool("shipment 7") as llm:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", llm.url)
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "fake")
+        tool_run, text_run = asyncio.run(both(MCP_ChatBot()))
+
+    assert [s["shipment_id"] for s in get_shipment_info(tool_run)] == [7]
+    assert text_run == [{"role": "user", "content": "Hello?"}]
+    assert llm.tool_calls == {"get_shipment_by_id": 1}
@@ -0,0 +1,110 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from observability import metrics
+from observability.metrics import MetricsRegistry
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import run_mcp  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A process that records a stage and then waits to be stopped, like an MCP server
+EXPORTER = """
+import sys, time
+from observability.metrics import enable_export, track
+enable_export(sys.argv[1], interval=None)
+with track("test_subprocess", "op"):
+    time.sleep(0.01)
+print("ready", flush=True)
+time.sleep(30)
+"""
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("t_seconds", "Time", ["stage"], buckets=[0.1, 1])
+    for value in (0.05, 0.5, 0.5, 5):
+        seconds.observe(value, stage='say "hi"')
+    registry.counter("t_total", "Count", []).inc(3)
+
+    lines = registry.render().splitlines()
+    assert 't_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="say \\"hi\\"",le="1"} 3' in lines
+    assert 't_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 4' in lines
+    assert 't_seconds_count{stage="say \\"hi\\""} 4' in lines
+    assert 't_seconds_sum{stage="say \\"hi\\""} 6.05' in lines
+    assert "t_total 3" in lines
+    with pytest.raises(ValueError):
+        seconds.observe(1, stage="x", other="y")
+
+
+def test_snapshots_add_up():
+    first, second = MetricsRegistry(), MetricsRegistry()
+    for registry in (first, second):
+        registry.histogram("t_seconds", "Time", ["stage"]).observe(0.2, stage="a")
+        registry.gauge("t_in_flight", "Running", ["stage"]).inc(stage="a")
+
+    first.merge(second.snapshot())
+    assert 't_seconds_count{stage="a"} 2' in first.render()
+    assert 't_in_flight{stage="a"} 2' in first.render()
+    # The gauges of exited processes no longer hold
+    retired = MetricsRegistry()
+    retired.merge(second.snapshot(), gauges=False)
+    assert "t_in_flight" not in retired.render()
+
+
+def test_metrics_of_stopped_subprocesses_are_collected(tmp_path):
+    directory = str(tmp_path / "metrics")
+    process = subprocess.Popen(
+        [sys.executable, "-c", EXPORTER, directory],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert process.stdout.readline().strip() == "ready"
+        # Stopped the way the MCP client stops its server
+        process.send_signal(signal.SIGTERM)
+        process.wait(10)
+    finally:
+        process.kill()
+        process.stdout.close()
+
+    snapshot_file = os.path.join(directory, f"{process.pid}.json")
+    assert os.path.exists(snapshot_file)
+    line = 'stage_duration_seconds_count{stage="test_subprocess",operation="op"} 1'
+    assert line in metrics.collect(directory).splitlines()
+    # Folded into this process, so the file is gone but the counts stay
+    assert not os.path.exists(snapshot_file)
+    assert line in metrics.collect(directory).splitlines()
+
+
+def test_api_requests_are_counted_by_route():
+    client = TestClient(run_mcp.app)
+    client.get("/query_stats")
+    client.get("/get_courier_shipments")
+    client.get("/no/such/route")
+
+    lines = client.get("/metrics").text.splitlines()
+    assert any(
+        line.startswith(
+            'http_requests_total{method="GET",path="/query_stats",status="200"}'
+        )
+        for line in lines
+    )
+    assert any(
+        line.startswith(
+            'http_requests_total{method="GET",path="/get_courier_shipments",status="422"}'
+        )
+        for line in lines
+    )
+    assert any('path="unmatched"' in line for line in lines)
+    assert any(
+        line.startswith("http_request_duration_seconds_bucket") for line in lines
+    )
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from benchmarks.microbench import (
+    CASES,
+    REGRESSION_THRESHOLD,
+    compare,
+    load_baseline,
+    run,
+)
+
+THRESHOLD = float(os.getenv("MICROBENCH_THRESHOLD", REGRESSION_THRESHOLD))
+
+
+@pytest.fixture(scope="module")
+def comparisons():
+    calibration_seconds, results = run(CASES)
+    return {
+        comparison.name: comparison
+        for comparison in compare(
+            results, calibration_seconds, load_baseline(), THRESHOLD
+        )
+    }
+
+
+def test_timings_are_compared_at_the_baselines_speed():
+    # The baseline was recorded on a machine twice as slow as this one
+    baseline = {"calibration_seconds": 2.0, "cases": {"same": 4.0, "slower": 4.0}}
+    results = {"same": 2.0, "slower": 3.0, "new": 1.0}
+
+    changes = {
+        comparison.name: (comparison.change, comparison.regressed)
+        for comparison in compare(results, 1.0, baseline, 0.25)
+    }
+    assert changes == {
+        "same": (0.0, False),
+        "slower": (0.5, True),
+        "new": (None, False),
+    }
+
+
+@pytest.mark.timing
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.name)
+def test_no_regression_over_the_baseline(case, comparisons):
+    comparison = comparisons[case.name]
+    assert comparison.change is not None, f"{case.name} has no baseline"
+    assert not comparison.regressed, (
+        f"{case.name} took {comparison.seconds * 1e6:.1f}us, "
+        f"{comparison.change:.0%} slower than the baseline; "
+        "run `python -m benchmarks.microbench --check` to compare all cases"
+    )
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from gmail_integration.gmail_client import GmailClient
+from gmail_integration.outbound_queue import OutboundQueue
+from tests.fakes.gmail import FakeGmailServer
+
+
+def _http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+
+def _message(i):
+    return GmailClient.build_message(f"shipper{i}@example.com", "Update", f"#{i}")
+
+
+def test_messages_are_sent_in_batches(tmp_path):
+    with FakeGmailServer() as server:
+        client = GmailClient(service=server.build_service())
+        queue = OutboundQueue(
+            client.send_messages,
+            path=str(tmp_path / "outbound.db"),
+            sends_per_second=1000,
+            batch_size=10,
+        )
+        for i in range(25):
+            queue.enqueue(_message(i))
+        assert queue.depth() == 25
+
+        asyncio.run(queue.run(until_empty=True))
+
+        assert len(server.sent) == 25
+        assert server.round_trips == 3
+        report = queue.report()
+        assert report["queued"] == 0
+        assert report["processed"] == 25
+        assert report["p95_ms"] > 0
+
+
+def test_pending_messages_survive_restart(tmp_path):
+    path = str(tmp_path / "outbound.db")
+    queue = OutboundQueue(lambda messages: [None] * len(messages), path=path)
+    queue.enqueue(_message(1))
+    queue.close()
+
+    sent = []
+    queue = OutboundQueue(lambda messages: sent.extend(messages) or [None], path=path)
+    asyncio.run(queue.run(until_empty=True))
+    assert sent == [_message(1)]
+    assert queue.depth() == 0
+
+
+def test_throttled_sends_are_retried(tmp_path):
+    calls = []
+
+    def send_batch(messages):
+        calls.append(len(messages))
+        return [_http_error(429) if len(calls) == 1 else None for _ in messages]
+
+    queue = OutboundQueue(
+        send_batch, path=str(tmp_path / "outbound.db"), retry_delay=0.01
+    )
+    queue.enqueue(_message(1))
+    asyncio.run(queue.run(until_empty=True))
+
+    assert calls == [1, 1]
+    assert queue.retried == 1
+    assert queue.report()["processed"] == 1
+
+
+def test_rejected_messages_are_not_retried(tmp_path):
+    queue = OutboundQueue(
+        lambda messages: [_http_error(400)] * len(messages),
+        path=str(tmp_path / "outbound.db"),
+    )
+    queue.enqueue(_message(1))
+    asyncio.run(queue.run(until_empty=True))
+
+    [failed] = queue.failed_messages()
+    assert failed["message"] == _message(1)
+    assert failed["attempts"] == 1
+    assert queue.depth() == 0
+
+
+def test_sends_are_rate_limited(tmp_path):
+    queue = OutboundQueue(
+        lambda messages: [None] * len(messages),
+        path=str(tmp_path / "outbound.db"),
+        sends_per_second=50,
+        batch_size=5,
+    )
+    for i in range(25):
+        queue.enqueue(_message(i))
+
+    start = time.perf_counter()
+    asyncio.run(queue.run(until_empty=True))
+    # A burst of 5, then the remaining 20 at 50/s
+    assert time.perf_counter() - start >= 0.35
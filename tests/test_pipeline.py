@@ -0,0 +1,86 @@
+import asyncio
+
+from gmail_integration.pipeline import Pipeline, Stage
+
+
+async def _items(count, produced=None):
+    for i in range(count):
+        if produced is not None:
+            produced.append(i)
+        yield i
+
+
+def test_stage_concurrency_is_bounded():
+    running = 0
+    peak = 0
+
+    async def slow(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return item
+
+    pipeline = Pipeline([Stage("slow", slow, concurrency=3, queue_size=10)])
+    asyncio.run(pipeline.run(_items(12)))
+
+    assert peak == 3
+    assert pipeline.stats["slow"].processed == 12
+
+
+def test_full_queues_block_the_source():
+    produced = []
+
+    async def stuck(item):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        pipeline = Pipeline(
+            [
+                Stage("pass", lambda item: asyncio.sleep(0, item), queue_size=2),
+                Stage("stuck", stuck, concurrency=1, queue_size=2),
+            ]
+        )
+        task = asyncio.create_task(pipeline.run(_items(1000, produced)))
+        await asyncio.sleep(0.1)
+        in_flight = pipeline.stats["stuck"].in_flight
+        task.cancel()
+        return in_flight
+
+    in_flight = asyncio.run(scenario())
+
+    # Queues (2 + 2), one item per stage in flight and one blocked put
+    assert len(produced) <= 2 + 2 + 2 + 1
+    assert in_flight == 1
+
+
+def test_stats_count_dropped_failed_and_fanned_out_items():
+    async def explode(item):
+        return [item, item]
+
+    async def drop_odd(item):
+        if item == 3:
+            raise RuntimeError("boom")
+        return item if item % 2 == 0 else None
+
+    async def sink(item):
+        return None
+
+    pipeline = Pipeline(
+        [
+            Stage("explode", explode, fan_out=True),
+            Stage("drop_odd", drop_odd),
+            Stage("sink", sink),
+        ]
+    )
+    asyncio.run(pipeline.run(_items(5)))
+
+    report = {row["stage"]: row for row in pipeline.report()}
+    assert report["explode"]["processed"] == 5
+    assert report["drop_odd"]["processed"] == 8
+    assert report["drop_odd"]["failed"] == 2
+    assert report["drop_odd"]["dropped"] == 2
+    assert report["sink"]["processed"] == 6
+    assert report["sink"]["dropped"] == 0
+    assert report["drop_odd"]["p95_ms"] >= 0
@@ -0,0 +1,160 @@
+import asyncio
+import sqlite3
+import time
+
+import httpx
+import pytest
+
+import run_processing
+from gmail_integration.body_cleaner import BodyCleaner
+from gmail_integration.dedup_store import DedupStore
+from gmail_integration.gmail_client import GmailClient
+from gmail_integration.history_checkpoint import HistoryCheckpoint
+from gmail_integration.mailbox_scheduler import MailboxScheduler
+from gmail_integration.outbound_queue import OutboundQueue
+from tests.fakes.gmail import FakeGmailServer
+
+MAILBOX = "inbox"
+
+
+@pytest.fixture
+def fake_gmail():
+    with FakeGmailServer() as server:
+        yield server
+
+
+@pytest.fixture
+def connection(fake_gmail, tmp_path):
+    state_db = str(tmp_path / "outbound_mail.db")
+    connection = run_processing.MailboxConnection(
+        name=MAILBOX,
+        gmail_client=GmailClient(service=fake_gmail.build_service()),
+        history_checkpoint=HistoryCheckpoint(str(tmp_path / "gmail_history.json")),
+        dedup_store=DedupStore(state_db),
+        outbound_queue=OutboundQueue(
+            lambda messages: [None] * len(messages), path=state_db
+        ),
+    )
+    yield connection
+    connection.close()
+
+
+def _run(connection, responses, syncs=1, body_cleaner=None):
+    """Sync the mailbox ``syncs`` times, each drained by the pipeline before the next.
+
+    ``responses`` are the API's answers to the /query calls, in order.
+    """
+    scheduler = MailboxScheduler()
+    mailbox = scheduler.add(MAILBOX, "token.json")
+    replies = iter(responses)
+
+    async def source():
+        yield mailbox
+
+    async def scenario():
+        transport = httpx.MockTransport(lambda request: next(replies))
+        async with httpx.AsyncClient(transport=transport) as client:
+            pipeline = run_processing.build_pipeline(
+                scheduler, {MAILBOX: connection}, client, body_cleaner or BodyCleaner()
+            )
+            for _ in range(syncs):
+                await pipeline.run(source())
+            return pipeline
+
+    return asyncio.run(scenario())
+
+
+def _answer():
+    return httpx.Response(200, json={"response": "It is on its way."})
+
+
+def test_checkpoint_moves_once_the_emails_are_answered(fake_gmail, connection):
+    message_id = fake_gmail.add_message("shipper@example.com", "Shipment 7", "Hi?")
+
+    _run(connection, [_answer()])
+    assert connection.outbound_queue.depth() == 1
+    assert message_id in connection.dedup_store
+    # Completed by the next sync of the mailbox
+    assert connection.history_checkpoint.load() is None
+    assert "UNREAD" in fake_gmail.messages[message_id]["labelIds"]
+
+    _run(connection, [])
+    assert connection.history_checkpoint.load() == str(fake_gmail.history_id)
+    assert "UNREAD" not in fake_gmail.messages[message_id]["labelIds"]
+    assert connection.outbound_queue.depth() == 1
+
+
+class FlakyCleaner(BodyCleaner):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def clean(self, body):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("cleaning failed")
+        return super().clean(body)
+
+
+def test_an_email_failing_in_a_stage_is_retried_by_the_next_sync(
+    fake_gmail, connection
+):
+    message_id = fake_gmail.add_message("shipper@example.com", "Shipment 7", "Hi?")
+
+    pipeline = _run(connection, [_answer()], syncs=3, body_cleaner=FlakyCleaner(1))
+
+    assert pipeline.stats["clean"].failed == 1
+    assert pipeline.stats["reply"].processed == 1
+    assert message_id in connection.dedup_store
+    # The third sync completed the second one, which answered the email
+    assert connection.history_checkpoint.load() == str(fake_gmail.history_id)
+
+
+def test_reply_and_processed_id_are_committed_together(
+    fake_gmail, connection, monkeypatch
+):
+    message_id = fake_gmail.add_message("shipper@example.com", "Shipment 7", "Hi?")
+    (email,) = connection.sync([]).emails
+
+    def fail(message_ids, conn=None):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(connection.dedup_store, "add_many", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            connection.answer(email, {"raw": "reply"})
+    assert connection.outbound_queue.depth() == 0
+
+    connection.answer(email, {"raw": "reply"})
+    assert connection.outbound_queue.depth() == 1
+    assert message_id in connection.dedup_store
+
+
+def test_sync_prunes_old_processed_ids(connection, monkeypatch):
+    connection.dedup_store.add("old")
+    later = time.time() + run_processing.DEDUP_RETENTION + 1
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    connection.sync([])
+    assert "old" not in connection.dedup_store
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        [httpx.Response(500)],
+        [httpx.Response(429, headers={"Retry-After": "0"})]
+        * (run_processing.QUERY_OVERLOAD_RETRIES + 1),
+    ],
+    ids=["server_error", "overloaded"],
+)
+def test_failed_queries_are_retried_instead_of_answered(
+    fake_gmail, connection, failure
+):
+    message_id = fake_gmail.add_message("shipper@example.com", "Shipment 7", "Hi?")
+
+    pipeline = _run(connection, [*failure, _answer()], syncs=2)
+    assert pipeline.stats["query"].failed == 1
+    assert pipeline.stats["reply"].processed == 1
+    assert connection.outbound_queue.depth() == 1
+    assert message_id in connection.dedup_store
@@ -0,0 +1,152 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from database import session as db_session
+from database.data_schema import (
+    Base,
+    Courier,
+    CourierStatus,
+    Shipment,
+    ShipmentStatus,
+    Shipper,
+)
+from mcp_stuff.pagination import ShipmentCursor
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "telegram_integration")
+)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import bot  # noqa: E402
+
+import run_mcp  # noqa: E402
+
+STATUSES = [ShipmentStatus.PENDING, ShipmentStatus.IN_TRANSIT, ShipmentStatus.DELIVERED]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """The API on a database with 12 shipments of courier 1 and one of courier 2."""
+    monkeypatch.setenv("DB_PATH", f"sqlite:///{tmp_path / 'tms.db'}")
+    db_session.get_engine.cache_clear()
+    db_session.get_session_factory.cache_clear()
+    engine = db_session.get_engine()
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Shipper(shipper_id=1, name="Shipper", email="shipper@example.com"))
+        for courier_id in (1, 2):
+            db.add(
+                Courier(
+                    courier_id=courier_id,
+                    name=f"Courier {courier_id}",
+                    contact_number=f"+1 555 010{courier_id}",
+                    status=CourierStatus.AVAILABLE,
+                    email=f"courier{courier_id}@example.com",
+                )
+            )
+        for shipment_id in range(1, 14):
+            db.add(
+                Shipment(
+                    shipment_id=shipment_id,
+                    bol_doc_id=shipment_id,
+                    pod_doc_id=shipment_id,
+                    shipper_id=1,
+                    courier_id=2 if shipment_id == 7 else 1,
+                    eta=datetime(2025, 7, 1),
+                    shipment_status=STATUSES[shipment_id % 3],
+                    dest_address="Dest",
+                    source_address="Source",
+                )
+            )
+        db.commit()
+    yield TestClient(run_mcp.app)
+    engine.dispose()
+    db_session.get_engine.cache_clear()
+    db_session.get_session_factory.cache_clear()
+
+
+def _ids(page):
+    return [shipment["shipment_id"] for shipment in page["response"]]
+
+
+def test_pages_cover_every_shipment_once(client):
+    params = {"contact_number": "+1 555 0101", "page_size": 5}
+    pages = [client.get("/get_courier_shipments", params=params).json()]
+    while pages[-1]["next_cursor"]:
+        cursor = pages[-1]["next_cursor"]
+        pages.append(
+            client.get(
+                "/get_courier_shipments", params={**params, "cursor": cursor}
+            ).json()
+        )
+
+    assert [_ids(page) for page in pages] == [
+        [13, 12, 11, 10, 9],
+        [8, 6, 5, 4, 3],
+        [2, 1],
+    ]
+    assert pages[0]["prev_cursor"] is None
+
+    # And back again from the last page
+    back = [pages[-1]]
+    while back[-1]["prev_cursor"]:
+        cursor = back[-1]["prev_cursor"]
+        back.append(
+            client.get(
+                "/get_courier_shipments", params={**params, "cursor": cursor}
+            ).json()
+        )
+    assert [_ids(page) for page in back] == [_ids(page) for page in pages[::-1]]
+
+
+def test_status_filter_travels_with_the_cursor(client):
+    params = {"contact_number": "+1 555 0101", "status": "pending", "page_size": 2}
+    first = client.get("/get_courier_shipments", params=params).json()
+    second = client.get(
+        "/get_courier_shipments",
+        params={"contact_number": "+1 555 0101", "cursor": first["next_cursor"]},
+    ).json()
+
+    assert _ids(first) == [12, 9] and _ids(second) == [6, 3]
+    assert first["status"] == second["status"] == "pending"
+
+    conflicting = {**params, "status": "delivered", "cursor": first["next_cursor"]}
+    response = client.get("/get_courier_shipments", params=conflicting)
+    assert response.status_code == 400
+
+
+def test_bad_requests_are_rejected(client):
+    def status_code(**params):
+        return client.get("/get_courier_shipments", params=params).status_code
+
+    courier = {"contact_number": "+1 555 0101"}
+    assert status_code(**courier, cursor="not a cursor") == 400
+    assert status_code(**courier, status="lost") == 422
+    assert status_code(**courier, page_size=1000) == 422
+    assert status_code() == 422
+    # Shipments are only handed out for the courier's phone number
+    assert status_code(courier_id=1) == 422
+    unknown = client.get(
+        "/get_courier_shipments", params={"contact_number": "+1 555 9999"}
+    ).json()
+    assert unknown["response"] == [] and unknown["next_cursor"] is None
+
+
+def test_cursors_fit_in_telegram_callback_data():
+    cursor = ShipmentCursor(2**31, backwards=True, status=ShipmentStatus.IN_TRANSIT)
+    assert ShipmentCursor.decode(cursor.encode()) == cursor
+
+    page = {
+        "response": [],
+        "status": "in_transit",
+        "prev_cursor": cursor.encode(),
+        "next_cursor": cursor.encode(),
+    }
+    _, markup = bot.render_shipments_page(page)
+    buttons = markup.inline_keyboard[0]
+    assert [button.text for button in buttons] == ["« Newer", "Older »"]
+    assert all(len(button.callback_data.encode()) <= 64 for button in buttons)
@@ -0,0 +1,119 @@
+import asyncio
+import os
+
+import httpx
+
+from mcp_stuff.conversation_context import ConversationContextStore
+from mcp_stuff.single_flight import SingleFlight
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import run_mcp  # noqa: E402
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.02)
+        return len(runs)
+
+    async def scenario():
+        first = await asyncio.gather(*(flights.do("k", compute) for _ in range(5)))
+        # Finished computations are not cached
+        second = await flights.do("k", compute)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == [1] * 5 and second == 2
+    assert flights.report() == {"calls": 6, "collapsed": 4, "in_flight": 0}
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM timed out")
+
+    async def scenario():
+        return await asyncio.gather(
+            *(flights.do("k", compute) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(scenario())
+    assert [str(error) for error in errors] == ["LLM timed out"] * 3
+
+
+def test_a_caller_going_away_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.do("k", compute))
+        second = asyncio.ensure_future(flights.do("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("answer", True)
+
+
+def test_identical_queries_are_answered_once(monkeypatch):
+    answered = []
+
+    async def answer_query(email, query, context):
+        answered.append((email, query, context))
+        n = len(answered)
+        await asyncio.sleep(0.05)
+        return {"response": f"answer {n}", "shipments": [{"shipment_id": 7}]}
+
+    flights = SingleFlight()
+    store = ConversationContextStore()
+    store.record(
+        "t2", "shipper@example.com", "Where is shipment 7?", [{"shipment_id": 7}]
+    )
+    monkeypatch.setattr(run_mcp, "answer_query", answer_query)
+    monkeypatch.setattr(run_mcp, "get_query_flights", lambda: flights)
+    monkeypatch.setattr(run_mcp, "get_conversation_store", lambda: store)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=run_mcp.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://api"
+        ) as client:
+
+            async def ask(email, query, **params):
+                response = await client.post(
+                    "/query", params={"email": email, "query": query, **params}
+                )
+                return response.json()["response"]
+
+            return await asyncio.gather(
+                ask("shipper@example.com", "Where is shipment 7?"),
+                ask("Shipper@example.com ", "where is  shipment 7?"),
+                ask("shipper@example.com", "Where is shipment 7?"),
+                ask("shipper@example.com", "Where is shipment 8?"),
+                # A new thread asks the same; one with a context gets its own answer
+                ask("shipper@example.com", "Where is shipment 7?", thread_id="t1"),
+                ask("shipper@example.com", "Where is shipment 7?", thread_id="t2"),
+            )
+
+    replies = asyncio.run(scenario())
+    assert len(answered) == 3
+    assert replies[0] == replies[1] == replies[2] == replies[4]
+    assert len(set(replies)) == 3
+    assert flights.report()["collapsed"] == 3
+    assert [context is not None for *_, context in answered] == [False, False, True]
+    # The thread that shared another request's answer still remembers it
+    assert store.get("t1", "shipper@example.com").shipment_ids == [7]
+
+
+def test_query_key_ignores_case_and_whitespace():
+    key = run_mcp.query_key("a@x.com", "Shipment 7 ETA?", None)
+    assert key == run_mcp.query_key("A@X.com", " shipment  7\neta? ", None)
+    assert key != run_mcp.query_key("a@x.com", "Shipment 7 ETA?", "thread")
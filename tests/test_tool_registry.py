@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Optional
+
+import pytest
+
+from llm_function_calling.functions import READ_ONLY_TOOLS
+from mcp_stuff.functions import tms_tools
+from mcp_stuff.tool_registry import ToolArgumentError, ToolRegistry, UnknownToolError
+
+
+def test_schema_comes_from_the_signature_and_docstring():
+    tool = tms_tools.get("get_shipment_by_bol_id")
+    assert tool.parameters == {
+        "type": "object",
+        "properties": {
+            "email": {"type": "string", "description": "Email of the shipper"},
+            "bol_id": {
+                "type": "integer",
+                "description": "Unique identifier of the BOL",
+            },
+        },
+        "required": ["email", "bol_id"],
+    }
+    assert tool.description.startswith("Retrieve a shipment record")
+
+
+def test_arguments_are_coerced_to_the_declared_types():
+    tool = tms_tools.get("get_shipment_by_bol_id")
+    assert tool.validate({"email": "a@example.com", "bol_id": "#7"}) == {
+        "email": "a@example.com",
+        "bol_id": 7,
+    }
+    assert tool.validate({"email": "a@example.com", "bol_id": 7.0})["bol_id"] == 7
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        {"email": "a@example.com"},
+        {"email": "a@example.com", "bol_id": 7, "shipment_id": 7},
+        {"email": "a@example.com", "bol_id": "seven"},
+        {"email": "a@example.com", "bol_id": True},
+    ],
+    ids=["missing", "unexpected", "not_a_number", "boolean"],
+)
+def test_bad_arguments_are_rejected(args):
+    with pytest.raises(ToolArgumentError):
+        tms_tools.get("get_shipment_by_bol_id").validate(args)
+
+
+def test_unknown_tools_are_rejected():
+    with pytest.raises(UnknownToolError):
+        tms_tools.execute_function("drop_tables", {})
+
+
+def test_read_only_subset_leaves_out_updates():
+    read_only = tms_tools.subset(READ_ONLY_TOOLS)
+    assert "update_shipment_eta" in tms_tools
+    assert "update_shipment_eta" not in read_only
+    assert [tool["name"] for tool in read_only.descriptions] == list(READ_ONLY_TOOLS)
+    with pytest.raises(UnknownToolError):
+        read_only.execute_function("update_shipment_eta", {"shipment_id": 7})
+
+
+def test_installed_tools_dispatch_through_the_registry():
+    registry = ToolRegistry()
+
+    @registry.tool()
+    def shift_eta(shipment_id: int, eta: Optional[datetime] = None) -> dict:
+        """Move a shipment's ETA.
+
+        Args:
+            shipment_id (int): The shipment
+            eta (datetime): The new ETA, or None to clear it
+        """
+        return {"shipment_id": shipment_id, "eta": eta}
+
+    class FakeMCP:
+        def __init__(self):
+            self.tools = {}
+
+        def add_tool(self, function, name, description):
+            self.tools[name] = (function, description)
+
+    mcp = FakeMCP()
+    registry.install(mcp)
+    dispatch, description = mcp.tools["shift_eta"]
+    assert description == "Move a shipment's ETA."
+    assert registry.get("shift_eta").parameters["properties"]["eta"] == {
+        "type": "string",
+        "format": "date-time",
+        "description": "The new ETA, or None to clear it",
+    }
+    assert dispatch(shipment_id="#3", eta="2025-07-01T10:00:00") == {
+        "shipment_id": 3,
+        "eta": datetime(2025, 7, 1, 10),
+    }
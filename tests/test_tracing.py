@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from mcp.shared.memory import create_connected_server_and_client_session
+from sqlalchemy import create_engine, text
+
+from database.session import trace_queries
+from mcp_stuff.jobs import JobQueue
+from mcp_stuff.mcp_code import TracedFastMCP
+from mcp_stuff.mcp_llm_engine import call_tool
+from observability import tracing
+from observability.trace_report import load_traces, render_tree
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import run_mcp  # noqa: E402
+
+CALLER = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def spans(tmp_path):
+    """The spans exported by this process while the test runs, read on call."""
+    path = str(tmp_path / "traces.jsonl")
+    tracing.configure("test", path)
+
+    def read():
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    yield read
+    tracing.configure("test", None)
+
+
+def by_name(spans, name):
+    return next(span for span in spans if span["name"] == name)
+
+
+def test_nested_spans_share_the_trace(spans):
+    with tracing.span("outer", email="a@x.com") as outer:
+        with tracing.span("inner"):
+            assert tracing.current_traceparent().startswith(
+                f"00-{outer.context.trace_id}-"
+            )
+        with pytest.raises(RuntimeError):
+            with tracing.span("failing"):
+                raise RuntimeError("LLM timed out")
+    assert tracing.current_span() is None
+
+    outer, inner, failing = (by_name(spans(), n) for n in ("outer", "inner", "failing"))
+    assert outer["parent_id"] is None and outer["attributes"] == {"email": "a@x.com"}
+    assert inner["trace_id"] == failing["trace_id"] == outer["trace_id"]
+    assert inner["parent_id"] == failing["parent_id"] == outer["span_id"]
+    assert failing["error"] == "RuntimeError: LLM timed out"
+    assert outer["duration_ms"] >= inner["duration_ms"]
+
+
+def test_malformed_traceparents_start_a_new_trace():
+    assert tracing.SpanContext.parse(CALLER).span_id == "00f067aa0ba902b7"
+    for value in (None, "", "garbage", "00-" + "0" * 32 + "-00f067aa0ba902b7-01"):
+        assert tracing.extract({"traceparent": value}) is None
+
+
+def test_api_continues_the_callers_trace(spans):
+    client = TestClient(run_mcp.app)
+    client.get("/query_stats", headers={"traceparent": CALLER})
+    client.get("/no/such/route")
+
+    served, other = spans()
+    assert served["name"] == "GET /query_stats"
+    assert served["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert served["parent_id"] == "00f067aa0ba902b7"
+    assert served["attributes"] == {"status": 200}
+    # Requests without a caller's trace start their own
+    assert other["name"] == "GET unmatched" and other["parent_id"] is None
+
+
+def test_jobs_continue_the_submitters_trace(spans, tmp_path):
+    async def update(payload):
+        with tracing.span("work"):
+            return None
+
+    jobs = JobQueue({"update": update}, path=str(tmp_path / "jobs.db"))
+    with tracing.span("POST /courier_shipment_updates") as request:
+        jobs.submit("update", {})
+    asyncio.run(jobs.run(until_empty=True))
+
+    job, work = by_name(spans(), "job"), by_name(spans(), "work")
+    assert job["trace_id"] == work["trace_id"] == request.context.trace_id
+    assert job["parent_id"] == request.context.span_id
+    assert work["parent_id"] == job["span_id"]
+    assert job["attributes"]["queued_ms"] >= 0
+
+
+def test_tool_calls_carry_the_trace_to_the_mcp_server(spans):
+    server = TracedFastMCP("test")
+    engine = create_engine("sqlite://")
+    trace_queries(engine)
+
+    @server.tool()
+    def count_shipments() -> int:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT 1")).scalar()
+
+    async def scenario():
+        async with create_connected_server_and_client_session(
+            server._mcp_server
+        ) as session:
+            with tracing.span("call_tool") as caller:
+                result = await call_tool(session, "count_shipments", {})
+            return caller, result
+
+    caller, result = asyncio.run(scenario())
+    assert result.content[0].text == "1"
+    tool, query = by_name(spans(), "mcp_tool"), by_name(spans(), "db_query")
+    assert tool["parent_id"] == caller.context.span_id
+    assert tool["trace_id"] == query["trace_id"] == caller.context.trace_id
+    assert tool["attributes"] == {"tool": "count_shipments"}
+    assert query["parent_id"] == tool["span_id"]
+    assert query["attributes"] == {"statement": "SELECT 1"}
+
+    # Queries outside a traced request are not traced
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 2"))
+    assert len([span for span in spans() if span["name"] == "db_query"]) == 1
+
+
+def test_tools_called_in_process_start_their_own_trace(spans):
+    server = TracedFastMCP("test")
+
+    @server.tool()
+    def count_shipments() -> int:
+        return 1
+
+    asyncio.run(server.call_tool("count_shipments", {}))
+    tool = by_name(spans(), "mcp_tool")
+    assert tool["parent_id"] is None
+    assert tool["attributes"] == {"tool": "count_shipments"}
+
+
+def test_report_shows_the_span_tree(spans, tmp_path):
+    with tracing.span("status_update"):
+        with tracing.span("job", kind="update"):
+            with tracing.span("db_query"):
+                pass
+    lines = render_tree(
+        next(iter(load_traces(str(tmp_path / "traces.jsonl")).values()))
+    )
+    assert [line.split(" [")[0] for line in lines] == [
+        "status_update",
+        "  job",
+        "    db_query",
+    ]
+    assert "kind=update" in lines[1]
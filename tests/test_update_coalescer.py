@@ -0,0 +1,167 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "telegram_integration")
+)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:placeholder")
+import bot  # noqa: E402
+from courier_store import CourierStore  # noqa: E402
+from update_coalescer import UpdateCoalescer  # noqa: E402
+
+
+def _recording_coalescer(**kwargs):
+    flushed = []
+
+    async def flush(key, items):
+        flushed.append((key, list(items)))
+
+    return UpdateCoalescer(flush, **kwargs), flushed
+
+
+def test_messages_in_quick_succession_are_merged():
+    async def scenario():
+        coalescer, flushed = _recording_coalescer(window=0.05, max_delay=1)
+        coalescer.add(1, "a")
+        await asyncio.sleep(0.02)
+        coalescer.add(1, "b")
+        coalescer.add(2, "x")
+        assert coalescer.pending() == 3 and coalescer.pending(1) == 2
+        # The window restarts with every message
+        await asyncio.sleep(0.04)
+        assert flushed == []
+        await asyncio.sleep(0.05)
+        coalescer.add(1, "c")
+        await coalescer.drain()
+        return coalescer, flushed
+
+    coalescer, flushed = asyncio.run(scenario())
+    assert sorted(flushed[:2]) == [(1, ["a", "b"]), (2, ["x"])]
+    assert flushed[2] == (1, ["c"])
+    assert (coalescer.items, coalescer.batches) == (4, 3)
+    assert coalescer.pending() == 0
+
+
+def test_chatty_keys_are_flushed_after_max_delay():
+    async def scenario():
+        coalescer, flushed = _recording_coalescer(window=0.05, max_delay=0.1)
+        for i in range(10):
+            coalescer.add(1, i)
+            await asyncio.sleep(0.02)
+        # Never quiet for a whole window, yet answered along the way
+        assert flushed
+        await coalescer.drain()
+        return flushed
+
+    flushed = asyncio.run(scenario())
+    assert len(flushed) > 1
+    assert [i for _, items in flushed for i in items] == list(range(10))
+
+
+def test_batches_of_a_key_are_flushed_in_order():
+    flushed = []
+
+    async def flush(key, items):
+        # The first batch is slow; the next must still wait for it
+        if items == ["a"]:
+            await asyncio.sleep(0.05)
+        flushed.append(items)
+
+    async def scenario():
+        coalescer = UpdateCoalescer(flush, window=0, max_delay=0)
+        coalescer.add(1, "a")
+        await asyncio.sleep(0.01)
+        coalescer.add(1, "b")
+        await asyncio.sleep(0.01)
+        coalescer.add(1, "c")
+        await coalescer.drain()
+        return coalescer
+
+    coalescer = asyncio.run(scenario())
+    assert flushed == [["a"], ["b"], ["c"]]
+    assert coalescer._flush_locks == {} and not coalescer._waiting
+
+
+def test_failed_flush_does_not_stop_the_next():
+    flushed = []
+
+    async def flush(key, items):
+        if items == ["a"]:
+            raise RuntimeError("API down")
+        flushed.append(items)
+
+    async def scenario():
+        coalescer = UpdateCoalescer(flush, window=0, max_delay=0)
+        coalescer.add(1, "a")
+        await asyncio.sleep(0.01)
+        coalescer.add(1, "b")
+        await coalescer.drain()
+
+    asyncio.run(scenario())
+    assert flushed == [["b"]]
+
+
+def test_coalesced_messages_make_one_retryable_update(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, "API_RETRY_BACKOFF", 0)
+    calls = []
+
+    async def shipment_update(request):
+        calls.append((request.query["shipment_query"], request.headers))
+        if len(calls) == 1:
+            return web.json_response({"detail": "busy"}, status=503)
+        job = {"job_id": "j1", "status": "queued"}
+        return web.json_response({"response": job}, status=202)
+
+    polls = []
+
+    async def get_job(request):
+        polls.append((request.match_info["job_id"], request.query["wait"]))
+        if len(polls) == 1:
+            return web.json_response(
+                {"response": {"job_id": "j1", "status": "running"}}
+            )
+        job = {"job_id": "j1", "status": "done", "result": {"response": "ETA updated"}}
+        return web.json_response({"response": job})
+
+    replies = []
+
+    def message(message_id, text):
+        async def reply_text(reply):
+            replies.append((message_id, reply))
+
+        return SimpleNamespace(message_id=message_id, text=text, reply_text=reply_text)
+
+    async def scenario():
+        api = web.Application()
+        api.router.add_post("/courier_shipment_updates", shipment_update)
+        api.router.add_get("/jobs/{job_id}", get_job)
+        async with TestServer(api) as server:
+            couriers = CourierStore(str(tmp_path / "couriers.db"))
+            couriers.set(111, "+1 555 0100")
+            application = SimpleNamespace(
+                bot_data={
+                    "http_session": bot.create_http_session(str(server.make_url(""))),
+                    "couriers": couriers,
+                }
+            )
+            try:
+                await bot.send_status_update(
+                    application,
+                    111,
+                    [message(10, "Shipment 5"), message(11, "running 2h late")],
+                )
+            finally:
+                await application.bot_data["http_session"].close()
+                couriers.close()
+
+    asyncio.run(scenario())
+    assert [query for query, _ in calls] == ["Shipment 5\nrunning 2h late"] * 2
+    assert {headers["Idempotency-Key"] for _, headers in calls} == {"tg-111-10-11"}
+    # The update ran as a job on the API, followed until it finished
+    assert polls == [("j1", "30"), ("j1", "30")]
+    assert replies == [(11, "ETA updated")]
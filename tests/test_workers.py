@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+
+from mcp_stuff.conversation_context import ConversationContextStore
+from mcp_stuff.idempotency import IdempotencyStore
+from mcp_stuff.jobs import JobQueue
+from mcp_stuff.workers import run_exclusively
+
+SHIPMENT = {"shipment_id": 42, "shipment_status": "in_transit", "eta": "2025-06-01"}
+
+
+def _exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def test_one_holder_runs_the_task_and_another_takes_over(tmp_path):
+    lock = str(tmp_path / "sender.lock")
+    running = []
+    ran = []
+
+    async def task(name):
+        running.append(name)
+        assert len(running) == 1
+        await asyncio.sleep(0.05)
+        running.remove(name)
+        ran.append(name)
+
+    async def scenario():
+        first = asyncio.ensure_future(
+            run_exclusively(lock, lambda: task("first"), 0.01)
+        )
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(
+            run_exclusively(lock, lambda: task("second"), 0.01)
+        )
+        await asyncio.sleep(0.02)
+        # The second waits while the first holds the lock...
+        assert running == ["first"]
+        # ...and runs once the first is gone
+        return await asyncio.wait_for(asyncio.gather(first, second), 5)
+
+    asyncio.run(scenario())
+    assert ran == ["first", "second"]
+
+
+def test_only_jobs_of_stopped_workers_are_requeued(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def update(payload):
+        return None
+
+    jobs = JobQueue({"update": update}, path=path)
+    alive, gone = jobs.submit("update", {}), jobs.submit("update", {})
+    with sqlite3.connect(path) as conn:
+        for job_id, worker in ((alive, os.getppid()), (gone, _exited_pid())):
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ? WHERE id = ?",
+                (worker, job_id),
+            )
+
+    assert jobs.requeue_interrupted() == 1
+    assert jobs.get(alive)["status"] == "running"
+    assert jobs.get(gone)["status"] == "queued"
+
+
+def test_retries_wait_for_an_attempt_in_another_worker(tmp_path):
+    path = str(tmp_path / "idempotency.db")
+    store = IdempotencyStore(path, poll_interval=0.01)
+    other_worker = IdempotencyStore(path)
+    runs = []
+
+    async def handler():
+        runs.append(1)
+        return {"response": "updated here"}
+
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO idempotency_claims VALUES ('running', ?)", (os.getppid(),)
+        )
+        conn.execute(
+            "INSERT INTO idempotency_claims VALUES ('abandoned', ?)",
+            (_exited_pid(),),
+        )
+
+    async def scenario():
+        waiting = asyncio.ensure_future(store.run_once("running", handler))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        other_worker.put("running", {"response": "updated there"})
+        return await waiting, await store.run_once("abandoned", handler)
+
+    replayed, taken_over = asyncio.run(scenario())
+    assert replayed == {"response": "updated there"}
+    assert taken_over == {"response": "updated here"} and len(runs) == 1
+
+
+def test_workers_share_thread_contexts(tmp_path):
+    path = str(tmp_path / "conversation_context.db")
+    first = ConversationContextStore(path=path)
+    second = ConversationContextStore(path=path)
+    first.record("thread-1", "shipper@example.com", "Where is 42?", [SHIPMENT])
+    second.record("thread-1", "shipper@example.com", "And the ETA?", [SHIPMENT])
+
+    context = first.get("thread-1", "shipper@example.com")
+    assert context.shipment_ids == [42]
+    assert len(context.history) == 2
+    assert context.last_results == {42: SHIPMENT}